@@ -0,0 +1,288 @@
+"""
+In-memory index of the pregenerated voice assets
+
+Scans the voices, stats and spectrograms directories once and maps every
+(voice, lane path) combination to the files available for it, so request
+handlers can resolve assets without probing the filesystem.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Optional
+
+from log_config import get_logger
+
+logger = get_logger("assets")
+
+# Pattern shared by the audio, stats and spectrogram files,
+# e.g. voice_1_Z1_L2_Z2_L0_Z3_L0_Z4_L0.mp3
+ASSET_NAME_PATTERN = re.compile(r"^voice_(\d+)_Z1_L(\d+)_Z2_L(\d+)_Z3_L(\d+)_Z4_L(\d+)$")
+
+# File extension used by each kind of asset
+ASSET_EXTENSIONS = {
+    "audio": ".mp3",
+    "stats": ".json",
+    "spectrogram": ".png",
+}
+
+
+# Pregenerated spectrogram variants live in one subdirectory per size, e.g.
+# spectrograms/thumb/<name>.webp. The full-size PNG is the base spectrogram itself.
+SPECTROGRAM_SIZES = ("thumb", "medium", "full")
+SPECTROGRAM_FORMATS = {"webp": ".webp", "png": ".png"}
+
+# Low-bitrate preview transcodes of the audio live in voices/previews/<name><extension>
+AUDIO_PREVIEWS_DIR = "previews"
+AUDIO_PREVIEW_FORMATS = {"webm": ".webm", "opus": ".opus", "aac": ".m4a"}
+
+
+def parse_asset_name(file_name: str):
+    """Split an asset file name into (voice_number, lanes), or None if it doesn't follow the pattern"""
+    match = ASSET_NAME_PATTERN.match(os.path.splitext(file_name)[0])
+    if not match:
+        return None
+    return match.group(1), tuple(match.groups()[1:])
+
+
+def asset_basename(voice_number: str, lanes) -> str:
+    """Build the extension-less asset name for a voice and its Z1..Z4 lanes"""
+    parts = [f"voice_{voice_number}"]
+    for z_num, lane in enumerate(lanes, start=1):
+        parts.append(f"Z{z_num}")
+        parts.append(f"L{lane}")
+    return "_".join(parts)
+
+
+def spectrogram_variant_path(spectrograms_dir: str, name: str, size: str, fmt: str) -> str:
+    """Return where the variant of a spectrogram (extension-less name) is stored"""
+    if size == "full" and fmt == "png":
+        return os.path.join(spectrograms_dir, name + ".png")
+    return os.path.join(spectrograms_dir, size, name + SPECTROGRAM_FORMATS[fmt])
+
+
+def audio_preview_path(voices_dir: str, name: str, fmt: str) -> str:
+    """Return where the preview transcode of an audio file (extension-less name) is stored"""
+    return os.path.join(voices_dir, AUDIO_PREVIEWS_DIR, name + AUDIO_PREVIEW_FORMATS[fmt])
+
+
+class AssetIndex:
+    """Lookup tables for the audio, stats and spectrogram assets
+
+    The tables are rebuilt as a whole and swapped in a single assignment,
+    so readers never see a half-built index and don't need to lock. With an
+    asset pack (see asset_pack.py), packed files are indexed too; files on
+    disk take precedence over their packed copy.
+    """
+
+    def __init__(self, voices_dir: str, stats_dir: str, spectrograms_dir: str, pack=None):
+        self.pack = pack
+        self.directories = {
+            "audio": voices_dir,
+            "stats": stats_dir,
+            "spectrogram": spectrograms_dir,
+        }
+        self._refresh_lock = threading.Lock()
+        self._dir_mtimes = {}
+        self._tables = self._empty_tables()
+        # Incremented on every rebuild so dependent caches can tell they are stale
+        self.generation = 0
+
+    @staticmethod
+    def _empty_tables():
+        return {
+            # (voice_number, lanes) -> {kind: path}
+            "entries": {},
+            # kind -> {file name: path}
+            "files": {kind: {} for kind in ASSET_EXTENSIONS},
+            # (extension-less spectrogram name, size, format) -> path
+            "variants": {},
+            # (extension-less audio name, format) -> path
+            "previews": {},
+            # kind -> {voice_number: [file names, sorted]}
+            "fallbacks": {kind: {} for kind in ASSET_EXTENSIONS},
+            # path -> os.stat_result taken during the scan
+            "stats": {},
+            # path -> sha256 hex digest, filled in on first use (or from the pack)
+            "digests": {},
+            # path -> PackedFile, for files served from the asset pack
+            "packed": {},
+        }
+
+    def _scanned_directories(self):
+        directories = dict(self.directories)
+        for size in SPECTROGRAM_SIZES:
+            directories[f"spectrogram_{size}"] = os.path.join(self.directories["spectrogram"], size)
+        directories["audio_previews"] = os.path.join(self.directories["audio"], AUDIO_PREVIEWS_DIR)
+        return directories
+
+    def _scan_mtimes(self):
+        mtimes = {}
+        for key, directory in self._scanned_directories().items():
+            try:
+                mtimes[key] = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtimes[key] = None
+        return mtimes
+
+    def _list_directory(self, tables, directory: str) -> dict:
+        """Return {file name: path} of the files in a directory or its packed copy, recording their stats"""
+        files = {}
+        if self.pack is not None:
+            for name, packed in self.pack.list_dir(directory).items():
+                path = os.path.join(directory, name)
+                files[name] = path
+                tables["stats"][path] = packed.stat_result()
+                tables["digests"][path] = packed.sha256
+                tables["packed"][path] = packed
+        if os.path.isdir(directory):
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    path = os.path.join(directory, entry.name)
+                    files[entry.name] = path
+                    tables["stats"][path] = entry.stat()
+                    tables["digests"].pop(path, None)
+                    tables["packed"].pop(path, None)
+        return files
+
+    def _scan_variants(self, tables) -> None:
+        spectrograms_dir = self.directories["spectrogram"]
+        for name, path in tables["files"]["spectrogram"].items():
+            tables["variants"][(os.path.splitext(name)[0], "full", "png")] = path
+
+        extensions = {extension: fmt for fmt, extension in SPECTROGRAM_FORMATS.items()}
+        for size in SPECTROGRAM_SIZES:
+            for file_name, path in self._list_directory(tables, os.path.join(spectrograms_dir, size)).items():
+                name, extension = os.path.splitext(file_name)
+                fmt = extensions.get(extension)
+                if fmt is not None:
+                    tables["variants"][(name, size, fmt)] = path
+
+    def _scan_previews(self, tables) -> None:
+        directory = os.path.join(self.directories["audio"], AUDIO_PREVIEWS_DIR)
+        extensions = {extension: fmt for fmt, extension in AUDIO_PREVIEW_FORMATS.items()}
+        for file_name, path in self._list_directory(tables, directory).items():
+            name, extension = os.path.splitext(file_name)
+            fmt = extensions.get(extension)
+            if fmt is not None:
+                tables["previews"][(name, fmt)] = path
+
+    def refresh(self) -> None:
+        """Rebuild the index from the asset directories"""
+        with self._refresh_lock:
+            mtimes = self._scan_mtimes()
+            tables = self._empty_tables()
+
+            for kind, directory in self.directories.items():
+                extension = ASSET_EXTENSIONS[kind]
+                files = self._list_directory(tables, directory)
+                if not files and not os.path.isdir(directory):
+                    logger.warning("Asset directory not found: %s", directory)
+                    continue
+
+                for file_name, path in files.items():
+                    if not file_name.endswith(extension):
+                        continue
+
+                    tables["files"][kind][file_name] = path
+
+                    parsed = parse_asset_name(file_name)
+                    if parsed is None:
+                        continue
+                    tables["entries"].setdefault(parsed, {})[kind] = path
+                    tables["fallbacks"][kind].setdefault(parsed[0], []).append(file_name)
+
+                # Sort so fallbacks are deterministic instead of depending on directory order
+                for names in tables["fallbacks"][kind].values():
+                    names.sort()
+
+            self._scan_variants(tables)
+            self._scan_previews(tables)
+
+            self._tables = tables
+            self._dir_mtimes = mtimes
+            self.generation += 1
+
+            counts = {kind: len(files) for kind, files in tables["files"].items()}
+            counts["spectrogram_variants"] = len(tables["variants"])
+            counts["audio_previews"] = len(tables["previews"])
+            counts["packed"] = len(tables["packed"])
+            logger.info("Asset index built (generation %d): %s", self.generation, counts)
+
+    def refresh_if_changed(self) -> bool:
+        """Rebuild the index if any asset directory changed since the last scan"""
+        if self._scan_mtimes() == self._dir_mtimes:
+            return False
+        self.refresh()
+        return True
+
+    def lookup(self, kind: str, voice_number: str, lanes) -> Optional[str]:
+        """Return the path of the asset for an exact (voice, lanes) combination"""
+        entry = self._tables["entries"].get((voice_number, tuple(lanes)))
+        return entry.get(kind) if entry else None
+
+    def find(self, kind: str, file_name: str) -> Optional[str]:
+        """Return the path of an asset by file name"""
+        return self._tables["files"][kind].get(file_name)
+
+    def fallback(self, kind: str, voice_number: str) -> Optional[str]:
+        """Return the first available asset file name for a voice"""
+        names = self._tables["fallbacks"][kind].get(voice_number)
+        return names[0] if names else None
+
+    def spectrogram_variant(self, name: str, size: str, fmt: str) -> Optional[str]:
+        """Return the path of a pregenerated spectrogram variant (extension-less name)"""
+        return self._tables["variants"].get((name, size, fmt))
+
+    def audio_preview(self, name: str, fmt: str) -> Optional[str]:
+        """Return the path of the preview transcode of an audio file (extension-less name)"""
+        return self._tables["previews"].get((name, fmt))
+
+    def spectrogram_variants(self):
+        """Return {(extension-less name, size, format): path} of all indexed spectrogram variants"""
+        return dict(self._tables["variants"])
+
+    def audio_previews(self):
+        """Return {(extension-less name, format): path} of all indexed audio previews"""
+        return dict(self._tables["previews"])
+
+    def combinations(self):
+        """Return all indexed (voice_number, lanes) combinations"""
+        return list(self._tables["entries"])
+
+    def count_by_voice(self, kind: str):
+        """Return the number of indexed assets of a kind per voice number"""
+        return {voice_number: len(names) for voice_number, names in self._tables["fallbacks"][kind].items()}
+
+    def names(self, kind: str):
+        """Return all indexed file names of a kind"""
+        return list(self._tables["files"][kind])
+
+    def packed(self, path: str):
+        """Return the PackedFile an indexed file is served from, or None if it is served from disk"""
+        return self._tables["packed"].get(path)
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        """Return the stat result recorded for an indexed file when it was scanned"""
+        return self._tables["stats"].get(path)
+
+    def digest(self, path: str) -> str:
+        """Return the sha256 hex digest of an indexed file's content
+
+        Digests are computed on first use and cached until the next rebuild, so
+        assets should be replaced by renaming (which changes the directory mtime)
+        rather than rewritten in place.
+        """
+        tables = self._tables
+        digest = tables["digests"].get(path)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+            tables["digests"][path] = digest
+        return digest
@@ -0,0 +1,150 @@
+"""
+Single-file pack of the voice, spectrogram and stats assets
+
+build_asset_pack.py concatenates every asset file into one pack, storing
+identical contents once, followed by a JSON index mapping each file's path
+(relative to the directory the pack is in, e.g. voices/<name>.mp3) to its
+offset, length, content type, sha256 and mtime:
+
+    header   b"VAPACK01", index offset (u64), index length (u64)
+    data     file contents, each starting on a PACK_ALIGNMENT boundary
+    index    {"version": 1, "files": {path: [offset, length, type, sha256, mtime]}}
+
+The API memory-maps the pack once, so assets in it are served from the page
+cache without opening or stat-ing a file per request. Files that also exist
+on disk take precedence over their packed copy.
+"""
+
+import io
+import json
+import mmap
+import os
+import struct
+from typing import Dict, NamedTuple, Optional
+
+from log_config import get_logger
+
+logger = get_logger("assets")
+
+# Pack used by the API and its worker processes
+ASSET_PACK_PATH = os.environ.get("ASSET_PACK", "./assets.pack")
+
+PACK_MAGIC = b"VAPACK01"
+PACK_HEADER = struct.Struct("<8sQQ")
+PACK_INDEX_VERSION = 1
+
+# File contents start on multiples of this many bytes
+PACK_ALIGNMENT = 16
+
+
+class PackedFile(NamedTuple):
+    """A file stored in an asset pack"""
+
+    pack: "AssetPack"
+    offset: int
+    length: int
+    content_type: str
+    sha256: str
+    mtime: float
+
+    def view(self, start: int = 0, end: Optional[int] = None) -> memoryview:
+        """Return the file's bytes (or the [start, end) slice of them) without copying"""
+        end = self.length if end is None else end
+        return self.pack.view[self.offset + start:self.offset + end]
+
+    def stat_result(self) -> os.stat_result:
+        """Return a stat result with the size and mtime recorded in the pack"""
+        return os.stat_result((0o100444, 0, 0, 1, 0, 0, self.length, self.mtime, self.mtime, self.mtime))
+
+
+class AssetPack:
+    """Read-only view of a memory-mapped asset pack"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        # Kept open for the lifetime of the pack so its descriptor can be passed to sendfile
+        self.file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"Empty asset pack: {path}")
+
+        magic, index_offset, index_length = PACK_HEADER.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"Not an asset pack: {path}")
+        if index_offset + index_length > len(self._mmap):
+            raise ValueError(f"Truncated asset pack: {path}")
+        index = json.loads(bytes(self._mmap[index_offset:index_offset + index_length]))
+        if index.get("version") != PACK_INDEX_VERSION:
+            raise ValueError(f"Asset pack {path} has index version {index.get('version')}, rebuild it")
+
+        self.view = memoryview(self._mmap)
+        self.files: Dict[str, PackedFile] = {
+            name: PackedFile(self, *entry) for name, entry in index["files"].items()
+        }
+        # directory -> {file name: PackedFile}
+        self._directories = {}
+        for name, packed in self.files.items():
+            directory, file_name = name.rpartition("/")[::2]
+            self._directories.setdefault(directory, {})[file_name] = packed
+
+    def _relative(self, path: str) -> str:
+        relative = os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+        return "" if relative == "." else relative
+
+    def find(self, path: str) -> Optional[PackedFile]:
+        """Return the packed copy of a file, by its path on disk"""
+        return self.files.get(self._relative(path))
+
+    def list_dir(self, directory: str) -> Dict[str, PackedFile]:
+        """Return the packed files directly inside a directory, by file name"""
+        return self._directories.get(self._relative(directory), {})
+
+
+def load_asset_pack(path: str = ASSET_PACK_PATH) -> Optional[AssetPack]:
+    """Open the asset pack, or return None if there is none or it is unreadable"""
+    if not os.path.exists(path):
+        logger.debug("No asset pack at %s, serving assets from their directories", path)
+        return None
+    try:
+        pack = AssetPack(path)
+    except (OSError, ValueError) as e:
+        logger.error("Failed to load asset pack %s: %s", path, e)
+        return None
+    logger.info("Asset pack loaded: %d files from %s (%.1f MB)", len(pack.files), path, len(pack.view) / 1024 / 1024)
+    return pack
+
+
+# This process's pack, for code that reads assets outside the request path (e.g. worker processes)
+_process_pack = None
+_process_pack_loaded = False
+
+
+def process_pack() -> Optional[AssetPack]:
+    """Return the asset pack of this process, loading it on first use"""
+    global _process_pack, _process_pack_loaded
+    if not _process_pack_loaded:
+        _process_pack = load_asset_pack()
+        _process_pack_loaded = True
+    return _process_pack
+
+
+def asset_exists(path: str) -> bool:
+    """Return True if an asset file exists on disk or in the asset pack"""
+    if os.path.isfile(path):
+        return True
+    pack = process_pack()
+    return pack is not None and pack.find(path) is not None
+
+
+def open_asset(path: str):
+    """Return something soundfile and friends can read an asset from: its path on disk, or its packed bytes"""
+    if os.path.exists(path):
+        return path
+    pack = process_pack()
+    packed = pack.find(path) if pack else None
+    if packed is None:
+        raise FileNotFoundError(path)
+    return io.BytesIO(packed.view())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+API Load Benchmark
+
+Simulates concurrent users moving voice cards from the holding zone through
+Zones 1-4 and fetching the audio and spectrogram URLs each move returns, then
+reports throughput and p50/p95/p99 latency per endpoint.
+
+By default the ASGI app is driven in-process (no sockets, no network); with
+--socket it runs against uvicorn instead, either one started on a free local
+port or an already running server given by --url. Results are saved as JSON,
+and --baseline compares them with an earlier run to catch regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_startup import API_DIR, free_port
+
+ZONES = ["Zone 1", "Zone 2", "Zone 3", "Zone 4"]
+VOICES = ["Voice 1", "Voice 2", "Voice 3"]
+LANES = ["Lane 1", "Lane 2", "Lane 3"]
+
+# Where results are saved unless --output is given
+RESULTS_DIR = os.path.join(API_DIR, "bench_results")
+
+
+class Recorder:
+    """Latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+async def timed_request(client, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    """Send a request, reading the whole body, and record its latency under `endpoint`"""
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except Exception as e:
+        recorder.record(endpoint, time.perf_counter() - start, ok=False)
+        print(f"  {method} {url} failed: {e}")
+        return None
+    recorder.record(endpoint, time.perf_counter() - start, ok=response.status_code < 400)
+    return response
+
+
+async def user_journeys(client, recorder: Recorder, user: int, journeys: int, fetch_assets: bool,
+                        think: float, rng: random.Random) -> None:
+    """Move random cards from holding through every zone, `journeys` times"""
+    headers = {"X-Session-ID": f"bench-user-{user}"}
+    for _ in range(journeys):
+        voice = rng.choice(VOICES)
+        moves = [("holding", "Lane 1", None)]
+        for zone_index, zone in enumerate(ZONES):
+            moves.append((zone, rng.choice(LANES), ZONES[zone_index - 1] if zone_index else "holding"))
+
+        for zone, lane, previous_zone in moves:
+            response = await timed_request(
+                client, recorder, "POST /api/process", "POST", "/api/process",
+                json={"cardName": voice, "zoneName": zone, "laneName": lane, "previousZone": previous_zone},
+                headers=headers,
+            )
+            if response is None or response.status_code != 200:
+                continue
+
+            result = response.json()
+            if fetch_assets:
+                fetches = []
+                if result.get("audioFile"):
+                    fetches.append(timed_request(client, recorder, "GET /processed", "GET", result["audioFile"]))
+                spectrogram = (result.get("metadata") or {}).get("spectrogram")
+                if spectrogram:
+                    fetches.append(timed_request(client, recorder, "GET /spectrograms", "GET", spectrogram,
+                                                 headers={"Accept": "image/webp,image/png"}))
+                await asyncio.gather(*fetches)
+            if think:
+                await asyncio.sleep(think)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    """Return throughput and latency statistics per endpoint (latencies in ms)"""
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+async def run_load(client, users: int, journeys: int, fetch_assets: bool, think: float, seed: int) -> dict:
+    recorder = Recorder()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        user_journeys(client, recorder, user, journeys, fetch_assets, think, random.Random(seed + user))
+        for user in range(users)
+    ))
+    return summarize(recorder, time.perf_counter() - start)
+
+
+async def run_in_process(options: dict) -> dict:
+    """Drive the ASGI app directly, with the app's lifespan running"""
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_load(client, **options)
+
+
+async def run_over_socket(base_url: str, options: dict) -> dict:
+    """Drive a running server over HTTP"""
+    import httpx
+
+    limits = httpx.Limits(max_connections=options["users"] * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await run_load(client, **options)
+
+
+def start_server(timeout: float = 30.0):
+    """Start uvicorn on a free local port and return (process, base URL) once it answers"""
+    import urllib.error
+    import urllib.request
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return server, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError(f"uvicorn did not answer on {base_url} within {timeout}s")
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    """Print how results differ from a baseline run and return whether they are within `max_regression`"""
+    print(f"\nCompared with baseline from {baseline.get('timestamp', 'unknown time')}:")
+    if (baseline.get("mode"), baseline.get("options")) != (results["mode"], results["options"]):
+        print(f"  ! baseline ran {baseline.get('mode')} with {baseline.get('options')}, results aren't directly comparable")
+    success = True
+    for endpoint, stats in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            print(f"  {endpoint}: not in baseline")
+            continue
+        p95_change = stats["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        rps_change = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        success = success and not regressed
+        print(f"  {'✗' if regressed else '✓'} {endpoint}: p95 {before['p95_ms']:.1f} → {stats['p95_ms']:.1f} ms "
+              f"({p95_change:+.0%}), throughput {before['throughput_rps']:.1f} → {stats['throughput_rps']:.1f} req/s "
+              f"({rps_change:+.0%})")
+    return success
+
+
+def print_results(results: dict) -> None:
+    print(f"\n{results['requests']} requests in {results['elapsed_s']:.2f}s "
+          f"({results['throughput_rps']:.1f} req/s, {results['errors']} errors)\n")
+    print(f"{'endpoint':<20} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for endpoint, stats in results["endpoints"].items():
+        print(f"{endpoint:<20} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+
+
+def run_benchmark(args) -> bool:
+    """Run the benchmark, save its results and return whether it passed"""
+    options = {
+        "users": args.users,
+        "journeys": args.journeys,
+        "fetch_assets": not args.no_assets,
+        "think": args.think,
+        "seed": args.seed,
+    }
+    mode = "socket" if args.socket or args.url else "in-process"
+    print(f"Simulating {args.users} users x {args.journeys} journeys ({mode})...")
+
+    if mode == "in-process":
+        results = asyncio.run(run_in_process(options))
+    elif args.url:
+        results = asyncio.run(run_over_socket(args.url.rstrip("/"), options))
+    else:
+        server, base_url = start_server()
+        try:
+            results = asyncio.run(run_over_socket(base_url, options))
+        finally:
+            server.terminate()
+            server.wait()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": mode,
+        "options": options,
+        "python": sys.version.split()[0],
+        **results,
+    }
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"api_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    success = results["errors"] == 0
+    if not success:
+        print(f"✗ {results['errors']} requests failed")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        success = compare(results, baseline, args.max_regression) and success
+    return success
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="number of concurrent simulated users")
+    parser.add_argument("--journeys", type=int, default=5, help="holding-to-Zone 4 journeys per user")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between a user's moves in seconds")
+    parser.add_argument("--no-assets", action="store_true", help="don't fetch the returned audio and spectrograms")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated users' choices")
+    parser.add_argument("--socket", action="store_true", help="run against uvicorn on a free local port")
+    parser.add_argument("--url", help="run against an already running server (implies --socket)")
+    parser.add_argument("--output", help=f"results file (default: {os.path.relpath(RESULTS_DIR)}/api_<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed p95 increase or throughput drop relative to the baseline")
+    args = parser.parse_args()
+
+    success = run_benchmark(args)
+    sys.exit(0 if success else 1)
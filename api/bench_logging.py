@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Logging Benchmark
+
+Compares /api/process throughput with verbose (DEBUG) and quiet (INFO)
+logging. Each configuration runs in its own process, since logging is set up
+when the API is imported, with log output discarded so only the cost of
+producing the records is measured.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONFIGURATIONS = {
+    "verbose": {"LOG_LEVEL": "DEBUG", "LOG_SAMPLE_RATES": ""},
+    "sampled": {"LOG_LEVEL": "DEBUG", "LOG_SAMPLE_RATES": "asset_lookup=0.01,request=0.01,response=0.01,file_served=0.01"},
+    "quiet": {"LOG_LEVEL": "INFO", "LOG_SAMPLE_RATES": ""},
+}
+
+# Card moves sent in a loop, covering exact matches and fallbacks
+MOVES = [
+    ("Voice 1", "Zone 1", "Lane 1", "holding"),
+    ("Voice 1", "Zone 2", "Lane 2", "Zone 1"),
+    ("Voice 1", "Zone 3", "Lane 3", "Zone 2"),
+    ("Voice 2", "Zone 3", "Lane 1", "holding"),
+    ("Voice 3", "holding", "Lane 1", None),
+]
+
+
+async def run_requests(count: int, concurrency: int) -> float:
+    """Send `count` /api/process requests and return requests per second"""
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(worker_id: int, n: int):
+            for i in range(n):
+                card, zone, lane, previous = MOVES[i % len(MOVES)]
+                response = await client.post(
+                    "/api/process",
+                    json={"cardName": card, "zoneName": zone, "laneName": lane, "previousZone": previous},
+                    headers={"X-Session-ID": f"bench-{worker_id}"},
+                )
+                response.raise_for_status()
+
+        # Warm up caches before measuring
+        await worker(-1, len(MOVES))
+
+        per_worker = count // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w, per_worker) for w in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return per_worker * concurrency / elapsed
+
+
+def run_configuration(name: str, count: int, concurrency: int) -> float:
+    """Run one configuration in a child process and return its throughput"""
+    env = dict(os.environ, PROCESSING_DELAY="0", **CONFIGURATIONS[name])
+    with tempfile.NamedTemporaryFile("r", suffix=".json") as result_file:
+        subprocess.run(
+            [sys.executable, __file__, "--child", result_file.name,
+             "--requests", str(count), "--concurrency", str(concurrency)],
+            cwd=API_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        return json.load(result_file)["requests_per_second"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per configuration")
+    parser.add_argument("--concurrency", type=int, default=10, help="simultaneous clients")
+    parser.add_argument("--child", metavar="RESULT_FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        rps = asyncio.run(run_requests(args.requests, args.concurrency))
+        with open(args.child, "w") as f:
+            json.dump({"requests_per_second": rps}, f)
+        sys.exit(0)
+
+    print(f"Sending {args.requests} requests per configuration ({args.concurrency} concurrent clients)...")
+    results = {name: run_configuration(name, args.requests, args.concurrency) for name in CONFIGURATIONS}
+
+    baseline = results["quiet"]
+    for name, rps in results.items():
+        env = ", ".join(f"{k}={v}" for k, v in CONFIGURATIONS[name].items() if v)
+        print(f"{name:>8}: {rps:8.1f} req/s ({rps / baseline * 100:5.1f}% of quiet)  [{env}]")
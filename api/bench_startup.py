@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+
+Measures how long the API takes to come up from a cold process:
+
+- import time of the main module
+- time from launching uvicorn to the first 200 response on /
+
+Each measurement is repeated in fresh processes and the median is compared
+against a threshold, so cold-start regressions (e.g. a heavy import creeping
+back into main.py) fail loudly. Also checks that the heavy audio stack is not
+imported by the API at startup.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that only DSP code paths may import
+HEAVY_MODULES = ["librosa", "soundfile", "matplotlib", "scipy", "numba"]
+
+IMPORT_PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print("STARTUP_PROBE", elapsed, ",".join(loaded))
+"""
+
+
+def measure_import():
+    """Return (seconds to import main, heavy modules loaded) in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=API_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    # The API prints its own startup messages, so pick out the probe's line
+    fields = [line for line in output if line.startswith("STARTUP_PROBE")][-1].split(" ")
+    loaded = fields[2].split(",") if len(fields) > 2 and fields[2] else []
+    return float(fields[1]), loaded
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(timeout: float) -> float:
+    """Return seconds from launching uvicorn to the first 200 on /"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/"
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=API_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"No 200 response from {url} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_benchmark(runs: int, max_import: float, max_first_response: float) -> bool:
+    """Run the benchmark and return whether all thresholds were met"""
+    import_times = []
+    heavy_loaded = set()
+    for _ in range(runs):
+        elapsed, loaded = measure_import()
+        import_times.append(elapsed)
+        heavy_loaded.update(loaded)
+
+    first_response_times = [measure_first_response(timeout=max_first_response * 5) for _ in range(runs)]
+
+    import_median = statistics.median(import_times)
+    first_response_median = statistics.median(first_response_times)
+
+    print(f"Import time:         median {import_median * 1000:.0f} ms "
+          f"(min {min(import_times) * 1000:.0f}, max {max(import_times) * 1000:.0f}, threshold {max_import * 1000:.0f})")
+    print(f"Time to first 200:   median {first_response_median * 1000:.0f} ms "
+          f"(min {min(first_response_times) * 1000:.0f}, max {max(first_response_times) * 1000:.0f}, "
+          f"threshold {max_first_response * 1000:.0f})")
+
+    success = True
+    if heavy_loaded:
+        print(f"✗ Heavy modules imported at startup: {', '.join(sorted(heavy_loaded))}")
+        success = False
+    if import_median > max_import:
+        print("✗ Import time regression!")
+        success = False
+    if first_response_median > max_first_response:
+        print("✗ Time to first response regression!")
+        success = False
+
+    if success:
+        print("✓ Startup is within budget")
+    return success
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to measure")
+    parser.add_argument("--max-import", type=float, default=1.5, help="import time threshold in seconds")
+    parser.add_argument("--max-first-response", type=float, default=3.0,
+                        help="time to first 200 threshold in seconds")
+    args = parser.parse_args()
+
+    success = run_benchmark(args.runs, args.max_import, args.max_first_response)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Asset Pack Builder
+
+Packs the voice files (and their previews), the spectrograms (and their
+variants) and the stats files into the single memory-mapped file the API
+serves them from (see asset_pack.py). Identical files are stored once.
+
+--verify checks an existing pack instead: that its index is consistent, that
+every packed file still matches its recorded sha256 and, unless --no-sources
+is given, that it holds exactly the files currently in the asset directories.
+With --prune, the loose files are then deleted, so that images ship the
+assets once, in the pack (build manifests and other hidden files are kept).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from asset_pack import ASSET_PACK_PATH, PACK_ALIGNMENT, PACK_HEADER, PACK_INDEX_VERSION, PACK_MAGIC, AssetPack
+
+# Directories packed, relative to the API directory, and whether to include their subdirectories
+PACKED_DIRECTORIES = {
+    "voices": True,  # voices/previews/
+    "spectrograms": True,  # spectrograms/<size>/
+    "stats": False,
+}
+
+# Content type of each packed file extension
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".webm": "audio/webm",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".json": "application/json",
+}
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_files(root: str) -> dict:
+    """Return {pack path: file path} for every asset file under the packed directories"""
+    files = {}
+    for directory, recursive in PACKED_DIRECTORIES.items():
+        top = os.path.join(root, directory)
+        for dir_path, dir_names, file_names in os.walk(top):
+            # Skip build manifests and other hidden files
+            dir_names[:] = sorted(name for name in dir_names if recursive and not name.startswith("."))
+            for file_name in sorted(file_names):
+                if file_name.startswith(".") or os.path.splitext(file_name)[1] not in CONTENT_TYPES:
+                    continue
+                path = os.path.join(dir_path, file_name)
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = path
+    return files
+
+
+def build_pack(root: str, pack_path: str) -> bool:
+    """Write every asset file under `root` into a new pack"""
+    start = time.perf_counter()
+    if os.path.dirname(os.path.abspath(pack_path)) != os.path.abspath(root):
+        # Packed paths are resolved relative to the directory the pack is in
+        print(f"✗ The pack has to be written to {root}, next to the directories it packs")
+        return False
+    files = source_files(root)
+    print(f"Found {len(files)} asset files")
+
+    index = {}
+    offsets = {}  # sha256 -> offset of the stored copy
+    source_bytes = 0
+    tmp_path = f"{pack_path}.tmp"
+    with open(tmp_path, "wb") as pack:
+        pack.write(b"\0" * PACK_HEADER.size)
+        for name, path in files.items():
+            with open(path, "rb") as f:
+                data = f.read()
+            sha256 = hashlib.sha256(data).hexdigest()
+            source_bytes += len(data)
+            if sha256 not in offsets:
+                pack.write(b"\0" * (-pack.tell() % PACK_ALIGNMENT))
+                offsets[sha256] = pack.tell()
+                pack.write(data)
+            content_type = CONTENT_TYPES[os.path.splitext(name)[1]]
+            index[name] = [offsets[sha256], len(data), content_type, sha256, os.stat(path).st_mtime]
+
+        index_data = json.dumps({"version": PACK_INDEX_VERSION, "files": index}, separators=(",", ":")).encode()
+        index_offset = pack.tell()
+        pack.write(index_data)
+        pack.seek(0)
+        pack.write(PACK_HEADER.pack(PACK_MAGIC, index_offset, len(index_data)))
+    os.replace(tmp_path, pack_path)
+
+    print(f"Wrote {len(index)} files ({len(offsets)} distinct) to {pack_path}: "
+          f"{os.path.getsize(pack_path) / 1024 / 1024:.1f} MB from {source_bytes / 1024 / 1024:.1f} MB "
+          f"in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def verify_pack(root: str, pack_path: str, check_sources: bool) -> bool:
+    """Check a pack's integrity and, optionally, that it matches the asset directories"""
+    try:
+        pack = AssetPack(pack_path)
+    except (OSError, ValueError) as e:
+        print(f"✗ Cannot open {pack_path}: {e}")
+        return False
+
+    errors = []
+    index_offset = PACK_HEADER.unpack_from(pack.view, 0)[1]
+    checked = {}  # (offset, length) -> sha256 of the stored bytes
+    for name, packed in pack.files.items():
+        if packed.offset < PACK_HEADER.size or packed.offset + packed.length > index_offset:
+            errors.append(f"{name}: [{packed.offset}, {packed.offset + packed.length}) is outside the data section")
+            continue
+        key = (packed.offset, packed.length)
+        if key not in checked:
+            checked[key] = hashlib.sha256(packed.view()).hexdigest()
+        if checked[key] != packed.sha256:
+            errors.append(f"{name}: content doesn't match its sha256")
+    print(f"Checked {len(pack.files)} packed files ({len(checked)} distinct)")
+
+    if check_sources:
+        files = source_files(root)
+        for name in sorted(set(files) - set(pack.files)):
+            errors.append(f"{name}: on disk but not in the pack")
+        for name in sorted(set(pack.files) - set(files)):
+            errors.append(f"{name}: in the pack but not on disk")
+        for name in sorted(set(files) & set(pack.files)):
+            if file_sha256(files[name]) != pack.files[name].sha256:
+                errors.append(f"{name}: differs from the file on disk")
+        print(f"Compared with {len(files)} files on disk")
+
+    for error in errors[:20]:
+        print(f"  {error}")
+    if len(errors) > 20:
+        print(f"  ... and {len(errors) - 20} more")
+    if errors:
+        print(f"✗ {len(errors)} problems found in {pack_path}")
+        return False
+    print(f"✓ {pack_path} is valid")
+    return True
+
+
+def prune_sources(root: str, pack_path: str) -> bool:
+    """Delete the asset files under `root` that the pack holds an identical copy of"""
+    pack = AssetPack(pack_path)
+    removed = 0
+    freed = 0
+    for name, path in source_files(root).items():
+        packed = pack.files.get(name)
+        if packed is None or file_sha256(path) != packed.sha256:
+            print(f"  keeping {name}: not in the pack")
+            continue
+        freed += os.path.getsize(path)
+        os.remove(path)
+        removed += 1
+    print(f"Pruned {removed} packed files ({freed / 1024 / 1024:.1f} MB) from the asset directories")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=".", help="directory containing the voices, spectrograms and stats directories")
+    parser.add_argument("--output", default=ASSET_PACK_PATH, help="path of the asset pack")
+    parser.add_argument("--verify", action="store_true", help="verify the pack instead of building it")
+    parser.add_argument("--no-sources", action="store_true", help="with --verify, don't compare with the files on disk")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --verify, delete the packed files from the asset directories once verified")
+    args = parser.parse_args()
+
+    if args.prune and (not args.verify or args.no_sources):
+        parser.error("--prune needs --verify against the files on disk")
+    if args.verify:
+        ok = verify_pack(args.root, args.output, check_sources=not args.no_sources)
+        if ok and args.prune:
+            ok = prune_sources(args.root, args.output)
+    else:
+        ok = build_pack(args.root, args.output)
+    raise SystemExit(0 if ok else 1)
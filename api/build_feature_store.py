@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Feature Store Builder
+
+Computes acoustic features (loudness, pitch contour statistics, spectral
+centroid and rolloff, tempo) for every audio file in ./voices and writes them
+to the memory-mapped store the API reads (see feature_store.py).
+
+Files are analyzed in parallel across a process pool. Files with identical
+content are only analyzed once.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from asset_index import parse_asset_name
+from feature_store import FEATURE_NAMES, store_shape, variant_offset
+
+# Configuration
+VOICES_DIR = "./voices"  # Source directory containing audio files
+STORE_PATH = os.environ.get("FEATURE_STORE_PATH", "./voice_features.npy")  # Output store
+
+# Analysis frame size and hop, in samples
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Pitch search range for speech, in Hz
+PITCH_MIN_HZ = 65
+PITCH_MAX_HZ = 600
+
+# Frames quieter than this fraction of the loudest frame count as silence
+SILENCE_RATIO = 0.1
+
+
+def compute_features(path: str) -> list:
+    """Return the FEATURE_NAMES values for one audio file"""
+    import librosa
+
+    y, sr = librosa.load(path, sr=None, mono=True)
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+    # Every frame-level feature comes from the same STFT
+    rms = librosa.feature.rms(S=S, frame_length=N_FFT)[0]
+    centroid = librosa.feature.spectral_centroid(S=S, sr=sr)[0]
+    rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr)[0]
+    f0 = librosa.yin(y, fmin=PITCH_MIN_HZ, fmax=PITCH_MAX_HZ, sr=sr, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    tempo = librosa.feature.tempo(y=y, sr=sr, hop_length=HOP_LENGTH)[0]
+
+    n_frames = min(len(rms), len(f0))
+    voiced = rms[:n_frames] > SILENCE_RATIO * rms.max() if rms.max() > 0 else np.zeros(n_frames, dtype=bool)
+    pitch = f0[:n_frames][voiced]
+    if len(pitch) == 0:
+        pitch = np.array([np.nan])
+
+    return [
+        len(y) / sr,
+        float(rms.mean()),
+        float(rms.max()),
+        float(np.mean(pitch)),
+        float(np.median(pitch)),
+        float(np.std(pitch)),
+        float(12 * np.log2(np.percentile(pitch, 95) / np.percentile(pitch, 5))),
+        float(voiced.mean()),
+        float(centroid[:n_frames][voiced].mean()) if voiced.any() else float(centroid.mean()),
+        float(rolloff[:n_frames][voiced].mean()) if voiced.any() else float(rolloff.mean()),
+        float(tempo),
+    ]
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_store(voices_dir: str, store_path: str, jobs=None) -> bool:
+    """Analyze every voice file and write the store"""
+    start = time.perf_counter()
+    variants = {}
+    for path in sorted(glob.glob(os.path.join(voices_dir, "*.mp3"))):
+        parsed = parse_asset_name(os.path.basename(path))
+        if parsed:
+            variants[path] = parsed
+        else:
+            print(f"Skipping {os.path.basename(path)}: not a voice variant name")
+
+    # Many variants are copies of the same recording; analyze each distinct file once
+    by_hash = {}
+    for path in variants:
+        by_hash.setdefault(file_sha256(path), []).append(path)
+    print(f"Found {len(variants)} voice files ({len(by_hash)} distinct)")
+
+    jobs = jobs or os.cpu_count() or 1
+    sources = [paths[0] for paths in by_hash.values()]
+    features = {}
+    errors = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(compute_features, source): digest for digest, source in zip(by_hash, sources)}
+        for future, digest in futures.items():
+            try:
+                features[digest] = future.result()
+            except Exception as e:
+                print(f"Error analyzing {by_hash[digest][0]}: {e}")
+                errors += 1
+
+    voice_slots = max(int(voice_number) for voice_number, _ in variants.values()) + 1 if variants else 1
+    store = np.full(store_shape(voice_slots), np.nan, dtype="<f4")
+    columns = store.reshape(len(FEATURE_NAMES), -1)
+    for digest, paths in by_hash.items():
+        if digest not in features:
+            continue
+        for path in paths:
+            voice_number, lanes = variants[path]
+            columns[:, variant_offset(int(voice_number), lanes)] = features[digest]
+
+    tmp_path = f"{store_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, store)
+    os.replace(tmp_path, store_path)
+
+    stored = sum(len(paths) for digest, paths in by_hash.items() if digest in features)
+    print(f"Wrote features of {stored} variants to {store_path} "
+          f"({os.path.getsize(store_path) / 1024:.1f} KB) in {time.perf_counter() - start:.2f}s with {jobs} worker(s)")
+    return errors == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voices-dir", default=VOICES_DIR, help="directory containing the source audio files")
+    parser.add_argument("--output", default=STORE_PATH, help="path of the feature store")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    ok = build_store(args.voices_dir, args.output, jobs=args.jobs)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Metadata Bundle Builder
+
+Compiles every stats JSON file in ./stats into a single compact bundle that
+the API loads at startup instead of reading one file per request.
+"""
+
+import argparse
+import os
+import time
+
+from metadata_bundle import compile_stats, write_bundle
+
+# Configuration
+STATS_DIR = "./stats"  # Source directory containing the stats JSON files
+BUNDLE_PATH = os.environ.get("METADATA_BUNDLE_PATH", "./stats_bundle.json")  # Compiled output
+
+
+def build_bundle(stats_dir: str, bundle_path: str) -> None:
+    """Compile the stats directory and write the bundle"""
+    start = time.perf_counter()
+    bundle = compile_stats(stats_dir)
+    write_bundle(bundle, bundle_path)
+
+    elapsed = time.perf_counter() - start
+    size_kb = os.path.getsize(bundle_path) / 1024
+    print(f"Compiled {len(bundle['entries'])} stats files "
+          f"(sample analysis: {'yes' if bundle['sample'] else 'no'}) "
+          f"into {bundle_path} ({size_kb:.1f} KB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stats-dir", default=STATS_DIR, help="directory containing the stats JSON files")
+    parser.add_argument("--output", default=BUNDLE_PATH, help="path of the compiled bundle")
+    args = parser.parse_args()
+
+    build_bundle(args.stats_dir, args.output)
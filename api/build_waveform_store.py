@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Waveform Store Builder
+
+Reduces every audio file in ./voices to min/max peaks at each of the
+PEAK_LEVELS resolutions and writes them to the memory-mapped store the API
+serves /waveforms from (see waveform_store.py).
+
+Files are decoded in parallel across a process pool, and files with
+identical content are only decoded once. The peaks of every level are
+computed with one vectorized reduction per level over the whole clip.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from asset_index import parse_asset_name
+from feature_store import LANES_PER_ZONE, variant_offset
+from waveform_store import PEAK_LEVELS, PEAK_SCALE, PEAKS_HEADER, PEAKS_MAGIC
+
+# Configuration
+VOICES_DIR = "./voices"  # Source directory containing audio files
+STORE_PATH = os.environ.get("WAVEFORM_STORE_PATH", "./voice_peaks.bin")  # Output store
+
+
+def compute_peaks(path: str, levels=PEAK_LEVELS) -> bytes:
+    """Return a file's int8 (min, max) pairs for every level, in store block layout"""
+    import soundfile as sf
+
+    y, _ = sf.read(path, dtype="float32", always_2d=True)
+    y = y.mean(axis=1)
+    blocks = []
+    for bins in levels:
+        # Bin edges spread the remainder over the clip; clips shorter than the bins repeat samples
+        if len(y) == 0:
+            peaks = np.zeros((bins, 2), dtype=np.float32)
+        else:
+            starts = np.linspace(0, len(y), bins, endpoint=False).astype(np.int64)
+            peaks = np.stack([np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)], axis=1)
+        # Round outwards, so quantization never hides a peak
+        quantized = np.stack([np.floor(peaks[:, 0] * PEAK_SCALE), np.ceil(peaks[:, 1] * PEAK_SCALE)], axis=1)
+        blocks.append(np.clip(quantized, -PEAK_SCALE, PEAK_SCALE).astype(np.int8).tobytes())
+    return b"".join(blocks)
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_store(voices_dir: str, store_path: str, jobs=None) -> bool:
+    """Compute the peaks of every voice file and write the store"""
+    start = time.perf_counter()
+    variants = {}
+    for path in sorted(glob.glob(os.path.join(voices_dir, "*.mp3"))):
+        parsed = parse_asset_name(os.path.basename(path))
+        if parsed:
+            variants[path] = parsed
+        else:
+            print(f"Skipping {os.path.basename(path)}: not a voice variant name")
+
+    # Many variants are copies of the same recording; decode each distinct file once
+    by_hash = {}
+    for path in variants:
+        by_hash.setdefault(file_sha256(path), []).append(path)
+    print(f"Found {len(variants)} voice files ({len(by_hash)} distinct)")
+
+    jobs = jobs or os.cpu_count() or 1
+    peaks = {}
+    errors = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(compute_peaks, paths[0]): digest for digest, paths in by_hash.items()}
+        for future, digest in futures.items():
+            try:
+                peaks[digest] = future.result()
+            except Exception as e:
+                print(f"Error decoding {by_hash[digest][0]}: {e}")
+                errors += 1
+
+    voice_slots = max(int(voice_number) for voice_number, _ in variants.values()) + 1 if variants else 1
+    index = np.zeros(voice_slots * LANES_PER_ZONE ** 4, dtype="<u4")
+    digests = sorted(peaks)
+    for block, digest in enumerate(digests):
+        for path in by_hash[digest]:
+            voice_number, lanes = variants[path]
+            index[variant_offset(int(voice_number), lanes)] = block + 1
+
+    tmp_path = f"{store_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PEAKS_HEADER.pack(PEAKS_MAGIC, voice_slots, len(digests), len(PEAK_LEVELS)))
+        f.write(struct.pack(f"<{len(PEAK_LEVELS)}I", *PEAK_LEVELS))
+        f.write(index.tobytes())
+        for digest in digests:
+            f.write(bytes.fromhex(digest))
+        for digest in digests:
+            f.write(peaks[digest])
+    os.replace(tmp_path, store_path)
+
+    stored = sum(len(by_hash[digest]) for digest in digests)
+    print(f"Wrote peaks of {stored} variants ({len(digests)} distinct) at {'/'.join(map(str, PEAK_LEVELS))} bins "
+          f"to {store_path} ({os.path.getsize(store_path) / 1024:.1f} KB) "
+          f"in {time.perf_counter() - start:.2f}s with {jobs} worker(s)")
+    return errors == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voices-dir", default=VOICES_DIR, help="directory containing the source audio files")
+    parser.add_argument("--output", default=STORE_PATH, help="path of the waveform store")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    ok = build_store(args.voices_dir, args.output, jobs=args.jobs)
+    raise SystemExit(0 if ok else 1)
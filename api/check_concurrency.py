@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Utility script to check that /api/process requests don't block each other
+
+Sends N simultaneous requests with a simulated processing delay and checks
+that they all finish in about one delay period instead of N.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+
+async def run_requests(app, count: int):
+    """Send `count` concurrent /api/process requests and return the elapsed time"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def move_card(i: int):
+            response = await client.post(
+                "/api/process",
+                json={"cardName": f"Voice {i % 3 + 1}", "zoneName": "Zone 1", "laneName": f"Lane {i % 3 + 1}"},
+                headers={"X-Session-ID": f"concurrency-check-{i}"},
+            )
+            response.raise_for_status()
+            return response.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(move_card(i) for i in range(count)))
+        elapsed = time.perf_counter() - start
+
+    errors = [r for r in results if r["status"] != "success"]
+    return elapsed, errors
+
+
+def check_concurrency(count: int, delay: float, tolerance: float) -> bool:
+    """Check that `count` concurrent requests finish within `tolerance` delay periods"""
+    # The delay has to be configured before the app module is imported
+    os.environ["PROCESSING_DELAY"] = str(delay)
+    from main import app
+
+    print(f"Sending {count} concurrent requests with a {delay}s processing delay...")
+    elapsed, errors = asyncio.run(run_requests(app, count))
+
+    limit = delay * tolerance
+    print(f"Finished in {elapsed:.2f}s (limit {limit:.2f}s, serial would take {delay * count:.2f}s)")
+
+    if errors:
+        print(f"✗ {len(errors)} requests returned an error: {errors[0]['message']}")
+        return False
+    if elapsed > limit:
+        print("✗ Requests are being serialized!")
+        return False
+
+    print("✓ Requests were processed concurrently")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20, help="number of simultaneous requests")
+    parser.add_argument("--delay", type=float, default=1.0, help="simulated processing delay in seconds")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="allowed total time, as a multiple of the delay")
+    args = parser.parse_args()
+
+    success = check_concurrency(args.requests, args.delay, args.tolerance)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Utility script to check that prefetch hints are the URLs the page requests
+
+/api/process advertises the audio and spectrograms of the moves one step
+away (a prefetch list and a Link header), but the browser only uses a
+prefetched response if the page later requests exactly the same URL. This
+checks both sides:
+
+- the audio quality and spectrogram size the hints use are the ones the
+  page and its components pass to audioUrl() and spectrogramUrl()
+- for every move one step away from a voice's first position, the URLs the
+  page requests after making it (built like lib/api-client.ts does) were
+  among the hints of the position before it
+
+Moves whose audio isn't pregenerated are skipped: synthesized audio is
+versioned by the synthesis parameters until it is rendered, so its URL
+changes when the render completes.
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+
+# Where the client code lives, relative to this script
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Lanes reachable from Zone 1 Lane 1: the other lanes of Zone 1, and every lane of Zone 2
+NEIGHBOR_MOVES = [("Zone 1", "Lane 2"), ("Zone 1", "Lane 3"),
+                  ("Zone 2", "Lane 1"), ("Zone 2", "Lane 2"), ("Zone 2", "Lane 3")]
+
+
+def with_param(url: str, name: str, value: str) -> str:
+    """Append a query parameter the way lib/api-client.ts does"""
+    return f"{url}{'&' if '?' in url else '?'}{name}={value}"
+
+
+def audio_url(url: str, quality: str) -> str:
+    """Build an audio URL at a quality like lib/api-client.ts audioUrl()"""
+    return url if quality == "full" else with_param(url, "quality", quality)
+
+
+def client_url_arguments(function: str) -> set:
+    """Return the quality/size literals the client passes to an api-client URL builder"""
+    values = set()
+    for pattern in ("app/**/*.tsx", "components/**/*.tsx"):
+        for path in glob.glob(os.path.join(CLIENT_DIR, pattern), recursive=True):
+            with open(path, "r", encoding="utf-8") as f:
+                values.update(re.findall(rf"{function}\([^,()]+,\s*'(\w+)'\)", f.read()))
+    return values
+
+
+def check_client(audio_quality: str, spectrogram_size: str) -> list:
+    """Check that the hinted quality and size are the ones the client requests"""
+    problems = []
+    qualities = client_url_arguments("audioUrl")
+    if qualities != {audio_quality}:
+        problems.append(f"The page plays audio at {sorted(qualities) or 'full quality'}, "
+                        f"but prefetch hints use {audio_quality}")
+    sizes = client_url_arguments("spectrogramUrl")
+    if spectrogram_size not in sizes:
+        problems.append(f"The client shows spectrograms at {sorted(sizes)}, "
+                        f"but prefetch hints use {spectrogram_size}")
+    return problems
+
+
+def move(client, session: str, voice: str, zone: str, lane: str, previous_zone: str):
+    response = client.post(
+        "/api/process",
+        json={"cardName": voice, "zoneName": zone, "laneName": lane, "previousZone": previous_zone},
+        headers={"X-Session-ID": session},
+    )
+    response.raise_for_status()
+    return response
+
+
+def check_hints(voices: int) -> bool:
+    """Make every move one step away from Zone 1 Lane 1 and check it was hinted"""
+    # Renders would change synthesized URLs while the check runs
+    os.environ["VOICE_SYNTHESIS"] = "0"
+    from fastapi.testclient import TestClient
+
+    import main
+
+    problems = check_client(main.PREFETCH_AUDIO_QUALITY, main.PREFETCH_SPECTROGRAM_SIZE)
+    checked = skipped = 0
+    with TestClient(main.app) as client:
+        for voice_number in range(1, voices + 1):
+            voice = f"Voice {voice_number}"
+            start = move(client, f"prefetch-check-{voice_number}", voice, "Zone 1", "Lane 1", "holding")
+            hints = set(start.json().get("prefetch") or [])
+            link = dict(re.findall(r"<([^>]+)>; rel=prefetch; as=(\w+)", start.headers.get("link", "")))
+            if not hints:
+                problems.append(f"{voice}: no prefetch hints")
+                continue
+            if set(link) != hints:
+                problems.append(f"{voice}: the Link header and the prefetch list differ")
+            problems.extend(f"{voice}: {url} is hinted as={kind}" for url, kind in link.items()
+                            if (kind == "audio") != url.startswith("/processed/"))
+
+            for zone, lane in NEIGHBOR_MOVES:
+                session = f"prefetch-check-{voice_number}-{zone}-{lane}"
+                move(client, session, voice, "Zone 1", "Lane 1", "holding")
+                result = move(client, session, voice, zone, lane, "Zone 1").json()
+                audio_file = result.get("audioFile")
+                if not audio_file or not main.asset_index.find("audio", os.path.basename(audio_file.split("?", 1)[0])):
+                    skipped += 1
+                    continue
+                # What the page requests after this move (app/page.tsx, components/ui/master-details.tsx)
+                expected = [audio_url(audio_file, main.PREFETCH_AUDIO_QUALITY),
+                            with_param(result["metadata"]["spectrogram"], "size", main.PREFETCH_SPECTROGRAM_SIZE)]
+                for url in expected:
+                    checked += 1
+                    if url not in hints:
+                        problems.append(f"{voice} {zone} {lane}: {url} was not hinted")
+
+    print(f"Checked {checked} URLs of {voices * len(NEIGHBOR_MOVES) - skipped} moves "
+          f"({skipped} moves without pregenerated audio skipped)")
+    for problem in problems:
+        print(f"✗ {problem}")
+    if problems:
+        return False
+    print("✓ Prefetch hints are the URLs the page requests")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voices", type=int, default=3, help="number of voices to check")
+    args = parser.parse_args()
+
+    success = check_hints(args.voices)
+    sys.exit(0 if success else 1)
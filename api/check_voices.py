@@ -1,10 +1,47 @@
 #!/usr/bin/env python3
 """
-Utility script to check if the voice files are available
+Utility script to verify the voice, spectrogram and stats assets
+
+Checks every asset the API serves, from the asset directories or the asset pack:
+
+- every MP3 starts with valid, consistent MPEG audio frames
+- every spectrogram is a PNG/WebP with the dimensions of its size
+- every preview transcode has the container signature of its format
+- every stats file is JSON with emotion scores
+- every voice has its default recording, and which (voice, lane path)
+  combinations lack audio, a spectrogram, stats, variants or previews
+- the audio still matches the source hashes recorded by the spectrogram and
+  preview builds, so stale derived assets are caught
+- every file's content matches the sha256 recorded for it: by the asset pack
+  index for packed files, or by the last report for files whose size and
+  mtime haven't changed since it was written
+
+Files are checked in parallel on a thread (or, with --processes, process) pool.
+The report is saved to ASSET_REPORT_PATH and doubles as a cache: files whose
+size and mtime haven't changed since the last run are only hashed, not checked
+again. The API's /ready endpoint reports its result.
 """
 
+import argparse
+import hashlib
+import json
 import os
+import struct
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asset_index import AssetIndex, asset_basename
+from asset_pack import open_asset, process_pack
+from spectrogram_renderer import VARIANT_SIZES
+
+# Configuration
+VOICES_DIR = "./voices"
+STATS_DIR = "./stats"
+SPECTROGRAMS_DIR = "./spectrograms"
+REPORT_PATH = os.environ.get("ASSET_REPORT_PATH", "./asset_report.json")
+
+REPORT_VERSION = 1
 
 # Voice files that should be available
 EXPECTED_VOICE_FILES = [
@@ -13,31 +50,327 @@ EXPECTED_VOICE_FILES = [
     "./voices/voice_3_Z1_L0_Z2_L0_Z3_L0_Z4_L0.mp3"
 ]
 
-def check_voices():
-    """Check if the voice files are available"""
-    print("Checking voice files...")
-    
-    if not os.path.exists("./voices"):
-        print("ERROR: voices directory does not exist!")
-        return False
-        
-    print(f"voices directory exists. Contents: {os.listdir('./voices')}")
-    
-    all_exist = True
-    for voice_path in EXPECTED_VOICE_FILES:
-        if os.path.exists(voice_path):
-            print(f"✓ Found: {voice_path}")
+# Manifests of the builds that derive assets from the audio, recording the source hashes they used
+DERIVED_MANIFESTS = {
+    "spectrogram": os.path.join(SPECTROGRAMS_DIR, ".manifest.json"),
+    "preview": os.path.join(VOICES_DIR, "previews", ".manifest.json"),
+}
+
+# MPEG audio header tables: bitrates (kbps) by [version is MPEG-1][layer], sample rates by version
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Leading bytes of each preview container
+PREVIEW_SIGNATURES = {".webm": (0, b"\x1a\x45\xdf\xa3"), ".opus": (0, b"OggS"), ".m4a": (4, b"ftyp")}
+
+
+def parse_mpeg_frame(data: bytes, offset: int):
+    """Return (header fields, frame length) of the MPEG audio frame at offset, or None if there is none"""
+    if offset + 4 > len(data):
+        return None
+    header = struct.unpack_from(">I", data, offset)[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        length = (144 if mpeg1 or layer == 2 else 72) * bitrate // sample_rate + padding
+    channels = 1 if (header >> 6) & 3 == 3 else 2
+    return (version, layer, sample_rate, channels), length
+
+
+def check_mp3(data: bytes) -> dict:
+    """Check that audio starts with two consecutive, consistent MPEG frames"""
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # ID3v2 tag size is a 28-bit syncsafe integer
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+    # Tolerate zero padding between the tag and the first frame
+    while offset < len(data) and data[offset] == 0:
+        offset += 1
+
+    first = parse_mpeg_frame(data, offset)
+    if first is None:
+        raise ValueError(f"no MPEG audio frame at byte {offset}")
+    fields, length = first
+    second = parse_mpeg_frame(data, offset + length)
+    if second is None or second[0] != fields:
+        raise ValueError(f"MPEG frame at byte {offset} isn't followed by a matching frame")
+    return {"layer": fields[1], "sample_rate": fields[2], "channels": fields[3]}
+
+
+def image_dimensions(data: bytes):
+    """Return (format, width, height) of a PNG or WebP image"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        return ("png",) + struct.unpack_from(">II", data, 16)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        chunk = data[12:16]
+        if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack_from("<HH", data, 26)
+            return "webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and data[20] == 0x2F:
+            bits = int.from_bytes(data[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return "webp", int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    raise ValueError("not a PNG or WebP image")
+
+
+def check_stats(data: bytes) -> dict:
+    stats = json.loads(data)
+    top_emotions = stats.get("top_emotions") if isinstance(stats, dict) else None
+    if not isinstance(top_emotions, dict) or not any(top_emotions.get(c) for c in ("language", "prosody")):
+        raise ValueError("no language or prosody emotion scores")
+    for category in ("language", "prosody"):
+        for item in top_emotions.get(category) or []:
+            if not isinstance(item.get("name"), str) or not isinstance(item.get("score"), (int, float)):
+                raise ValueError(f"malformed {category} emotion entry: {item}")
+    return {}
+
+
+def read_asset(path: str) -> bytes:
+    source = open_asset(path)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source.getvalue()
+
+
+def verify_file(kind: str, path: str, expected=None, expected_sha256=None, recorded_by=None,
+                hash_only=False) -> dict:
+    """Check one asset file (runs in a worker); returns its sha256, and an error or details
+
+    expected_sha256 is the hash recorded_by (the asset pack or the last report)
+    has for the file; with hash_only, the content is checked against it only.
+    """
+    result = {"sha256": None, "error": None, "info": {}}
+    try:
+        data = read_asset(path)
+        result["sha256"] = hashlib.sha256(data).hexdigest()
+        if expected_sha256 and result["sha256"] != expected_sha256:
+            raise ValueError(f"sha256 {result['sha256'][:16]} doesn't match {expected_sha256[:16]} "
+                             f"recorded by {recorded_by}")
+        if hash_only:
+            return result
+        if kind == "audio":
+            result["info"] = check_mp3(data)
+        elif kind == "spectrogram":
+            fmt, width, height = image_dimensions(data)
+            result["info"] = {"format": fmt, "width": width, "height": height}
+            if expected and (width, height) != tuple(expected):
+                raise ValueError(f"{width}x{height} image, expected {expected[0]}x{expected[1]}")
+        elif kind == "preview":
+            offset, signature = PREVIEW_SIGNATURES[os.path.splitext(path)[1]]
+            if data[offset:offset + len(signature)] != signature:
+                raise ValueError(f"not a {os.path.splitext(path)[1][1:]} file")
+        elif kind == "stats":
+            result["info"] = check_stats(data)
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+def load_report(report_path: str) -> dict:
+    """Load the previous report, or return an empty one"""
+    try:
+        with open(report_path, "r") as f:
+            report = json.load(f)
+        if report.get("version") == REPORT_VERSION:
+            return report
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable report {report_path}: {e}")
+    return {"version": REPORT_VERSION, "files": {}}
+
+
+def load_source_hashes(manifest_path: str) -> dict:
+    """Return {audio file name: sha256} recorded in a derived build's manifest"""
+    try:
+        with open(manifest_path, "r") as f:
+            files = json.load(f).get("files", {})
+        return {name: entry.get("source_sha256") for name, entry in files.items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def collect_files(index: AssetIndex) -> dict:
+    """Return {path: (kind, expected dimensions)} of every indexed asset file"""
+    files = {}
+    for kind in ("audio", "stats"):
+        for name in index.names(kind):
+            files[index.find(kind, name)] = (kind, None)
+    for (name, size, fmt), path in index.spectrogram_variants().items():
+        files[path] = ("spectrogram", VARIANT_SIZES.get(size))
+    for (name, fmt), path in index.audio_previews().items():
+        files[path] = ("preview", None)
+    return files
+
+
+def find_missing(index: AssetIndex) -> dict:
+    """Return the combinations (and files) lacking each kind of asset"""
+    missing = {"audio": [], "spectrogram": [], "stats": [], "spectrogram_variants": [], "audio_previews": []}
+    variants = index.spectrogram_variants()
+    previews = index.audio_previews()
+    variant_kinds = {(size, fmt) for _, size, fmt in variants}
+    preview_formats = {fmt for _, fmt in previews}
+
+    for voice_number, lanes in sorted(index.combinations()):
+        name = asset_basename(voice_number, lanes)
+        for kind in ("audio", "spectrogram", "stats"):
+            if not index.lookup(kind, voice_number, lanes):
+                missing[kind].append(name)
+        # Variants and previews are only expected in the sizes and formats that were generated at all
+        if index.lookup("spectrogram", voice_number, lanes):
+            missing["spectrogram_variants"] += [
+                f"{size}/{name}.{fmt}" for size, fmt in sorted(variant_kinds) if (name, size, fmt) not in variants
+            ]
+        if index.lookup("audio", voice_number, lanes):
+            missing["audio_previews"] += [
+                f"{name}.{fmt}" for fmt in sorted(preview_formats) if (name, fmt) not in previews
+            ]
+    return missing
+
+
+def check_voices(jobs=None, processes=False, force=False, report_path=REPORT_PATH) -> bool:
+    """Verify the assets and write the report; returns True if there are no errors"""
+    start = time.perf_counter()
+    print("Checking voice, spectrogram and stats assets...")
+
+    index = AssetIndex(VOICES_DIR, STATS_DIR, SPECTROGRAMS_DIR, pack=process_pack())
+    index.refresh()
+    files = collect_files(index)
+
+    previous = load_report(report_path)["files"] if not force else {}
+    checked = {}
+    pending = []
+    unchanged = 0
+    for path, (kind, expected) in files.items():
+        stat_result = index.stat(path)
+        key = [stat_result.st_size, stat_result.st_mtime] if stat_result else None
+        cached = previous.get(path)
+        packed = index.packed(path)
+        if cached and key and cached.get("key") == key and cached.get("kind") == kind and not cached.get("error"):
+            # Unchanged since the last run: only confirm the content is still what was checked
+            unchanged += 1
+            if packed:
+                pending.append((path, kind, expected, key, packed.sha256, "the asset pack index", cached))
+            else:
+                pending.append((path, kind, expected, key, cached.get("sha256"), "the last report", cached))
+        elif packed:
+            pending.append((path, kind, expected, key, packed.sha256, "the asset pack index", None))
         else:
-            print(f"✗ Missing: {voice_path}")
-            all_exist = False
-            
-    if all_exist:
-        print("All voice files found!")
+            pending.append((path, kind, expected, key, None, None, None))
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"{len(files)} files: {unchanged} unchanged since the last run (hashed only), "
+          f"{len(pending) - unchanged} to check with {jobs} {'process' if processes else 'thread'}(s)")
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=jobs) as executor:
+        futures = [(path, kind, key, cached,
+                    executor.submit(verify_file, kind, path, expected, expected_sha256, recorded_by, bool(cached)))
+                   for path, kind, expected, key, expected_sha256, recorded_by, cached in pending]
+        for path, kind, key, cached, future in futures:
+            result = future.result()
+            if cached and not result["error"]:
+                checked[path] = cached
+            else:
+                checked[path] = {"kind": kind, "key": key, **result}
+
+    errors = []
+    warnings = []
+    for path, result in sorted(checked.items()):
+        if result["error"]:
+            errors.append(f"{path}: {result['error']}")
+
+    for voice_path in EXPECTED_VOICE_FILES:
+        if not index.find("audio", os.path.basename(voice_path)):
+            errors.append(f"{voice_path}: default recording is missing")
+
+    missing = find_missing(index)
+    for name in missing["audio"]:
+        errors.append(f"{name}: has other assets but no audio")
+    if missing["spectrogram"]:
+        warnings.append(f"{len(missing['spectrogram'])} combinations have no spectrogram (rendered on demand)")
+    if missing["spectrogram_variants"]:
+        warnings.append(f"{len(missing['spectrogram_variants'])} spectrogram variants are missing (full size is served)")
+    if missing["audio_previews"]:
+        warnings.append(f"{len(missing['audio_previews'])} audio previews are missing (the original is served)")
+
+    # Derived assets built from a different version of their audio
+    for build, manifest_path in DERIVED_MANIFESTS.items():
+        stale = []
+        for name, source_sha256 in load_source_hashes(manifest_path).items():
+            audio_path = index.find("audio", name)
+            if audio_path and audio_path in checked and source_sha256 != checked[audio_path]["sha256"]:
+                stale.append(name)
+        if stale:
+            warnings.append(f"{len(stale)} {build}s were built from older audio, e.g. {stale[0]}; rebuild them")
+
+    counts = {}
+    for result in checked.values():
+        counts[result["kind"]] = counts.get(result["kind"], 0) + 1
+    report = {
+        "version": REPORT_VERSION,
+        "checked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "ok": not errors,
+        "counts": counts,
+        "errors": errors,
+        "warnings": warnings,
+        "missing": {kind: names for kind, names in missing.items()},
+        "files": checked,
+    }
+    tmp_path = f"{report_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, report_path)
+
+    print(f"Checked {', '.join(f'{count} {kind}' for kind, count in sorted(counts.items()))} "
+          f"in {time.perf_counter() - start:.2f}s")
+    for kind in ("spectrogram", "stats"):
+        if missing[kind]:
+            print(f"  {len(missing[kind])} combinations without {kind}, e.g. {missing[kind][0]}")
+    for warning in warnings:
+        print(f"! {warning}")
+    for error in errors[:20]:
+        print(f"✗ {error}")
+    if len(errors) > 20:
+        print(f"✗ ... and {len(errors) - 20} more errors")
+    print(f"Report written to {report_path}")
+
+    if errors:
+        print(f"{len(errors)} problem(s) found!")
     else:
-        print("Some voice files are missing!")
-        
-    return all_exist
+        print("All assets verified!")
+    return not errors
+
 
 if __name__ == "__main__":
-    success = check_voices()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="parallel workers (default: number of CPUs)")
+    parser.add_argument("--processes", action="store_true", help="check files on a process pool instead of threads")
+    parser.add_argument("--force", action="store_true", help="check every file, ignoring the previous report")
+    parser.add_argument("--report", default=REPORT_PATH, help="path of the report")
+    args = parser.parse_args()
+
+    success = check_voices(jobs=args.jobs, processes=args.processes, force=args.force, report_path=args.report)
+    sys.exit(0 if success else 1)
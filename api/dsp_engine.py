@@ -0,0 +1,512 @@
+"""
+Voice synthesis for lane paths without a pregenerated recording
+
+Only some lane paths have a recording in the voices directory. Any other path
+is rendered from the longest pregenerated prefix of that path (at least the
+voice's base recording, voice_N_Z1_L0_Z2_L0_Z3_L0_Z4_L0.mp3) by applying the
+effect of each remaining zone's lane in turn:
+
+- Zone 1 (initialization): register - pitch shift, saturation
+- Zone 2 (feature_extraction): pacing - time stretch, inserted pauses
+- Zone 3 (transformation): style - EQ, small pitch/tempo changes
+- Zone 4 (finalization): accent coloring - EQ and slight pitch
+
+Audio is processed block by block through a generator pipeline (decode, one
+stage per zone, limiter, MP3 encoder) and the encoded frames are written to a
+partial file as soon as each block is ready, so playback can start while the
+rest is still rendering and memory stays bounded by the block size. Effects
+that need neighbouring audio (pitch, tempo, EQ) see a little context from the
+adjacent blocks, and consecutive blocks are crossfaded.
+
+The output of every zone is cached on disk as a float32 WAV stage, so paths
+that share a prefix only render the zones after it. Rendering runs in a
+process pool sized to the available cores; librosa is only imported in the
+workers.
+
+Rendered files live in a subdirectory of the cache named after the render
+version, so changing an effect or the limiter never serves an old render, and
+are evicted in least recently used order past a size limit.
+"""
+
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from asset_index import asset_basename
+from asset_pack import asset_exists, open_asset
+from log_config import get_logger
+
+logger = get_logger("dsp")
+
+# Effect parameters of each lane, by zone number and lane number. Keys:
+# pitch (semitones), tempo (speed factor), eq (list of (type, Hz, dB)),
+# drive (soft-clipping amount, relative to full scale), pause_every (seconds
+# between inserted pauses), gain (dB). Lane 0 means the zone was not visited
+# and changes nothing.
+LANE_EFFECTS = {
+    1: {
+        "1": {"pitch": 3.0},                                                  # High
+        "2": {"drive": 4.0, "eq": [("highshelf", 3000, 3.0)], "gain": -2.0},  # Raspy
+        "3": {"pitch": -3.0},                                                 # Low
+    },
+    2: {
+        "1": {"tempo": 1.25},                                                 # Fast
+        "2": {"tempo": 0.8},                                                  # Slow
+        "3": {"tempo": 0.9, "pause_every": 0.8},                              # Hesitant
+    },
+    3: {
+        "1": {"eq": [("lowshelf", 150, -6.0), ("peak", 2500, 4.0)]},          # Corporate
+        "2": {"eq": [("lowshelf", 250, 4.0), ("highshelf", 6000, -3.0)], "tempo": 0.95},  # Artspeak
+        "3": {"eq": [("highshelf", 5000, 5.0)], "pitch": 1.0, "tempo": 1.1},  # Gen-Z
+    },
+    4: {
+        "1": {"eq": [("peak", 1000, 2.0)]},                                   # American
+        "2": {"eq": [("peak", 3000, 3.0)], "pitch": 0.5},                     # Italian
+        "3": {"eq": [("peak", 500, 3.0)], "pitch": -0.5},                     # Albanian
+    },
+}
+
+# Length of the silences inserted by pause_every
+PAUSE_SECONDS = 0.15
+
+# Peak level the output is limited to, and the level the limiter starts compressing at
+OUTPUT_PEAK = 0.97
+LIMITER_KNEE = 0.8
+
+# Length of the blocks the pipeline processes, of the context each block sees
+# from its neighbours, and of the crossfade between consecutive blocks
+BLOCK_SECONDS = 1.0
+CONTEXT_SECONDS = 0.25
+CROSSFADE_SECONDS = 0.02
+
+
+def eq_curve(freqs, bands):
+    """Return the linear gain of a list of (type, Hz, dB) bands at the given frequencies"""
+    import numpy as np
+
+    log_f = np.log2(np.maximum(freqs, 1.0))
+    gain_db = np.zeros_like(freqs)
+    for band_type, center, db in bands:
+        octaves = log_f - np.log2(center)
+        if band_type == "peak":
+            gain_db += db * np.exp(-0.5 * (octaves / 0.5) ** 2)
+        elif band_type == "highshelf":
+            gain_db += db / (1.0 + np.exp(-4.0 * octaves))
+        elif band_type == "lowshelf":
+            gain_db += db / (1.0 + np.exp(4.0 * octaves))
+        else:
+            raise ValueError(f"Unknown EQ band type: {band_type}")
+    return 10.0 ** (gain_db / 20.0)
+
+
+def insert_pauses(y, sr: int, every: float, offset: int = 0):
+    """Insert short silences at the quietest point near every `every` seconds
+
+    `offset` is the position of y in the whole signal (in samples), so pauses
+    stay evenly spaced when the signal is processed in blocks.
+    """
+    import numpy as np
+
+    hop = 512
+    n_frames = len(y) // hop
+    if n_frames < 2:
+        return y
+    rms = np.sqrt(np.mean(y[:n_frames * hop].reshape(n_frames, hop) ** 2, axis=1))
+
+    window = max(1, int(0.2 * sr / hop))
+    step = every * sr
+    cuts = []
+    for k in itertools.count(int(offset // step) + 1):
+        center = int((k * step - offset) / hop)
+        if center >= n_frames:
+            break
+        lo, hi = max(0, center - window), min(n_frames, center + window)
+        cuts.append((lo + int(np.argmin(rms[lo:hi]))) * hop)
+    if not cuts:
+        return y
+
+    silence = np.zeros(int(PAUSE_SECONDS * sr), dtype=y.dtype)
+    pieces = []
+    for piece in np.split(y, sorted(cuts)):
+        pieces.extend([piece, silence])
+    return np.concatenate(pieces[:-1])
+
+
+def spectral_effects(y, sr: int, effect: dict):
+    """Apply the parts of a lane's effect that depend on neighbouring audio (pitch, tempo, EQ)"""
+    import numpy as np
+    import librosa
+
+    if effect.get("pitch"):
+        y = librosa.effects.pitch_shift(y, sr=sr, n_steps=effect["pitch"])
+    if effect.get("tempo"):
+        y = librosa.effects.time_stretch(y, rate=effect["tempo"])
+    if effect.get("eq"):
+        spectrum = np.fft.rfft(y)
+        spectrum *= eq_curve(np.fft.rfftfreq(len(y), 1.0 / sr), effect["eq"])
+        y = np.fft.irfft(spectrum, n=len(y))
+    return y.astype(np.float32)
+
+
+def sample_effects(y, sr: int, effect: dict, offset: int = 0):
+    """Apply the parts of a lane's effect that work on each block on its own (pauses, drive, gain)"""
+    import numpy as np
+
+    if effect.get("pause_every"):
+        y = insert_pauses(y, sr, effect["pause_every"], offset)
+    if effect.get("drive"):
+        y = np.tanh(effect["drive"] * y) / np.tanh(effect["drive"])
+    if effect.get("gain"):
+        y = y * 10.0 ** (effect["gain"] / 20.0)
+    return y.astype(np.float32)
+
+
+def limit(y):
+    """Soft-limit samples above LIMITER_KNEE so the output never exceeds OUTPUT_PEAK"""
+    import numpy as np
+
+    magnitude = np.abs(y)
+    over = magnitude > LIMITER_KNEE
+    if not over.any():
+        return y
+    headroom = OUTPUT_PEAK - LIMITER_KNEE
+    limited = LIMITER_KNEE + headroom * np.tanh((magnitude[over] - LIMITER_KNEE) / headroom)
+    y = y.copy()
+    y[over] = np.sign(y[over]) * limited
+    return y
+
+
+def read_blocks(path: str, block_size: int):
+    """Decode an audio file as mono float32 blocks"""
+    import soundfile as sf
+
+    for block in sf.blocks(open_asset(path), blocksize=block_size, dtype="float32", always_2d=True):
+        yield block.mean(axis=1)
+
+
+def rechunk(blocks, size: int):
+    """Regroup blocks into blocks of `size` samples; the last one takes the remainder (up to 2 * size)"""
+    import numpy as np
+
+    buffer = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= 2 * size:
+            yield buffer[:size]
+            buffer = buffer[size:]
+    if len(buffer):
+        yield buffer
+
+
+def stream_lane(blocks, sr: int, effect: dict):
+    """Apply one lane's effect to a stream of blocks"""
+    import numpy as np
+
+    context = int(CONTEXT_SECONDS * sr)
+    fade = int(CROSSFADE_SECONDS * sr)
+    empty = np.zeros(0, dtype=np.float32)
+
+    blocks = rechunk(blocks, int(BLOCK_SECONDS * sr))
+    current = next(blocks, None)
+    previous_tail = empty
+    pending = None  # output past the previous block's end, crossfaded into this block's start
+    position = 0
+    while current is not None:
+        following = next(blocks, None)
+        following_head = following[:context] if following is not None else empty
+
+        padded = np.concatenate([previous_tail, current, following_head])
+        out = spectral_effects(padded, sr, effect)
+        # Map the block's boundaries into the output, which tempo changes stretch
+        ratio = len(out) / len(padded)
+        start = round(len(previous_tail) * ratio)
+        end = len(out) - round(len(following_head) * ratio)
+        out = out[start:end + fade] if following is not None else out[start:]
+
+        if pending is not None:
+            n = min(len(pending), len(out))
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            out = out.copy()
+            out[:n] = pending[:n] * (1.0 - ramp) + out[:n] * ramp
+        if following is not None and len(out) > fade:
+            out, pending = out[:-fade], out[-fade:]
+        else:
+            pending = None
+
+        yield sample_effects(out, sr, effect, position)
+        position += len(out)
+        previous_tail = current[-context:]
+        current = following
+
+
+def cache_blocks(blocks, sr: int, path: str):
+    """Pass blocks through while writing them to a WAV file, which appears once the stream is complete"""
+    import soundfile as sf
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with sf.SoundFile(tmp_path, "w", sr, 1, format="WAV", subtype="FLOAT") as f:
+            for block in blocks:
+                f.write(block)
+                yield block
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def synthesize(voice_number: str, lanes: Tuple[str, ...], voices_dir: str, cache_dir: str,
+               partial_path: Optional[str] = None) -> str:
+    """Render the recording for a lane path and return the path of the MP3 (runs in a worker process)
+
+    The MP3 grows block by block at `partial_path` and is renamed into place
+    when complete.
+    """
+    import soundfile as sf
+
+    stages_dir = os.path.join(cache_dir, "stages")
+    os.makedirs(stages_dir, exist_ok=True)
+    output_path = os.path.join(cache_dir, asset_basename(voice_number, lanes) + ".mp3")
+    partial_path = partial_path or f"{output_path}.tmp{os.getpid()}"
+
+    # Start from the longest prefix that was recorded, or that an earlier render cached
+    source, start_zone = None, 0
+    for zone in range(4, -1, -1):
+        name = asset_basename(voice_number, tuple(lanes[:zone]) + ("0",) * (4 - zone))
+        for candidate in (os.path.join(stages_dir, name + ".wav"), os.path.join(voices_dir, name + ".mp3")):
+            if asset_exists(candidate):
+                source, start_zone = candidate, zone
+                break
+        if source:
+            break
+    if source is None:
+        raise FileNotFoundError(f"No base recording for voice {voice_number} in {voices_dir}")
+
+    sr = sf.info(open_asset(source)).samplerate
+    blocks = read_blocks(source, int(BLOCK_SECONDS * sr))
+    for zone in range(start_zone + 1, 5):
+        lane = lanes[zone - 1]
+        if lane == "0":
+            continue
+        blocks = stream_lane(blocks, sr, LANE_EFFECTS[zone][lane])
+        # Cache this zone's output for every path sharing the prefix
+        stage = asset_basename(voice_number, tuple(lanes[:zone]) + ("0",) * (4 - zone))
+        blocks = cache_blocks(blocks, sr, os.path.join(stages_dir, stage + ".wav"))
+
+    try:
+        # Unbuffered, so every encoded block is visible to readers of the partial file right away
+        with open(partial_path, "wb", buffering=0) as f, sf.SoundFile(f, "w", sr, 1, format="MP3") as out:
+            for block in blocks:
+                out.write(limit(block))
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return output_path
+
+
+def render_version() -> str:
+    """Return a hash of everything that affects synthesized audio, used to version it before it exists"""
+    params = {
+        "effects": LANE_EFFECTS,
+        "pause_seconds": PAUSE_SECONDS,
+        "output_peak": OUTPUT_PEAK,
+        "limiter_knee": LIMITER_KNEE,
+        "block_seconds": BLOCK_SECONDS,
+        "context_seconds": CONTEXT_SECONDS,
+        "crossfade_seconds": CROSSFADE_SECONDS,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _is_render_version(name: str) -> bool:
+    return len(name) == 16 and all(c in "0123456789abcdef" for c in name)
+
+
+class VoiceSynthesizer:
+    """Renders missing lane paths in a process pool, one render per path at a time"""
+
+    def __init__(self, voices_dir: str, cache_root: str, workers: int, timeout: float, max_bytes: int):
+        self.voices_dir = voices_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.version = render_version()
+        # Renders of other versions are never served again
+        self.cache_root = cache_root
+        self.cache_dir = os.path.join(cache_root, self.version[:16])
+        self._executor = None
+        self._lock = threading.Lock()
+        # file name -> concurrent.futures.Future of the render in progress
+        self._inflight = {}
+        # path of a rendered MP3 or stage WAV -> bytes, least recently used first
+        self._files = OrderedDict()
+        self._total_bytes = 0
+        self._files_lock = threading.Lock()
+        os.makedirs(os.path.join(self.cache_dir, "stages"), exist_ok=True)
+        self._remove_stale_versions()
+        self._scan()
+        if self._files:
+            logger.info("Synthesis cache: %d files (%.1f MB) in %s",
+                        len(self._files), self._total_bytes / 1e6, self.cache_dir)
+        self._evict()
+
+    def _remove_stale_versions(self) -> None:
+        # Render versions other than ours, and files from before renders were versioned.
+        # Only names the synthesizer writes, in case SYNTH_CACHE_DIR is shared
+        with os.scandir(self.cache_root) as it:
+            for entry in it:
+                if entry.path == self.cache_dir:
+                    continue
+                if entry.is_dir() and (entry.name == "stages" or _is_render_version(entry.name)):
+                    logger.info("Removing outdated synthesized audio %s", entry.path)
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                elif entry.is_file() and (entry.name.endswith(".mp3") or ".part" in entry.name or ".tmp" in entry.name):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _scan(self) -> None:
+        # Track rendered files this process hasn't seen yet (left by earlier runs, other
+        # workers, or the stages of a render), least recently written first
+        found = []
+        for directory, suffix in ((self.cache_dir, ".mp3"), (os.path.join(self.cache_dir, "stages"), ".wav")):
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith(suffix) and entry.path not in self._files:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        found.append((stat.st_mtime, entry.path, stat.st_size))
+        with self._files_lock:
+            for _, path, size in sorted(found):
+                if path not in self._files:
+                    self._files[path] = size
+                    self._total_bytes += size
+
+    def _touch(self, path: str) -> None:
+        with self._files_lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+
+    def _evict(self) -> None:
+        while True:
+            with self._files_lock:
+                if self._total_bytes <= self.max_bytes or len(self._files) <= 1:
+                    return
+                path, size = self._files.popitem(last=False)
+                self._total_bytes -= size
+            try:
+                os.remove(path)
+                logger.debug("Evicted synthesized %s", os.path.basename(path))
+            except FileNotFoundError:
+                pass  # Evicted by another worker
+
+    def _rendered(self, file_name: str, future: Future) -> None:
+        self._inflight.pop(file_name, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            self._scan()
+            self._touch(future.result())
+            self._evict()
+        except OSError as e:
+            logger.warning("Failed to update the synthesis cache after rendering %s: %s", file_name, e)
+
+    def _submit(self, *args) -> Future:
+        # Called with the lock held. The pool is started on first use, spawned rather than
+        # forked since the server process runs threads, and replaced if a worker died
+        for attempt in range(2):
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            try:
+                return self._executor.submit(synthesize, *args)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                logger.warning("Synthesis worker pool is broken, restarting it")
+                self._executor = None
+
+    def can_synthesize(self, voice_number: str, lanes) -> bool:
+        """Return True if a lane path has known effects and its voice has a base recording"""
+        if any(lane != "0" and lane not in LANE_EFFECTS[zone] for zone, lane in enumerate(lanes, start=1)):
+            return False
+        base_name = asset_basename(voice_number, ("0", "0", "0", "0")) + ".mp3"
+        return asset_exists(os.path.join(self.voices_dir, base_name))
+
+    def output_path(self, voice_number: str, lanes) -> str:
+        """Return where the synthesized recording for a lane path is (or will be) stored"""
+        return os.path.join(self.cache_dir, asset_basename(voice_number, lanes) + ".mp3")
+
+    def partial_path(self, file_name: str) -> str:
+        """Return the file a render started by this process streams its MP3 frames into"""
+        return os.path.join(self.cache_dir, f"{os.path.basename(file_name)}.{os.getpid()}.part")
+
+    def find(self, file_name: str) -> Optional[str]:
+        """Return the path of an already synthesized file, and mark it as recently used"""
+        path = os.path.join(self.cache_dir, os.path.basename(file_name))
+        if not os.path.isfile(path):
+            return None
+        self._touch(path)
+        return path
+
+    def existing_output(self, voice_number: str, lanes) -> Optional[str]:
+        """Return the synthesized recording for a lane path, if it has been rendered"""
+        return self.find(asset_basename(voice_number, lanes) + ".mp3")
+
+    def start(self, voice_number: str, lanes) -> Future:
+        """Start rendering a lane path, or join the render already in progress
+
+        Returns a concurrent.futures.Future resolving to the path of the MP3;
+        while it runs, the MP3 grows at partial_path().
+        """
+        lanes = tuple(lanes)
+        file_name = asset_basename(voice_number, lanes) + ".mp3"
+        with self._lock:
+            future = self._inflight.get(file_name)
+            if future is None:
+                future = self._submit(voice_number, lanes, self.voices_dir, self.cache_dir,
+                                      self.partial_path(file_name))
+                self._inflight[file_name] = future
+                future.add_done_callback(lambda done: self._rendered(file_name, done))
+                logger.info("Synthesizing %s", file_name)
+        return future
+
+    def synthesize(self, voice_number: str, lanes) -> str:
+        """Return the recording for a lane path, rendering it if needed (blocking; call from a thread)"""
+        existing = self.existing_output(voice_number, lanes)
+        if existing:
+            return existing
+        return self.start(voice_number, lanes).result(timeout=self.timeout)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def create_voice_synthesizer(voices_dir: str) -> Optional[VoiceSynthesizer]:
+    """Create the synthesizer configured by the environment, or None if VOICE_SYNTHESIS=0"""
+    if os.environ.get("VOICE_SYNTHESIS", "1").lower() in ("0", "false", "no"):
+        logger.info("Voice synthesis disabled, missing lane paths fall back to the base recording")
+        return None
+
+    cache_dir = os.environ.get("SYNTH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "voice_api_synth"))
+    workers = int(os.environ.get("DSP_WORKERS", str(os.cpu_count() or 1)))
+    timeout = float(os.environ.get("SYNTH_TIMEOUT", "15"))
+    max_bytes = int(float(os.environ.get("SYNTH_CACHE_MAX_MB", "500")) * 1024 * 1024)
+    return VoiceSynthesizer(voices_dir, cache_dir, workers, timeout, max_bytes)
@@ -0,0 +1,120 @@
+"""
+Acoustic features of every pregenerated voice variant
+
+build_feature_store.py computes a fixed set of features for every file in the
+voices directory and stores them as one float32 .npy array of shape
+(features, voice slots, 4, 4, 4, 4): one contiguous column per feature,
+indexed by voice number and the Z1..Z4 lanes. Variants without a recording
+are NaN.
+
+The API memory-maps the file and reads a variant's features straight from
+their computed offsets, so lookups are O(1) and numpy isn't needed at runtime.
+"""
+
+import ast
+import math
+import mmap
+import os
+import struct
+from typing import Dict, Optional
+
+from log_config import get_logger
+
+logger = get_logger("features")
+
+# Columns of the store, in order
+FEATURE_NAMES = (
+    "duration_s",
+    "rms_mean",
+    "rms_peak",
+    "pitch_mean_hz",
+    "pitch_median_hz",
+    "pitch_std_hz",
+    "pitch_range_semitones",
+    "voiced_fraction",
+    "spectral_centroid_hz",
+    "spectral_rolloff_hz",
+    "tempo_bpm",
+)
+
+# Lanes per zone, including 0 (zone not visited)
+LANES_PER_ZONE = 4
+
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def store_shape(voice_slots: int) -> tuple:
+    """Return the array shape of a store holding voices 0..voice_slots-1"""
+    return (len(FEATURE_NAMES), voice_slots) + (LANES_PER_ZONE,) * 4
+
+
+def variant_offset(voice_slot: int, lanes) -> int:
+    """Return the position of a variant within one feature column"""
+    offset = voice_slot
+    for lane in lanes:
+        offset = offset * LANES_PER_ZONE + int(lane)
+    return offset
+
+
+class FeatureStore:
+    """Read-only view of a memory-mapped feature store"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # .npy header: magic, version, header length, then a dict literal describing the array
+        if self._mmap[:6] != NPY_MAGIC:
+            raise ValueError(f"Not a .npy file: {path}")
+        major = self._mmap[6]
+        length_format, length_size = ("<H", 2) if major == 1 else ("<I", 4)
+        (header_length,) = struct.unpack_from(length_format, self._mmap, 8)
+        data_offset = 8 + length_size + header_length
+        header = ast.literal_eval(self._mmap[8 + length_size:data_offset].decode("latin1"))
+
+        if header["descr"] != "<f4" or header["fortran_order"]:
+            raise ValueError(f"Unsupported feature store layout in {path}: {header}")
+        shape = tuple(header["shape"])
+        if shape != store_shape(shape[1]):
+            raise ValueError(f"Feature store {path} has shape {shape}, expected {store_shape(shape[1])}; rebuild it")
+
+        self.voice_slots = shape[1]
+        self._column_length = self.voice_slots * LANES_PER_ZONE ** 4
+        self._values = memoryview(self._mmap)[data_offset:].cast("f")
+
+    def lookup(self, voice_number: str, lanes) -> Optional[Dict[str, float]]:
+        """Return the features of a variant, or None if it wasn't analyzed"""
+        try:
+            voice_slot = int(voice_number)
+            lanes = [int(lane) for lane in lanes]
+        except ValueError:
+            return None
+        if not 0 <= voice_slot < self.voice_slots or any(not 0 <= lane < LANES_PER_ZONE for lane in lanes):
+            return None
+
+        offset = variant_offset(voice_slot, lanes)
+        if math.isnan(self._values[offset]):
+            return None
+        return {
+            name: round(self._values[column * self._column_length + offset], 4)
+            for column, name in enumerate(FEATURE_NAMES)
+        }
+
+    def count(self) -> int:
+        """Return the number of analyzed variants"""
+        return sum(1 for value in self._values[:self._column_length] if not math.isnan(value))
+
+
+def load_feature_store(path: str) -> Optional[FeatureStore]:
+    """Open the feature store, or return None (with a warning) if it is missing or unreadable"""
+    if not os.path.exists(path):
+        logger.warning("Feature store %s not found, run build_feature_store.py to serve acoustic features", path)
+        return None
+    try:
+        store = FeatureStore(path)
+    except (OSError, ValueError, SyntaxError, KeyError) as e:
+        logger.error("Failed to load feature store %s: %s", path, e)
+        return None
+    logger.info("Feature store loaded: %d variants from %s", store.count(), path)
+    return store
@@ -0,0 +1,235 @@
+"""
+HTTP helpers for serving asset files in place
+
+Adds what FileResponse doesn't do on its own: strong ETag/Last-Modified
+validators with 304 handling, single byte-range (206) responses,
+immutable caching for versioned URLs and Accept-header negotiation. Files in
+the asset pack are sent straight from its memory map, or with sendfile when
+the server supports the ASGI zero-copy send extension.
+"""
+
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Cache policy for URLs carrying the current content version (?v=...)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Cache policy for unversioned URLs: cacheable, but revalidated with the ETag
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# Size of the reads used to stream partial responses
+RANGE_CHUNK_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_version(digest: str) -> str:
+    """Shorten a content digest to the version string used in asset URLs"""
+    return digest[:16]
+
+
+def accepts(request: Request, media_type: str) -> bool:
+    """Return True if the request's Accept header explicitly allows a media type (q > 0)"""
+    for item in request.headers.get("accept", "").split(","):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        if media_range.lower() != media_type:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def _not_modified(request: Request, etag: str, mtime: Optional[float]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def _parse_range(range_header: str, size: int):
+    """Return (start, end) for a single byte range, None to ignore it, or False if unsatisfiable"""
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        # Multiple or malformed ranges: serve the whole file instead
+        return None
+
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _range_matches(request: Request, etag: str, last_modified: str) -> bool:
+    # A Range request is only honoured if the If-Range validator still matches
+    if_range = request.headers.get("if-range")
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+def _iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class PackedFileResponse(Response):
+    """Response sending all or part of a file stored in the asset pack"""
+
+    def __init__(self, packed, start: int, end: int, status_code: int, media_type: str, headers: dict):
+        super().__init__(status_code=status_code, media_type=media_type, headers=headers)
+        self.packed = packed
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": self.packed.pack.file,
+                "offset": self.packed.offset + self.start,
+                "count": self.end - self.start,
+                "more_body": False,
+            })
+            return
+
+        # Pages come from the shared page cache; only each chunk handed to the server is copied
+        view = self.packed.view(self.start, self.end)
+        for offset in range(0, len(view), RANGE_CHUNK_SIZE):
+            await send({
+                "type": "http.response.body",
+                "body": bytes(view[offset:offset + RANGE_CHUNK_SIZE]),
+                "more_body": offset + RANGE_CHUNK_SIZE < len(view),
+            })
+        if not view:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def serve_file(
+    request: Request,
+    path: str,
+    media_type: str,
+    stat_result: os.stat_result,
+    digest: str,
+    version: Optional[str] = None,
+    extra_headers: Optional[dict] = None,
+    packed=None,
+) -> Response:
+    """Serve a file with validators, Range support and version-aware cache headers
+
+    `version` is the value of the request's ?v= parameter; the response is
+    only marked immutable when it matches the file's current content version.
+    `extra_headers` (e.g. Vary) are added to every response, including 304s.
+    `packed` is the file's PackedFile when it is served from the asset pack.
+    """
+    etag = f'"{digest}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    immutable = version is not None and version == content_version(digest)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if range_header and _range_matches(request, etag, last_modified):
+        byte_range = _parse_range(range_header, size)
+
+        if byte_range is False:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if packed is not None:
+                return PackedFileResponse(packed, start, end + 1, 206, media_type, headers)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    if packed is not None:
+        return PackedFileResponse(packed, 0, size, 200, media_type, headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+
+def serve_bytes(
+    request: Request,
+    data: bytes,
+    media_type: str,
+    digest: str,
+    version: Optional[str] = None,
+    extra_headers: Optional[dict] = None,
+) -> Response:
+    """Serve a small in-memory payload with an ETag and the same cache headers as serve_file
+
+    `digest` identifies the payload's content; as with serve_file, the response
+    is only marked immutable when `version` matches content_version(digest).
+    """
+    etag = f'"{digest}"'
+    immutable = version is not None and version == content_version(digest)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if _not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Audio Preview Generator Script
+
+Transcodes every audio file in ./api/voices to low-bitrate mono previews in
+./api/voices/previews, served by /processed and /audio with ?quality=preview:
+Opus in WebM and Ogg, and AAC in MP4. WebM and AAC need ffmpeg; without it
+only the Ogg Opus previews are written (with libsndfile).
+
+Builds are incremental: a manifest records the content hash of every source
+file and the encoding parameters used, and only new or changed audio is
+transcoded again. Files with identical content are transcoded once and
+copied, and transcodes run in parallel across a process pool.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from asset_index import AUDIO_PREVIEW_FORMATS, audio_preview_path
+
+# Configuration
+VOICES_DIR = "./voices"  # Source directory containing audio files
+MANIFEST_NAME = ".manifest.json"  # Kept in the previews directory
+
+# Previews are mono speech, so a lower sample rate loses nothing audible
+PREVIEW_SAMPLE_RATE = 24000
+
+# Target bitrate of each preview format
+PREVIEW_BITRATES = {"webm": "32k", "opus": "32k", "aac": "48k"}
+
+# ffmpeg encoder of each preview format
+FFMPEG_CODECS = {"webm": "libopus", "opus": "libopus", "aac": "aac"}
+
+
+def encode_params(formats, use_ffmpeg: bool) -> dict:
+    """Everything that affects the encoded previews; changing any of it transcodes all files again"""
+    return {
+        "encoder": "ffmpeg" if use_ffmpeg else "libsndfile",
+        "formats": list(formats),
+        "sample_rate": PREVIEW_SAMPLE_RATE,
+        "bitrates": {fmt: PREVIEW_BITRATES[fmt] for fmt in formats},
+    }
+
+
+def encode_params_hash(params: dict) -> str:
+    """Return a stable hash of the encoding parameters"""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_with_ffmpeg(audio_file: str, output_path: str, fmt: str) -> None:
+    tmp_path = f"{output_path}.tmp"
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", audio_file, "-vn",
+         "-ac", "1", "-ar", str(PREVIEW_SAMPLE_RATE), "-c:a", FFMPEG_CODECS[fmt], "-b:a", PREVIEW_BITRATES[fmt],
+         "-f", {"webm": "webm", "opus": "ogg", "aac": "mp4"}[fmt], tmp_path],
+        check=True,
+        capture_output=True,
+    )
+    os.replace(tmp_path, output_path)
+
+
+def encode_with_libsndfile(audio_file: str, output_path: str) -> None:
+    import librosa
+    import soundfile as sf
+
+    y, sr = sf.read(audio_file, dtype="float32", always_2d=True)
+    y = librosa.resample(y.mean(axis=1), orig_sr=sr, target_sr=PREVIEW_SAMPLE_RATE)
+    tmp_path = f"{output_path}.tmp"
+    sf.write(tmp_path, y, PREVIEW_SAMPLE_RATE, format="OGG", subtype="OPUS")
+    os.replace(tmp_path, output_path)
+
+
+def create_previews(audio_files, voices_dir, formats, use_ffmpeg):
+    """
+    Creates every preview of one recording and copies them for its duplicates.
+
+    Args:
+        audio_files (list): Paths of audio files with identical content
+        voices_dir (str): Directory the previews subdirectory is in
+        formats (list): Preview formats to write
+        use_ffmpeg (bool): Whether to encode with ffmpeg instead of libsndfile
+
+    Returns:
+        list: (audio_file, success, seconds, outputs) for each file
+    """
+    start = time.perf_counter()
+    source = audio_files[0]
+    source_name = os.path.splitext(os.path.basename(source))[0]
+    try:
+        os.makedirs(os.path.dirname(audio_preview_path(voices_dir, source_name, formats[0])), exist_ok=True)
+        for fmt in formats:
+            output_path = audio_preview_path(voices_dir, source_name, fmt)
+            if use_ffmpeg:
+                encode_with_ffmpeg(source, output_path, fmt)
+            else:
+                encode_with_libsndfile(source, output_path)
+
+        results = []
+        for audio_file in audio_files:
+            name = os.path.splitext(os.path.basename(audio_file))[0]
+            outputs = []
+            for fmt in formats:
+                output_path = audio_preview_path(voices_dir, name, fmt)
+                if name != source_name:
+                    shutil.copyfile(audio_preview_path(voices_dir, source_name, fmt), f"{output_path}.tmp")
+                    os.replace(f"{output_path}.tmp", output_path)
+                outputs.append(os.path.basename(output_path))
+            results.append((audio_file, True, time.perf_counter() - start, outputs))
+        return results
+    except Exception as e:
+        detail = e.stderr.decode(errors="replace").strip() if isinstance(e, subprocess.CalledProcessError) else e
+        print(f"Error transcoding {source}: {detail}")
+        return [(audio_file, False, time.perf_counter() - start, []) for audio_file in audio_files]
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """Load the build manifest, or return an empty one"""
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("files"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+    return {"encode_params": None, "files": {}}
+
+
+def write_manifest(manifest: dict, manifest_path: str) -> None:
+    """Write the build manifest atomically"""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def process_audio_files(voices_dir=VOICES_DIR, jobs=None, force=False):
+    """
+    Create previews for new or changed audio files in the voices directory
+    """
+    use_ffmpeg = shutil.which("ffmpeg") is not None
+    if use_ffmpeg:
+        formats = list(AUDIO_PREVIEW_FORMATS)
+    else:
+        formats = ["opus"]
+        print("ffmpeg is not installed, writing Ogg Opus previews only")
+
+    previews_dir = os.path.dirname(audio_preview_path(voices_dir, "", formats[0]))
+    os.makedirs(previews_dir, exist_ok=True)
+    manifest_path = os.path.join(previews_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    params = encode_params(formats, use_ffmpeg)
+    params_hash = encode_params_hash(params)
+
+    if manifest["encode_params"] != params_hash:
+        if manifest["files"]:
+            print("Encoding parameters changed, transcoding all previews")
+        force = True
+
+    audio_files = sorted(glob.glob(os.path.join(voices_dir, "*.mp3")))
+    print(f"Found {len(audio_files)} audio files")
+
+    # Decide what needs transcoding
+    pending = {}
+    source_hashes = {}
+    for audio_file in audio_files:
+        base_name = os.path.basename(audio_file)
+        source_hashes[base_name] = file_sha256(audio_file)
+        entry = manifest["files"].get(base_name)
+        up_to_date = (
+            not force
+            and entry is not None
+            and entry.get("source_sha256") == source_hashes[base_name]
+            and entry.get("outputs")
+            and all(os.path.exists(os.path.join(previews_dir, output)) for output in entry["outputs"])
+        )
+        if not up_to_date:
+            # Identical recordings are transcoded once
+            pending.setdefault(source_hashes[base_name], []).append(audio_file)
+
+    # Forget files whose source audio is gone
+    files = {name: entry for name, entry in manifest["files"].items() if name in source_hashes}
+    if force:
+        files = {}
+
+    jobs = jobs or os.cpu_count() or 1
+    pending_count = sum(len(group) for group in pending.values())
+    print(f"{len(audio_files) - pending_count} up to date, {pending_count} to transcode "
+          f"({len(pending)} distinct; {', '.join(formats)}) with {jobs} worker(s)")
+
+    success_count = 0
+    error_count = 0
+    start = time.perf_counter()
+
+    def record(audio_file, success, seconds, outputs):
+        nonlocal success_count, error_count
+        base_name = os.path.basename(audio_file)
+        if success:
+            success_count += 1
+            files[base_name] = {
+                "source_sha256": source_hashes[base_name],
+                "outputs": sorted(outputs),
+            }
+            print(f"[{success_count + error_count}/{pending_count}] {base_name} ({seconds:.2f}s)")
+        else:
+            error_count += 1
+            files.pop(base_name, None)
+
+    groups = list(pending.values())
+    if jobs == 1 or len(groups) <= 1:
+        for group in groups:
+            for result in create_previews(group, voices_dir, formats, use_ffmpeg):
+                record(*result)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(create_previews, group, voices_dir, formats, use_ffmpeg) for group in groups]
+            for future in as_completed(futures):
+                for result in future.result():
+                    record(*result)
+
+    manifest = {"encode_params": params_hash, "params": params, "files": files}
+    write_manifest(manifest, manifest_path)
+
+    print(f"Successfully created previews of {success_count} files.")
+    print(f"Failed to create previews of {error_count} files.")
+
+    source_bytes = sum(os.path.getsize(audio_file) for audio_file in audio_files)
+    for fmt in formats:
+        preview_bytes = sum(
+            os.path.getsize(path) for path in glob.glob(os.path.join(previews_dir, "*" + AUDIO_PREVIEW_FORMATS[fmt]))
+        )
+        if preview_bytes:
+            print(f"  {fmt}: {preview_bytes / 1024 / 1024:.1f} MB ({source_bytes / preview_bytes:.1f}x smaller than the originals)")
+    print(f"Wall time {time.perf_counter() - start:.2f}s")
+
+    return error_count == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voices-dir", default=VOICES_DIR, help="directory containing the source audio files")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="transcode every file, ignoring the manifest")
+    args = parser.parse_args()
+
+    print("Starting audio preview generation...")
+    ok = process_audio_files(args.voices_dir, jobs=args.jobs, force=args.force)
+    print("Done!")
+    raise SystemExit(0 if ok else 1)
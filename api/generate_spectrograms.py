@@ -4,97 +4,267 @@ Spectrogram Generator Script
 
 This script creates spectrogram images from audio files in the ./api/voices directory,
 saving them with the same name but with a .png extension in the ./api/spectrograms directory.
+Smaller variants are written alongside, one subdirectory per size
+(e.g. ./api/spectrograms/thumb/<name>.webp), in PNG and, when Pillow is installed, WebP.
+
+Builds are incremental: a manifest records the content hash of every source file
+and the render parameters used, and only new or changed audio is rendered again.
+Files are rendered in parallel across a process pool.
 """
 
-import os
+import argparse
 import glob
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
-import numpy as np
-from pathlib import Path
-import soundfile as sf
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import spectrogram_renderer
+from asset_index import spectrogram_variant_path
 
 # Configuration
 VOICES_DIR = "./voices"  # Source directory containing audio files
 SPECTROGRAMS_DIR = "./spectrograms"  # Target directory for spectrograms
-# Ensure the spectrograms directory exists
-os.makedirs(SPECTROGRAMS_DIR, exist_ok=True)
+MANIFEST_NAME = ".manifest.json"  # Kept in the spectrograms directory
+
+# Files rendered together in one worker call, sharing one FFT and filterbank product
+BATCH_SIZE = 8
+
+
+def render_params(formats) -> dict:
+    """Everything that affects the rendered images; changing any of it re-renders all files"""
+    return {
+        "renderer": "numpy",
+        "n_fft": spectrogram_renderer.N_FFT,
+        "hop_length": spectrogram_renderer.HOP_LENGTH,
+        "n_mels": spectrogram_renderer.N_MELS,
+        "top_db": spectrogram_renderer.TOP_DB,
+        "sizes": spectrogram_renderer.VARIANT_SIZES,
+        "formats": list(formats),
+        "webp_sizes": spectrogram_renderer.WEBP_SIZES,
+        "webp_quality": spectrogram_renderer.WEBP_QUALITY,
+    }
+
+
+def render_params_hash(params: dict) -> str:
+    """Return a stable hash of the render parameters"""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def file_sha256(path: str) -> str:
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 
-def create_spectrogram(audio_file, output_file):
+def write_file(path: str, data: bytes) -> None:
+    """Write a file atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def create_spectrograms(audio_files, spectrograms_dir, formats):
     """
-    Creates a spectrogram from an audio file and saves it as a PNG image.
-    
+    Creates every spectrogram variant for a batch of audio files.
+
     Args:
-        audio_file (str): Path to the audio file
-        output_file (str): Path where the spectrogram image will be saved
+        audio_files (list): Paths of the audio files
+        spectrograms_dir (str): Directory to write the spectrograms to
+        formats (list): Image formats to render ("png", "webp")
+
+    Returns:
+        list: (audio_file, success, seconds, written paths relative to spectrograms_dir)
+        for every file. The shared FFT time is split evenly across the batch.
     """
+    results = []
+    loaded = []
+    for audio_file in audio_files:
+        start = time.perf_counter()
+        try:
+            audio = spectrogram_renderer.load_audio(audio_file)
+            loaded.append((audio_file, audio, time.perf_counter() - start))
+        except Exception as e:
+            print(f"Error loading {audio_file}: {e}")
+            results.append((audio_file, False, time.perf_counter() - start, []))
+
+    if not loaded:
+        return results
+
+    start = time.perf_counter()
     try:
-        print(f"Processing {audio_file}...")
-        
-        # Load the audio file
-        y, sr = librosa.load(audio_file, sr=None)
-        
-        # Create a figure with a specific size
-        plt.figure(figsize=(10, 6))
-        
-        # Generate a mel-spectrogram
-        S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
-        
-        # Convert to dB scale
-        S_dB = librosa.power_to_db(S, ref=np.max)
-        
-        # Plot the spectrogram
-        librosa.display.specshow(S_dB, sr=sr, x_axis='time', y_axis='mel')
-        
-        # Remove axes and frame for a cleaner image
-        plt.axis('off')
-        plt.tight_layout()
-        
-        # Save the figure
-        plt.savefig(output_file, bbox_inches='tight', pad_inches=0, dpi=150, transparent=False)
-        plt.close()
-        
-        print(f"Created spectrogram: {output_file}")
-        return True
+        rendered = spectrogram_renderer.render_variants([audio for _, audio, _ in loaded], formats)
     except Exception as e:
-        print(f"Error creating spectrogram for {audio_file}: {e}")
-        return False
+        print(f"Error rendering batch starting with {loaded[0][0]}: {e}")
+        return results + [(audio_file, False, load_time, []) for audio_file, _, load_time in loaded]
+    shared_time = (time.perf_counter() - start) / len(loaded)
+
+    for (audio_file, _, load_time), variants in zip(loaded, rendered):
+        start = time.perf_counter()
+        name = os.path.splitext(os.path.basename(audio_file))[0]
+        written = []
+        try:
+            for (size, fmt), data in variants.items():
+                path = spectrogram_variant_path(spectrograms_dir, name, size, fmt)
+                write_file(path, data)
+                written.append(os.path.relpath(path, spectrograms_dir))
+            results.append((audio_file, True, load_time + shared_time + time.perf_counter() - start, written))
+        except OSError as e:
+            print(f"Error writing spectrograms for {audio_file}: {e}")
+            results.append((audio_file, False, load_time + shared_time, []))
+
+    return results
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """Load the build manifest, or return an empty one"""
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("files"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+    return {"render_params": None, "files": {}}
 
-def process_audio_files():
+
+def write_manifest(manifest: dict, manifest_path: str) -> None:
+    """Write the build manifest atomically"""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def process_audio_files(voices_dir=VOICES_DIR, spectrograms_dir=SPECTROGRAMS_DIR, jobs=None, force=False,
+                        batch_size=BATCH_SIZE, webp=True):
     """
-    Process all audio files in the voices directory and create spectrograms
+    Create spectrograms for new or changed audio files in the voices directory
     """
+    formats = ["png"]
+    if webp:
+        if spectrogram_renderer.webp_available():
+            formats.append("webp")
+        else:
+            print("Pillow with WebP support is not installed, writing PNG variants only")
+
+    os.makedirs(spectrograms_dir, exist_ok=True)
+    manifest_path = os.path.join(spectrograms_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    params = render_params(formats)
+    params_hash = render_params_hash(params)
+
+    if manifest["render_params"] != params_hash:
+        if manifest["files"]:
+            print("Render parameters changed, regenerating all spectrograms")
+        force = True
+
     # Get all mp3 files in the voices directory
-    audio_files = glob.glob(os.path.join(VOICES_DIR, "*.mp3"))
-    
+    audio_files = sorted(glob.glob(os.path.join(voices_dir, "*.mp3")))
+
     # Filter out Zone.Identifier files
     audio_files = [f for f in audio_files if not f.endswith(".mp3:Zone.Identifier")]
-    
-    print(f"Found {len(audio_files)} audio files to process")
-    
+
+    print(f"Found {len(audio_files)} audio files")
+
+    # Decide what needs rendering
+    pending = []
+    source_hashes = {}
+    for audio_file in audio_files:
+        base_name = os.path.basename(audio_file)
+        source_hashes[base_name] = file_sha256(audio_file)
+        entry = manifest["files"].get(base_name)
+        up_to_date = (
+            not force
+            and entry is not None
+            and entry.get("source_sha256") == source_hashes[base_name]
+            and entry.get("outputs")
+            and all(os.path.exists(os.path.join(spectrograms_dir, output)) for output in entry["outputs"])
+        )
+        if not up_to_date:
+            pending.append(audio_file)
+
+    # Forget files whose source audio is gone
+    files = {name: entry for name, entry in manifest["files"].items() if name in source_hashes}
+    if force:
+        files = {}
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"{len(audio_files) - len(pending)} up to date, {len(pending)} to render "
+          f"({', '.join(formats)}) with {jobs} worker(s)")
+
     success_count = 0
     error_count = 0
-    
-    for audio_file in audio_files:
-        # Get just the filename without path and extension
+    timings = []
+    start = time.perf_counter()
+
+    def record(audio_file, success, seconds, outputs):
+        nonlocal success_count, error_count
         base_name = os.path.basename(audio_file)
-        name_without_ext = os.path.splitext(base_name)[0]
-        
-        # Create the output filename
-        output_file = os.path.join(SPECTROGRAMS_DIR, f"{name_without_ext}.png")
-        
-        # Generate the spectrogram
-        if create_spectrogram(audio_file, output_file):
+        if success:
             success_count += 1
+            files[base_name] = {
+                "source_sha256": source_hashes[base_name],
+                "render_seconds": round(seconds, 3),
+                "outputs": sorted(outputs),
+            }
+            timings.append((seconds, base_name))
+            print(f"[{success_count + error_count}/{len(pending)}] {base_name} ({seconds:.2f}s)")
         else:
             error_count += 1
-    
-    print(f"Finished processing {len(audio_files)} audio files.")
+            files.pop(base_name, None)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    if jobs == 1 or len(batches) <= 1:
+        for batch in batches:
+            for result in create_spectrograms(batch, spectrograms_dir, formats):
+                record(*result)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(create_spectrograms, batch, spectrograms_dir, formats) for batch in batches]
+            for future in as_completed(futures):
+                for result in future.result():
+                    record(*result)
+
+    wall_time = time.perf_counter() - start
+    manifest = {"render_params": params_hash, "params": params, "files": files}
+    write_manifest(manifest, manifest_path)
+
     print(f"Successfully created {success_count} spectrograms.")
     print(f"Failed to create {error_count} spectrograms.")
 
+    if timings:
+        render_time = sum(seconds for seconds, _ in timings)
+        timings.sort(reverse=True)
+        print(f"Wall time {wall_time:.2f}s, render time {render_time:.2f}s "
+              f"(mean {render_time / len(timings):.2f}s per file, {render_time / wall_time:.1f}x parallel speedup)")
+        print("Slowest files:")
+        for seconds, name in timings[:5]:
+            print(f"  {seconds:6.2f}s  {name}")
+
+    return error_count == 0
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voices-dir", default=VOICES_DIR, help="directory containing the source audio files")
+    parser.add_argument("--output-dir", default=SPECTROGRAMS_DIR, help="directory to write the spectrograms to")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="files rendered per worker call")
+    parser.add_argument("--no-webp", action="store_true", help="only write PNG variants")
+    parser.add_argument("--force", action="store_true", help="render every file, ignoring the manifest")
+    args = parser.parse_args()
+
     print("Starting spectrogram generation...")
-    process_audio_files()
-    print("Done!")
\ No newline at end of file
+    ok = process_audio_files(args.voices_dir, args.output_dir, jobs=args.jobs, force=args.force,
+                             batch_size=args.batch_size, webp=not args.no_webp)
+    print("Done!")
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,161 @@
+"""
+Logging setup for the API
+
+Log records are handed to a queue and written to stdout by a background
+listener thread, so request handlers never block on console I/O. Output is
+one JSON object per line by default. Noisy per-request messages can be
+sampled per message type.
+
+Configuration (environment variables):
+
+- LOG_LEVEL: minimum level, default INFO. Per-request asset lookups log at
+  DEBUG, so at INFO they cost a single level check.
+- LOG_FORMAT: "json" (default) or "text"
+- LOG_SAMPLE_RATES: comma-separated event=rate pairs, e.g.
+  "asset_lookup=0.01,spectrogram_served=0.1". Records with a sampled `event`
+  are only emitted once every 1/rate occurrences.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOGGER_NAME = "voice_api"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler for a listener in the same process
+
+    The stock prepare() formats the traceback into the message and drops
+    exc_info, so records can be pickled. Nothing is pickled here; the message
+    is resolved before queuing, and formatting the traceback is left to the
+    listener thread, so JsonFormatter can put it in its own field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Let through only every Nth record of each sampled event type"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        # event -> emit one record out of `every`
+        self.every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if rate > 0}
+        self.muted = {event for event, rate in rates.items() if rate <= 0}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None:
+            return True
+        if event in self.muted:
+            return False
+
+        every = self.every.get(event)
+        if every is None or every == 1:
+            return True
+
+        with self._lock:
+            count = self.counts.get(event, 0)
+            self.counts[event] = count + 1
+        return count % every == 0
+
+
+def parse_sample_rates(value: str) -> dict:
+    """Parse "event=rate,event=rate" into a dict"""
+    rates = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        event, _, rate = pair.partition("=")
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            print(f"WARNING: Ignoring invalid LOG_SAMPLE_RATES entry: {pair}", file=sys.stderr)
+    return rates
+
+
+def setup_logging() -> logging.Logger:
+    """Configure the API logger from the environment (safe to call more than once)"""
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
+
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    log_format = os.environ.get("LOG_FORMAT", "json").lower()
+    sample_rates = parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    # Sample before the record is queued, so dropped records cost nothing more
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    return logger
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the API logger, e.g. voice_api.assets"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
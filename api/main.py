@@ -1,21 +1,58 @@
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError, field_validator
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
 import time
 import os
 import sys
 import random
-import tempfile
-from typing import Optional, Dict, Any, List
-import shutil
+import uuid
+from typing import Optional, Dict, Any, List, Union
 from pathlib import Path
-import librosa
-import soundfile as sf
-import numpy as np
-import json
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
+from asset_pack import process_pack
+from asset_index import AssetIndex, asset_basename, parse_asset_name, SPECTROGRAM_SIZES
+from file_serving import accepts, serve_bytes, serve_file, content_version
+from metadata_bundle import load_bundle
+from traversal_store import create_traversal_store, DEFAULT_SESSION_ID
+from log_config import setup_logging, get_logger
+from metrics import MetricsMiddleware, counter_total, create_metrics, render_prometheus
+from spectrogram_cache import create_spectrogram_cache
+from dsp_engine import create_voice_synthesizer
+from feature_store import load_feature_store
+from nearest_variant import NearestVariantIndex
+from move_channel import MoveChannel, move_id
+from response_cache import ResponseCache, dumps
+from waveform_store import PEAK_SCALE, load_waveform_store
+
+setup_logging()
+logger = get_logger("api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1:
+        # uvicorn takes its default --workers from WEB_CONCURRENCY
+        logger.warning("Server-sent event move channels only work with one worker process: "
+                       "moves that reach a worker other than the stream's get a 404")
+    await run_in_threadpool(warm_metadata_cache)
+    # Keep the asset index in sync with the asset directories without restarting
+    refresh_task = asyncio.create_task(refresh_asset_index_periodically())
+    # Publish this worker's metrics for aggregation across workers
+    metrics_task = asyncio.create_task(flush_metrics_periodically())
+    yield
+    refresh_task.cancel()
+    metrics_task.cancel()
+    spectrogram_cache.shutdown()
+    if voice_synthesizer:
+        voice_synthesizer.shutdown()
+    await run_in_threadpool(metrics.flush)
 
-app = FastAPI(title="Voice Manipulation API")
+app = FastAPI(title="Voice Manipulation API", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -26,9 +63,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create a temporary directory for processed audio files
-TEMP_DIR = tempfile.mkdtemp()
-print(f"Created temporary directory for audio files: {TEMP_DIR}")
+# How often (in seconds) each worker writes its metrics snapshot
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+
+# Request counts and latency histograms for this worker process
+metrics = create_metrics(METRICS_FLUSH_INTERVAL)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+async def flush_metrics_periodically():
+    """Write this worker's metrics snapshot so /metrics can aggregate all workers"""
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(metrics.flush)
+        except Exception as e:
+            logger.exception("Failed to flush metrics: %s", e)
 
 # Directory containing the pregenerated voice files
 VOICE_FILES_DIR = "./voices"
@@ -39,6 +88,172 @@ STATS_DIR = "./stats"
 # Directory containing the spectrogram images
 SPECTROGRAMS_DIR = "./spectrograms"
 
+# Artificial delay (in seconds) added to every /api/process response to simulate
+# real processing time. Zero by default; when set it never blocks the event loop.
+PROCESSING_DELAY = float(os.environ.get("PROCESSING_DELAY", "0"))
+
+# How often (in seconds) to check the asset directories for added or removed files
+ASSET_REFRESH_INTERVAL = float(os.environ.get("ASSET_REFRESH_INTERVAL", "5"))
+
+# Index of the voice, stats and spectrogram files, built once at startup, including
+# the files in the memory-mapped asset pack if there is one (see build_asset_pack.py)
+asset_index = AssetIndex(VOICE_FILES_DIR, STATS_DIR, SPECTROGRAMS_DIR, pack=process_pack())
+asset_index.refresh()
+
+# Result of the last asset verification (see check_voices.py), reported by /ready
+ASSET_REPORT_PATH = os.environ.get("ASSET_REPORT_PATH", "./asset_report.json")
+asset_report = {"mtime": None, "summary": None}
+
+# Acoustic features of every pregenerated variant (see build_feature_store.py)
+FEATURE_STORE_PATH = os.environ.get("FEATURE_STORE_PATH", "./voice_features.npy")
+feature_store = load_feature_store(FEATURE_STORE_PATH)
+
+# Min/max waveform peaks of every pregenerated variant (see build_waveform_store.py)
+WAVEFORM_STORE_PATH = os.environ.get("WAVEFORM_STORE_PATH", "./voice_peaks.bin")
+waveform_store = load_waveform_store(WAVEFORM_STORE_PATH)
+
+# Missing lane paths fall back to the closest available variant of the same voice
+nearest_variants = NearestVariantIndex(asset_index, feature_store)
+
+# Lane paths without a pregenerated voice file are synthesized from their longest
+# pregenerated prefix (None when disabled with VOICE_SYNTHESIS=0)
+voice_synthesizer = create_voice_synthesizer(VOICE_FILES_DIR)
+
+# Audio still being synthesized is streamed from its partial file in chunks of
+# this many bytes, checking for newly encoded frames at this interval (in seconds)
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_POLL_INTERVAL = 0.05
+
+# Spectrograms missing from SPECTROGRAMS_DIR are rendered from their audio on first request
+spectrogram_cache = create_spectrogram_cache()
+
+# How long (in seconds) a spectrogram request waits for an on-demand render
+# before getting a short-lived placeholder instead
+SPECTROGRAM_RENDER_WAIT = float(os.environ.get("SPECTROGRAM_RENDER_WAIT", "2"))
+
+# Advertise the audio and spectrograms of the moves one step away in /api/process
+# responses (a prefetch list and a Link header), and start rendering them
+PREFETCH_NEIGHBORS = os.environ.get("PREFETCH_NEIGHBORS", "1").lower() not in ("0", "false", "no")
+
+# Spectrogram size advertised for prefetching (the size the voice list shows)
+PREFETCH_SPECTROGRAM_SIZE = "thumb"
+
+# Audio quality advertised for prefetching (the quality the page auditions moves at)
+PREFETCH_AUDIO_QUALITY = "preview"
+
+# Placeholder image served while a spectrogram is being rendered, or when none can be found
+PLACEHOLDER_SPECTROGRAM = "../public/placeholder_spectrogram.png"
+
+async def refresh_asset_index_periodically():
+    """Rebuild the asset index whenever an asset directory changes"""
+    global metadata_bundle
+    
+    while True:
+        await asyncio.sleep(ASSET_REFRESH_INTERVAL)
+        try:
+            if await run_in_threadpool(asset_index.refresh_if_changed):
+                # Stats files may have changed too; recompiles if the bundle is stale
+                metadata_bundle = await run_in_threadpool(load_bundle, METADATA_BUNDLE_PATH, STATS_DIR)
+        except Exception as e:
+            logger.exception("Failed to refresh asset index: %s", e)
+
+# Content types for the audio formats we serve
+AUDIO_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".webm": "audio/webm",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+}
+
+# Audio qualities served by /processed and /audio (?quality=...): the original
+# file, or a low-bitrate preview transcode (see generate_audio_previews.py)
+AUDIO_QUALITIES = ("full", "preview")
+
+# Preview formats in order of preference, with the media type the Accept header has
+# to allow for each. Clients that accept any audio get AAC, which plays everywhere
+AUDIO_PREVIEW_MEDIA_TYPES = {"webm": "audio/webm", "opus": "audio/ogg", "aac": "audio/mp4"}
+DEFAULT_AUDIO_PREVIEW_FORMAT = "aac"
+
+def audio_media_type(file_path: str) -> str:
+    """Return the content type for an audio file based on its extension"""
+    return AUDIO_MEDIA_TYPES.get(os.path.splitext(file_path)[1].lower(), "application/octet-stream")
+
+def choose_audio_preview(request: Request, file_path: str) -> Optional[tuple]:
+    """Return (format, path) of the preview transcode to serve for an audio file, or None for the original"""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    for fmt, media_type in AUDIO_PREVIEW_MEDIA_TYPES.items():
+        if accepts(request, media_type):
+            preview_path = asset_index.audio_preview(name, fmt)
+            if preview_path:
+                return fmt, preview_path
+    preview_path = asset_index.audio_preview(name, DEFAULT_AUDIO_PREVIEW_FORMAT)
+    return (DEFAULT_AUDIO_PREVIEW_FORMAT, preview_path) if preview_path else None
+
+async def serve_audio(request: Request, file_path: str, stat_result: os.stat_result,
+                      v: Optional[str], quality: str) -> Response:
+    """Serve an audio file, or its preview transcode when quality is "preview" and one was generated"""
+    digest = await run_in_threadpool(asset_index.digest, file_path)
+    preview = choose_audio_preview(request, file_path) if quality == "preview" else None
+    if preview is None:
+        if quality == "preview":
+            metrics.inc("audio_previews_total", format="original")
+        return serve_file(request, file_path, audio_media_type(file_path), stat_result, digest, v,
+                          extra_headers={"Vary": "Accept"} if quality == "preview" else None,
+                          packed=asset_index.packed(file_path))
+    
+    fmt, preview_path = preview
+    metrics.inc("audio_previews_total", format=fmt)
+    preview_digest = await run_in_threadpool(asset_index.digest, preview_path)
+    # Previews are rebuilt whenever their source changes, so the source's ?v= stays valid for them
+    version = content_version(preview_digest) if v == content_version(digest) else v
+    # The format depends on the Accept header, so caches must key on it
+    return serve_file(request, preview_path, audio_media_type(preview_path), asset_index.stat(preview_path),
+                      preview_digest, version, extra_headers={"Vary": "Accept"},
+                      packed=asset_index.packed(preview_path))
+
+def processed_audio_url(file_path: str) -> str:
+    """Return the versioned /processed URL for an audio file
+
+    The version is derived from the file content, so clients can cache the
+    URL forever and still pick up new content when the asset changes. Audio
+    that is still being synthesized is versioned by the synthesis parameters.
+    """
+    if voice_synthesizer and not asset_index.stat(file_path) and not os.path.exists(file_path):
+        version = content_version(voice_synthesizer.version)
+    else:
+        version = content_version(asset_index.digest(file_path))
+    return f"/processed/{os.path.basename(file_path)}?v={version}"
+
+def audio_quality_url(url: str, quality: str) -> str:
+    """Return a /processed URL at an audio quality, built the same way as the client's audioUrl()"""
+    if quality == "full":
+        return url
+    return f"{url}{'&' if '?' in url else '?'}quality={quality}"
+
+def spectrogram_url(file_path: str) -> str:
+    """Return the versioned /spectrograms URL for a pregenerated spectrogram
+    
+    Like processed_audio_url, the version is derived from the full-size image,
+    which every size and format of the spectrogram is generated alongside.
+    """
+    return f"/spectrograms/{os.path.basename(file_path)}?v={content_version(asset_index.digest(file_path))}"
+
+# Path of the compiled stats bundle (see build_metadata_bundle.py)
+METADATA_BUNDLE_PATH = os.environ.get("METADATA_BUNDLE_PATH", "./stats_bundle.json")
+
+# Emotion scores from every stats file, loaded once at startup
+metadata_bundle = load_bundle(METADATA_BUNDLE_PATH, STATS_DIR)
+
+# Ready-made metadata for each (voice, lanes), rebuilt when the asset index changes
+metadata_cache = {}
+metadata_cache_generation = None
+
+# Serialized /api/process responses by the move and the path it resolved to,
+# rebuilt when the asset index changes (see response_cache.py)
+PROCESS_RESPONSE_CACHE_SIZE = int(os.environ.get("PROCESS_RESPONSE_CACHE_SIZE", "2048"))
+process_response_cache = ResponseCache(PROCESS_RESPONSE_CACHE_SIZE)
+
 # Default voice files for holding zone (initial state)
 VOICE_FILES = {
     "Voice 1": f"{VOICE_FILES_DIR}/voice_1_Z1_L0_Z2_L0_Z3_L0_Z4_L0.mp3",
@@ -63,6 +278,7 @@ class MetadataItem(BaseModel):
     language: Optional[List[EmotionData]] = None
     prosody: Optional[List[EmotionData]] = None
     spectrogram: str = "/spectrograms/default.png"  # Use a real spectrogram path instead of placeholder
+    acoustics: Optional[Dict[str, float]] = None  # Measured features of this exact variant, when analyzed
 
 class VoiceProcessResponse(BaseModel):
     message: str
@@ -70,6 +286,26 @@ class VoiceProcessResponse(BaseModel):
     processingTime: float
     audioFile: Optional[str] = None
     metadata: Optional[MetadataItem] = None
+    prefetch: Optional[List[str]] = None
+
+class VoiceProcessBatchRequest(BaseModel):
+    items: List[VoiceProcessRequest]
+
+class VoiceProcessBatchResponse(BaseModel):
+    results: List[VoiceProcessResponse]
+    processingTime: float
+
+class VoiceMoveCommand(VoiceProcessRequest):
+    id: Optional[Union[str, int]] = None  # Chosen by the client and echoed in every event about this move
+    
+    @field_validator("id")
+    @classmethod
+    def id_as_string(cls, value):
+        # Numbered moves are echoed as strings, the same as move_id() reports rejected ones
+        return None if value is None else str(value)
+
+# Most card moves accepted by one /api/process/batch request
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "64"))
 
 # Mapping operations to processing operations
 ZONE_OPERATIONS = {
@@ -79,27 +315,108 @@ ZONE_OPERATIONS = {
     "Zone 4": "finalization"
 }
 
-# Keep track of voice traversal history for each voice
-voice_traversal = {
-    "Voice 1": {"Zone 1": None, "Zone 2": None, "Zone 3": None, "Zone 4": None},
-    "Voice 2": {"Zone 1": None, "Zone 2": None, "Zone 3": None, "Zone 4": None},
-    "Voice 3": {"Zone 1": None, "Zone 2": None, "Zone 3": None, "Zone 4": None}
-}
+# Keep track of voice traversal history for each voice, per client session
+# (sessions are identified by the X-Session-ID request header)
+traversal_store = create_traversal_store()
 
-# Statistics for tracking spectrogram matches
-spectrogram_stats = {
-    "exact_matches": 0,
-    "fallbacks": 0,
-    "placeholders": 0,
-    "total_requests": 0,
-    "requests_by_voice": {"Voice 1": 0, "Voice 2": 0, "Voice 3": 0},
-    "errors": {}
-}
+def nearest_fallback(kind: str, voice_number: str, lanes) -> Optional[str]:
+    """Return the path of the closest available `kind` asset to a missing lane path, recording its distance"""
+    nearest = nearest_variants.nearest(kind, voice_number, lanes)
+    if not nearest:
+        return None
+    path, distance = nearest
+    metrics.inc("fallback_distance_total", kind=kind, distance=f"{distance:g}")
+    metrics.inc("fallback_distance_sum", distance, kind=kind)
+    return path
+
+def fallback_distance_summary(aggregate: dict) -> dict:
+    """Return how far fallbacks were from the requested lane paths, per asset kind"""
+    summary = {}
+    for (name, labels), value in aggregate["counters"].items():
+        if name == "fallback_distance_total":
+            labels = dict(labels)
+            kind = summary.setdefault(labels["kind"], {"count": 0, "by_distance": {}})
+            kind["count"] += int(value)
+            kind["by_distance"][labels["distance"]] = kind["by_distance"].get(labels["distance"], 0) + int(value)
+    for kind_name, kind in summary.items():
+        kind["mean_distance"] = counter_total(aggregate, "fallback_distance_sum", kind=kind_name) / kind["count"]
+        kind["by_distance"] = dict(sorted(kind["by_distance"].items(), key=lambda item: float(item[0])))
+    return summary
+
+def spectrogram_stats_summary(aggregate: dict) -> dict:
+    """Return spectrogram match counts across all workers, in the /spectrogram-stats format"""
+    requests_by_voice = {}
+    for (name, labels), value in aggregate["counters"].items():
+        if name == "voice_requests_total":
+            voice = dict(labels)["voice"]
+            requests_by_voice[voice] = requests_by_voice.get(voice, 0) + int(value)
+    
+    rendered = int(counter_total(aggregate, "spectrogram_requests_total", result="rendered"))
+    return {
+        # Spectrograms rendered on demand are exact matches too
+        "exact_matches": int(counter_total(aggregate, "spectrogram_requests_total", result="exact")) + rendered,
+        "rendered_on_demand": rendered,
+        "fallbacks": int(counter_total(aggregate, "spectrogram_requests_total", result="fallback")),
+        "placeholders": int(counter_total(aggregate, "spectrogram_requests_total", result="placeholder"))
+                        + int(counter_total(aggregate, "spectrogram_requests_total", result="rendering")),
+        "total_requests": int(counter_total(aggregate, "spectrogram_requests_total")),
+        "requests_by_voice": requests_by_voice,
+    }
 
 @app.get("/")
 async def read_root():
     return {"status": "API is running", "version": "1.0.0"}
 
+def asset_report_summary() -> Optional[dict]:
+    """Return the summary of the last asset verification, re-reading the report only when it changes"""
+    try:
+        mtime = os.stat(ASSET_REPORT_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if asset_report["mtime"] != mtime:
+        try:
+            with open(ASSET_REPORT_PATH, "r") as f:
+                report = json.load(f)
+            summary = {
+                "ok": bool(report["ok"]),
+                "checked_at": report.get("checked_at"),
+                "counts": report.get("counts", {}),
+                "errors": report.get("errors", [])[:10],
+                "error_count": len(report.get("errors", [])),
+                "warnings": report.get("warnings", []),
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Unreadable asset report %s: %s", ASSET_REPORT_PATH, e)
+            summary = {"ok": False, "errors": [f"Unreadable asset report: {e}"], "error_count": 1}
+        asset_report.update(mtime=mtime, summary=summary)
+    return asset_report["summary"]
+
+@app.get("/ready")
+async def readiness():
+    """Report whether this instance can serve traffic: 200 if so, 503 otherwise
+
+    Checks that the default voices are indexed and the metadata bundle is loaded,
+    and reports the last asset verification (check_voices.py) when there is one.
+    """
+    problems = [
+        f"No audio for {voice_name}"
+        for voice_name, voice_path in VOICE_FILES.items()
+        if not asset_index.find("audio", os.path.basename(voice_path))
+    ]
+    if not metadata_bundle["entries"] and not metadata_bundle["sample"]:
+        problems.append("No stats metadata loaded")
+    
+    verification = await run_in_threadpool(asset_report_summary)
+    if verification and not verification["ok"]:
+        problems.append(f"Asset verification found {verification['error_count']} problem(s)")
+    
+    ready = not problems
+    return JSONResponse(
+        {"ready": ready, "problems": problems, "verification": verification},
+        status_code=200 if ready else 503,
+        headers={"Cache-Control": "no-store"},
+    )
+
 @app.get("/debug")
 async def debug_info():
     """Return debug information about the API environment"""
@@ -109,22 +426,27 @@ async def debug_info():
     info = {
         "voices_directory_exists": os.path.exists(project_voices_dir),
         "voices_directory_contents": os.listdir(project_voices_dir) if os.path.exists(project_voices_dir) else [],
-        "temp_directory": TEMP_DIR,
-        "temp_directory_contents": os.listdir(TEMP_DIR) if os.path.exists(TEMP_DIR) else [],
         "voice_files_config": VOICE_FILES,
         "files_exist": {
             name: os.path.exists(path) for name, path in VOICE_FILES.items()
         },
         "working_directory": os.getcwd(),
         "python_path": sys.path,
-        "spectrogram_stats": spectrogram_stats,
+        "spectrogram_stats": spectrogram_stats_summary(await run_in_threadpool(metrics.aggregate)),
     }
     return info
 
+@app.get("/metrics")
+async def get_metrics():
+    """Return request and asset metrics for all workers in Prometheus text format"""
+    aggregate = await run_in_threadpool(metrics.aggregate)
+    return PlainTextResponse(render_prometheus(aggregate), media_type="text/plain; version=0.0.4")
+
 @app.get("/spectrogram-stats")
 async def get_spectrogram_stats():
     """Return statistics about spectrogram matching"""
-    global spectrogram_stats
+    aggregate = await run_in_threadpool(metrics.aggregate)
+    spectrogram_stats = spectrogram_stats_summary(aggregate)
     
     # Calculate match rates
     total = spectrogram_stats["total_requests"]
@@ -140,42 +462,45 @@ async def get_spectrogram_stats():
             "placeholder_rate": (spectrogram_stats["placeholders"] / total) * 100
         }
     
-    # Count available spectrograms
-    if os.path.exists(SPECTROGRAMS_DIR):
-        spectrograms = [f for f in os.listdir(SPECTROGRAMS_DIR) if f.endswith(".png")]
-        stats["available_spectrograms"] = len(spectrograms)
-        
-        # Count by voice
-        voice_counts = {}
-        for spec in spectrograms:
-            if spec.startswith("voice_"):
-                parts = spec.split("_")
-                if len(parts) > 1:
-                    voice_num = parts[1]
-                    voice_counts[f"Voice {voice_num}"] = voice_counts.get(f"Voice {voice_num}", 0) + 1
-        
-        stats["spectrograms_by_voice"] = voice_counts
+    # Hit rates of the prebuilt metadata and /api/process response caches
+    hits = counter_total(aggregate, "cache_requests_total", cache="metadata", result="hit")
+    lookups = counter_total(aggregate, "cache_requests_total", cache="metadata")
+    stats["metadata_cache_hit_rate"] = (hits / lookups) * 100 if lookups else None
+    hits = counter_total(aggregate, "cache_requests_total", cache="process_response", result="hit")
+    lookups = counter_total(aggregate, "cache_requests_total", cache="process_response")
+    stats["process_response_cache_hit_rate"] = (hits / lookups) * 100 if lookups else None
+    
+    # How far fallbacks were from the requested lane path (see nearest_variant.py)
+    stats["fallback_distances"] = fallback_distance_summary(aggregate)
+    
+    # Count available spectrograms from the asset index
+    stats["available_spectrograms"] = len(asset_index.names("spectrogram"))
+    stats["spectrograms_by_voice"] = {
+        f"Voice {voice_number}": count
+        for voice_number, count in asset_index.count_by_voice("spectrogram").items()
+    }
     
     return stats
 
 @app.get("/audio/{voice_id}")
-async def get_audio(voice_id: str):
-    """Return an audio file for a voice in the holding area"""
-    print(f"Getting audio for voice_id: {voice_id}")
+async def get_audio(voice_id: str, request: Request, v: Optional[str] = None, quality: str = "full"):
+    """Return an audio file for a voice in the holding area
+    
+    `quality` is full (the original) or preview (a low-bitrate transcode, in a format chosen from Accept).
+    """
+    logger.debug("Getting audio for voice_id: %s", voice_id, extra={"event": "request"})
+    
+    if quality not in AUDIO_QUALITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown audio quality: {quality}")
     voice_path = VOICE_FILES.get(voice_id)
+    file_path = asset_index.find("audio", os.path.basename(voice_path)) if voice_path else None
     
-    if not voice_path or not os.path.exists(voice_path):
-        print(f"ERROR: Voice file not found: {voice_path}")
-        # Check if files exist in the voices directory
-        if os.path.exists("./voices"):
-            print(f"Contents of voices directory: {os.listdir('./voices')}")
-        else:
-            print("Voices directory does not exist!")
-        
+    if not file_path:
+        logger.error("Voice file not found: %s", voice_path)
         raise HTTPException(status_code=404, detail=f"Voice file not found: {voice_path}")
     
-    print(f"Returning voice file: {voice_path}")
-    return FileResponse(voice_path, media_type="audio/wav")
+    logger.debug("Returning voice file: %s", file_path, extra={"event": "file_served"})
+    return await serve_audio(request, file_path, asset_index.stat(file_path), v, quality)
 
 @app.get("/test-audio")
 async def test_audio():
@@ -209,19 +534,24 @@ async def test_audio():
     
     return result
 
-def reset_traversal_history(voice_name: str, zone_name: str) -> None:
+def reset_traversal_history(voice_name: str, zone_name: str, session_id: str = DEFAULT_SESSION_ID) -> None:
     """Reset the traversal history for a voice when moving backwards"""
     # Get the zone number to reset from
     zone_num = int(zone_name.split(" ")[1])
     
+    traversal = traversal_store.get(session_id, voice_name)
+    
     # Reset this zone and all higher zones
     for z_num in range(zone_num, 5):  # Reset from current zone to Zone 4
         z_name = f"Zone {z_num}"
-        voice_traversal[voice_name][z_name] = None
+        traversal[z_name] = None
     
-    print(f"Reset traversal history for {voice_name} from zone {zone_name}: {voice_traversal[voice_name]}")
+    traversal_store.put(session_id, voice_name, traversal)
+    logger.debug("Reset traversal history for %s from zone %s: %s", voice_name, zone_name, traversal,
+                 extra={"event": "traversal"})
 
-def get_voice_filename(voice_name: str, zone_name: str, lane_name: str, moving_backwards: bool = False) -> str:
+def get_voice_filename(voice_name: str, zone_name: str, lane_name: str, moving_backwards: bool = False,
+                       session_id: str = DEFAULT_SESSION_ID) -> str:
     """Generate the correct filename based on traversal history"""
     # Extract voice number (e.g., "Voice 1" -> "1")
     voice_number = voice_name.split(" ")[1]
@@ -234,34 +564,101 @@ def get_voice_filename(voice_name: str, zone_name: str, lane_name: str, moving_b
     
     # If moving backwards, reset history for this zone and higher zones
     if moving_backwards:
-        reset_traversal_history(voice_name, zone_name)
+        reset_traversal_history(voice_name, zone_name, session_id)
     
     # Update traversal history for this voice at the current zone
-    voice_traversal[voice_name][zone_name] = lane_number
+    traversal = traversal_store.get(session_id, voice_name)
+    traversal[zone_name] = lane_number
+    traversal_store.put(session_id, voice_name, traversal)
     
     # Build the filename based on traversal history
-    filename_parts = [f"voice_{voice_number}"]
+    return asset_basename(voice_number, traversal_lanes(traversal, current_zone_num)) + ".mp3"
+
+def traversal_lanes(traversal: dict, zone_num: int) -> tuple:
+    """Return the Z1..Z4 lanes of a traversal up to a zone
     
-    # Add zone/lane combinations in order
-    for z_num in range(1, 5):  # Zones 1-4
-        z_name = f"Zone {z_num}"
+    Zones the voice has passed through use the recorded lane, zones it hasn't
+    reached yet (or skipped) use "0".
+    """
+    return tuple(
+        (traversal[f"Zone {z_num}"] or "0") if z_num <= zone_num else "0"
+        for z_num in range(1, 5)
+    )
+
+def neighbor_lane_paths(voice_name: str, zone_name: str, session_id: str = DEFAULT_SESSION_ID) -> list:
+    """Return the lane paths one move away from a voice's current position
+    
+    That is the other lanes of its current zone and every lane of the next zone.
+    """
+    zone_num = 0 if zone_name == "holding" else int(zone_name.split(" ")[1])
+    traversal = traversal_store.get(session_id, voice_name)
+    paths = []
+    for target_zone in (zone_num, zone_num + 1):
+        if not 1 <= target_zone <= 4:
+            continue
+        for lane in ("1", "2", "3"):
+            if target_zone == zone_num and traversal[f"Zone {target_zone}"] == lane:
+                continue
+            candidate = dict(traversal)
+            candidate[f"Zone {target_zone}"] = lane
+            paths.append(traversal_lanes(candidate, target_zone))
+    return paths
+
+def neighbor_prefetch_urls(voice_name: str, zone_name: str, session_id: str = DEFAULT_SESSION_ID) -> List[str]:
+    """Return the audio and spectrogram URLs of the moves one step away, for the client to prefetch
+    
+    Building them also warms the metadata cache and content digests for those paths.
+    """
+    voice_number = voice_name.split(" ")[1]
+    urls = []
+    for lanes in neighbor_lane_paths(voice_name, zone_name, session_id):
+        audio_path = asset_index.lookup("audio", voice_number, lanes)
+        if not audio_path and voice_synthesizer and voice_synthesizer.can_synthesize(voice_number, lanes):
+            audio_path = voice_synthesizer.output_path(voice_number, lanes)
+        if audio_path:
+            urls.append(audio_quality_url(processed_audio_url(audio_path), PREFETCH_AUDIO_QUALITY))
         
-        # If the voice has passed through this zone, use the recorded lane
-        if z_num <= current_zone_num:
-            # Use the recorded lane for zones we've passed through
-            lane_val = voice_traversal[voice_name][z_name] if voice_traversal[voice_name][z_name] else "0"
-        else:
-            # Use "0" for zones we haven't reached yet
-            lane_val = "0"
-            
-        filename_parts.append(f"Z{z_num}")
-        filename_parts.append(f"L{lane_val}")
+        metadata, _, _ = get_metadata_item(voice_number, lanes, track=False)
+        # The same URL the client builds from the metadata (spectrogramUrl), so the prefetch is used
+        separator = "&" if "?" in metadata.spectrogram else "?"
+        urls.append(f"{metadata.spectrogram}{separator}size={PREFETCH_SPECTROGRAM_SIZE}")
+    # Paths without their own spectrogram share their voice's fallback
+    return list(dict.fromkeys(urls))
+
+def warm_neighbors(voice_name: str, zone_name: str, session_id: str = DEFAULT_SESSION_ID) -> None:
+    """Start rendering whatever the moves one step away would otherwise render on request
     
-    # Construct the complete filename
-    filename = "_".join(filename_parts) + ".mp3"
-    return filename
+    Runs as a background task after the response is sent.
+    """
+    voice_number = voice_name.split(" ")[1]
+    for lanes in neighbor_lane_paths(voice_name, zone_name, session_id):
+        audio_path = asset_index.lookup("audio", voice_number, lanes)
+        if audio_path:
+            name = asset_basename(voice_number, lanes)
+            if asset_index.lookup("spectrogram", voice_number, lanes):
+                continue
+            source_sha256 = asset_index.digest(audio_path)
+            if not spectrogram_cache.contains(name, source_sha256):
+                # Renders are started on the event loop
+                from_thread.run_sync(spectrogram_cache.render, name, audio_path, source_sha256)
+        elif voice_synthesizer and voice_synthesizer.can_synthesize(voice_number, lanes):
+            if not voice_synthesizer.existing_output(voice_number, lanes):
+                voice_synthesizer.start(voice_number, lanes)
 
-def process_audio(voice_name: str, zone_name: str, lane_name: str, prev_zone_name: str = None) -> str:
+def prefetch_link_header(urls: List[str]) -> str:
+    """Format prefetch URLs as a Link header
+    
+    Audio is hinted as=audio, so the prefetch is sent with the same Accept
+    header as the page's audio element and the preview format it gets (which
+    the response varies on) is the one played.
+    """
+    return ", ".join(
+        f'<{url}>; rel=prefetch; as={"audio" if url.startswith("/processed/") else "image"}'
+        for url in urls
+    )
+
+def process_audio(voice_name: str, zone_name: str, lane_name: str, prev_zone_name: str = None,
+                  session_id: str = DEFAULT_SESSION_ID) -> str:
     """Get the appropriate audio file based on voice traversal history"""
     # Determine if we're moving backwards
     moving_backwards = False
@@ -271,189 +668,178 @@ def process_audio(voice_name: str, zone_name: str, lane_name: str, prev_zone_nam
         moving_backwards = current_zone_num < prev_zone_num
     
     # Generate the filename based on traversal history
-    filename = get_voice_filename(voice_name, zone_name, lane_name, moving_backwards)
-    
-    # Full path to the audio file
-    file_path = os.path.join(VOICE_FILES_DIR, filename)
+    filename = get_voice_filename(voice_name, zone_name, lane_name, moving_backwards, session_id)
     
     # Log the voice file we're looking for
-    print(f"Looking for voice file: {file_path}")
+    logger.debug("Looking for voice file: %s", filename, extra={"event": "asset_lookup"})
     
     # Verify file exists and log result
-    if os.path.exists(file_path):
-        print(f"MATCH: Found exact voice file match: {os.path.basename(file_path)}")
+    file_path = asset_index.find("audio", filename)
+    if file_path:
+        logger.debug("MATCH: Found exact voice file match: %s", filename, extra={"event": "asset_lookup"})
+        metrics.inc("asset_lookups_total", kind="audio", result="exact")
         return file_path
     else:
-        print(f"NO MATCH: Voice file not found: {os.path.basename(file_path)}")
-        # Use fallback file if the specific one doesn't exist
+        logger.debug("NO MATCH: Voice file not found: %s", filename, extra={"event": "asset_lookup"})
         voice_number = voice_name.split(" ")[1]
-        fallback_file = os.path.join(VOICE_FILES_DIR, f"voice_{voice_number}_Z1_L0_Z2_L0_Z3_L0_Z4_L0.mp3")
+        
+        # Synthesize the missing path from its pregenerated prefix. The render is only
+        # started here; /processed streams it to the client while it is in progress
+        parsed = parse_asset_name(filename)
+        if voice_synthesizer and parsed and voice_synthesizer.can_synthesize(*parsed):
+            try:
+                if not voice_synthesizer.existing_output(*parsed):
+                    voice_synthesizer.start(*parsed)
+                    logger.info("SYNTHESIZING: Rendering %s from its pregenerated prefix", filename,
+                                extra={"event": "asset_synthesized"})
+                metrics.inc("asset_lookups_total", kind="audio", result="synthesized")
+                return voice_synthesizer.output_path(*parsed)
+            except Exception as e:
+                logger.warning("Failed to start synthesizing %s: %s", filename, e)
+        
+        # Otherwise use the closest available variant of this voice
+        fallback_file = nearest_fallback("audio", voice_number, parsed[1]) if parsed else None
         
         # Check if fallback exists and log result
-        if os.path.exists(fallback_file):
-            print(f"FALLBACK: Using default voice file: {os.path.basename(fallback_file)}")
+        if fallback_file:
+            metrics.inc("asset_lookups_total", kind="audio", result="fallback")
+            logger.info("FALLBACK: Using nearest voice file %s instead of %s", os.path.basename(fallback_file), filename,
+                        extra={"event": "asset_fallback"})
             return fallback_file
         else:
-            print(f"ERROR: No fallback voice file found for voice {voice_number}")
-            raise Exception(f"Voice file not found: {file_path} and no fallback available")
-    
-    # This line should never be reached due to the above logic
-    return file_path
+            metrics.inc("asset_lookups_total", kind="audio", result="none")
+            logger.error("No fallback voice file found for voice %s", voice_number)
+            raise Exception(f"Voice file not found: {filename} and no fallback available")
 
-def generate_metadata(voice_name: str, zone_name: str, lane_name: str) -> MetadataItem:
-    """Load metadata from JSON files in the stats directory"""
-    global spectrogram_stats
+def build_metadata_item(voice_number: str, lanes) -> tuple:
+    """Resolve the stats and spectrogram for a lane path into a ready MetadataItem
     
-    # Extract voice number, zone number, and lane number
-    voice_number = voice_name.split(" ")[1]
+    Returns the item together with where its stats and spectrogram came from
+    ("exact", "sample"/"fallback" or "none") for logging.
+    """
+    asset_name = asset_basename(voice_number, lanes)
     
-    # Track requests by voice
-    spectrogram_stats["requests_by_voice"][voice_name] = spectrogram_stats["requests_by_voice"].get(voice_name, 0) + 1
+    # Stats use the audio filename (without _stats suffix); fall back to the generic sample analysis
+    emotions = metadata_bundle["entries"].get(asset_name)
+    stats_source = "exact"
+    if emotions is None:
+        emotions = metadata_bundle["sample"] or {}
+        stats_source = "sample" if metadata_bundle["sample"] else "none"
     
-    # Use same filename pattern as audio files but with .json extension
-    filename_parts = []
+    # Use the exact spectrogram when it exists or can be rendered from the exact audio,
+    # otherwise the spectrogram of the closest variant of this voice. Renders aren't
+    # versioned, since their content isn't known until they are done
+    spectrogram = f"/spectrograms/{asset_name}.png"
+    spectrogram_source = "exact"
+    exact_spectrogram = asset_index.lookup("spectrogram", voice_number, lanes)
+    if exact_spectrogram:
+        spectrogram = spectrogram_url(exact_spectrogram)
+    elif asset_index.lookup("audio", voice_number, lanes) or (
+            voice_synthesizer and voice_synthesizer.can_synthesize(voice_number, lanes)):
+        spectrogram_source = "render"
+    else:
+        fallback_spectrogram = nearest_fallback("spectrogram", voice_number, lanes)
+        if fallback_spectrogram:
+            spectrogram = spectrogram_url(fallback_spectrogram)
+            spectrogram_source = "fallback"
+        else:
+            spectrogram_source = "none"
     
-    # Check traversal history to get the correct file
-    for voice, zones in voice_traversal.items():
-        if voice == voice_name:
-            # Use "voice_1" format as seen in spectrogram files (with underscore)
-            filename_parts = [f"voice_{voice_number}"]
-            
-            # Add zone and lane info from traversal history
-            for z in range(1, 5):  # Zones 1-4
-                z_name = f"Zone {z}"
-                # For zones we've passed through, use recorded lane
-                if z_name in zones and zones[z_name] is not None:
-                    lane_val = zones[z_name]
-                else:
-                    lane_val = "0"
-                
-                filename_parts.append(f"Z{z}")
-                filename_parts.append(f"L{lane_val}")
-            
-            break
+    metadata = MetadataItem(
+        language=[EmotionData(**item) for item in emotions["language"]] if "language" in emotions else None,
+        prosody=[EmotionData(**item) for item in emotions["prosody"]] if "prosody" in emotions else None,
+        spectrogram=spectrogram,  # Always use a spectrograms/ URL, never a placeholder
+        acoustics=feature_store.lookup(voice_number, lanes) if feature_store else None
+    )
+    return metadata, stats_source, spectrogram_source
+
+def get_metadata_item(voice_number: str, lanes, track: bool = True) -> tuple:
+    """Return the cached metadata for a lane path, building it on first use
     
-    # Add .json extension (without _stats suffix)
-    stats_filename = "_".join(filename_parts) + ".json"
-    stats_path = os.path.join(STATS_DIR, stats_filename)
+    `track` records the lookup in the cache hit/miss metrics (off for warm-up).
+    """
+    global metadata_cache, metadata_cache_generation
     
-    print(f"Looking for stats file: {stats_path}")
+    # Drop everything built against an older asset index
+    if metadata_cache_generation != asset_index.generation:
+        metadata_cache = {}
+        metadata_cache_generation = asset_index.generation
     
-    # Check if the stats file exists and log result
-    if os.path.exists(stats_path):
-        print(f"MATCH: Found exact stats file match: {os.path.basename(stats_path)}")
-    else:
-        print(f"NO MATCH: Stats file not found: {os.path.basename(stats_path)}")
+    key = (voice_number, tuple(lanes))
+    entry = metadata_cache.get(key)
+    if track:
+        metrics.inc("cache_requests_total", cache="metadata", result="miss" if entry is None else "hit")
+    if entry is None:
+        entry = build_metadata_item(voice_number, lanes)
+        metadata_cache[key] = entry
+    return entry
+
+def warm_metadata_cache() -> None:
+    """Build the metadata for every indexed lane path ahead of the first request"""
+    for voice_number, lanes in asset_index.combinations():
+        get_metadata_item(voice_number, lanes, track=False)
+    logger.info("Metadata cache warmed: %d entries", len(metadata_cache))
+
+def traversal_path(voice_name: str, session_id: str = DEFAULT_SESSION_ID) -> tuple:
+    """Return the Z1..Z4 lanes a voice has taken, "0" for zones it hasn't entered"""
+    traversal = traversal_store.get(session_id, voice_name)
+    return tuple(
+        traversal[f"Zone {z}"] if traversal[f"Zone {z}"] is not None else "0"
+        for z in range(1, 5)
+    )
+
+def generate_metadata(voice_name: str, zone_name: str, lane_name: str,
+                      session_id: str = DEFAULT_SESSION_ID) -> MetadataItem:
+    """Return the metadata for a voice's current traversal path"""
+    # Extract voice number, zone number, and lane number
+    voice_number = voice_name.split(" ")[1]
     
-    # Get the correct spectrogram filename based on voice traversal
-    spectrogram_filename = "_".join(filename_parts) + ".png"
-    spectrogram_path = os.path.join(SPECTROGRAMS_DIR, spectrogram_filename)
+    # Track requests by voice
+    metrics.inc("voice_requests_total", voice=voice_name)
     
-    # Log the path we're looking for
-    print(f"Looking for spectrogram: {spectrogram_path}")
+    # Use same lane path as the audio files, taken from traversal history
+    lanes = traversal_path(voice_name, session_id)
     
-    # Default spectrogram URL - we'll always use the direct spectrogram path
-    spectrogram_url = f"/spectrograms/{spectrogram_filename}"
+    metadata, stats_source, spectrogram_source = get_metadata_item(voice_number, lanes)
+    metrics.inc("asset_lookups_total", kind="stats", result=stats_source)
+    metrics.inc("asset_lookups_total", kind="spectrogram_url", result=spectrogram_source)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Metadata for %s: stats=%s, spectrogram=%s (%s)", asset_basename(voice_number, lanes),
+                     stats_source, spectrogram_source, metadata.spectrogram, extra={"event": "asset_lookup"})
     
-    # Check if the precise spectrogram exists and log result
-    if os.path.exists(spectrogram_path):
-        print(f"MATCH: Found exact spectrogram match: {spectrogram_filename}")
-    else:
-        print(f"NO MATCH: Exact spectrogram not found: {spectrogram_filename}")
-        # Try to find any spectrogram for this voice as fallback
-        if not os.path.exists(spectrogram_path) and os.path.exists(SPECTROGRAMS_DIR):
-            fallback_found = False
-            for f in os.listdir(SPECTROGRAMS_DIR):
-                if f.startswith(f"voice_{voice_number}_") and f.endswith(".png"):
-                    fallback_spectrogram = f
-                    print(f"AUTO-FALLBACK: Will use {fallback_spectrogram} as fallback")
-                    spectrogram_url = f"/spectrograms/{fallback_spectrogram}"
-                    fallback_found = True
-                    break
-            
-            if not fallback_found:
-                print(f"NO FALLBACK: No alternative spectrograms found for voice {voice_number}")
+    return metadata
+
+def cached_process_response(response_cache: ResponseCache, key: tuple):
+    """Look up the serialized response of a resolved move, recording the hit or miss"""
+    cached = response_cache.get(key, asset_index.generation)
+    metrics.inc("cache_requests_total", cache="process_response", result="miss" if cached is None else "hit")
+    return cached
+
+def response_is_stable(result: dict) -> bool:
+    """Return True if a response stays valid until the asset index changes
     
-    # Default response with spectrogram data
-    metadata = MetadataItem(
-        language=None,
-        prosody=None,
-        spectrogram=spectrogram_url  # Always use a spectrograms/ URL, never a placeholder
+    That is, none of its audio is still to be synthesized, whose URLs change
+    once the render is done.
+    """
+    urls = [result["audioFile"], *(result.get("prefetch") or [])]
+    return all(
+        asset_index.find("audio", os.path.basename(url.split("?", 1)[0]))
+        for url in urls if url and url.startswith("/processed/")
     )
-    
-    # Try to load the stats file
-    try:
-        if os.path.exists(stats_path):
-            with open(stats_path, 'r') as f:
-                stats_data = json.load(f)
-                
-            # Check if the file has the expected structure
-            if "top_emotions" in stats_data:
-                # Convert language data
-                if "language" in stats_data["top_emotions"]:
-                    language_data = [
-                        EmotionData(name=item["name"], score=item["score"])
-                        for item in stats_data["top_emotions"]["language"]
-                    ]
-                    metadata.language = language_data
-                
-                # Convert prosody data
-                if "prosody" in stats_data["top_emotions"]:
-                    prosody_data = [
-                        EmotionData(name=item["name"], score=item["score"])
-                        for item in stats_data["top_emotions"]["prosody"]
-                    ]
-                    metadata.prosody = prosody_data
-        else:
-            # We already logged the missing file above, now try sample file as fallback
-            sample_path = os.path.join(STATS_DIR, "sample_voice_analysis.json")
-            
-            # Track if we found fallback data
-            fallback_data_loaded = False
-            
-            if os.path.exists(sample_path):
-                print(f"FALLBACK: Using generic sample stats file: {os.path.basename(sample_path)}")
-                try:
-                    with open(sample_path, 'r') as f:
-                        stats_data = json.load(f)
-                    fallback_data_loaded = True
-                    
-                    # Convert language data
-                    if "top_emotions" in stats_data and "language" in stats_data["top_emotions"]:
-                        language_data = [
-                            EmotionData(name=item["name"], score=item["score"])
-                            for item in stats_data["top_emotions"]["language"]
-                        ]
-                        metadata.language = language_data
-                    
-                    # Convert prosody data
-                    if "top_emotions" in stats_data and "prosody" in stats_data["top_emotions"]:
-                        prosody_data = [
-                            EmotionData(name=item["name"], score=item["score"])
-                            for item in stats_data["top_emotions"]["prosody"]
-                        ]
-                        metadata.prosody = prosody_data
-                except Exception as e:
-                    print(f"ERROR: Failed to load fallback stats file: {e}")
-                    fallback_data_loaded = False
-            else:
-                print(f"NO FALLBACK: Sample stats file not found at {os.path.basename(sample_path)}")
-                
-            # If no fallback data was loaded, we'll just return the metadata with default empty values
-            if not fallback_data_loaded:
-                print("INFO: Using empty default metadata (no stats available)")
-    except Exception as e:
-        print(f"Error loading stats file {stats_path}: {e}")
-    
-    return metadata
 
-@app.post("/api/process", response_model=VoiceProcessResponse)
-async def process_voice(request: VoiceProcessRequest):
+def resolve_voice_request(request: VoiceProcessRequest, session_id: str,
+                          response_cache: Optional[ResponseCache] = None) -> dict:
+    """Resolve one card move into its audio file, metadata and message (blocking; call from a thread)
+    
+    Errors are reported in the result's status and message rather than raised.
+    With a `response_cache`, the result also has the serialized response under
+    "cached"; once the move's path is resolved, a cache hit skips the rest.
+    """
     # Log the incoming request
-    print(f"Processing request: {request}")
+    logger.debug("Processing request: %s", request, extra={"event": "request"})
     
-    # Simulate processing delay
     start_time = time.time()
+    cache_key = None
     
     result = {
         "message": "",
@@ -471,66 +857,79 @@ async def process_voice(request: VoiceProcessRequest):
             
             # Use the same consistent logging pattern
             if voice_path:
-                print(f"Looking for voice file: {voice_path}")
+                logger.debug("Looking for voice file: %s", voice_path, extra={"event": "asset_lookup"})
                 
-                if os.path.exists(voice_path):
-                    print(f"MATCH: Found exact voice file match: {os.path.basename(voice_path)}")
+                holding_file = asset_index.find("audio", os.path.basename(voice_path))
+                if holding_file and response_cache is not None:
+                    cache_key = (request.cardName, request.zoneName, request.laneName, holding_file)
+                    result["cached"] = cached_process_response(response_cache, cache_key)
+                    if result["cached"]:
+                        return result
+                if holding_file:
+                    logger.debug("MATCH: Found exact voice file match: %s", voice_path, extra={"event": "asset_lookup"})
                     # Serve the file directly
-                    result["audioFile"] = f"/processed/{os.path.basename(voice_path)}"
+                    result["audioFile"] = processed_audio_url(holding_file)
                     result["message"] = f"Playing {request.cardName} in holding zone"
                 else:
-                    print(f"NO MATCH: Voice file not found: {os.path.basename(voice_path)}")
+                    logger.debug("NO MATCH: Voice file not found: %s", voice_path, extra={"event": "asset_lookup"})
                     
-                    # Try to find any file for this voice as fallback
+                    # Try the closest available variant of this voice as fallback
                     fallback_found = False
-                    if os.path.exists(VOICE_FILES_DIR):
-                        voices_files = os.listdir(VOICE_FILES_DIR)
-                        print(f"Searching for fallback in {VOICE_FILES_DIR}...")
-                        
-                        for file in voices_files:
-                            if file.startswith(f"voice_{voice_number}_") and file.endswith(".mp3"):
-                                fallback_path = os.path.join(VOICE_FILES_DIR, file)
-                                print(f"FALLBACK: Found alternative voice file: {file}")
-                                result["audioFile"] = f"/processed/{file}"
-                                result["message"] = f"Playing fallback for {request.cardName}"
-                                fallback_found = True
-                                break
+                    parsed = parse_asset_name(os.path.basename(voice_path))
+                    fallback_path = nearest_fallback("audio", voice_number, parsed[1] if parsed else ("0",) * 4)
+                    if fallback_path:
+                        logger.info("FALLBACK: Found alternative voice file: %s", os.path.basename(fallback_path),
+                                    extra={"event": "asset_fallback"})
+                        result["audioFile"] = processed_audio_url(fallback_path)
+                        result["message"] = f"Playing fallback for {request.cardName}"
+                        fallback_found = True
                     
                     if not fallback_found:
-                        print(f"NO FALLBACK: No alternative voice files found for {request.cardName}")
+                        logger.error("No alternative voice files found for %s", request.cardName)
                         result["status"] = "error"
                         result["message"] = f"Voice file not found for {request.cardName}"
             else:
-                print(f"ERROR: No voice path configured for {request.cardName}. Available voices: {list(VOICE_FILES.keys())}")
+                logger.error("No voice path configured for %s. Available voices: %s", request.cardName, list(VOICE_FILES))
                 result["status"] = "error" 
                 result["message"] = f"Voice not configured: {request.cardName}"
         else:
             # Get appropriate audio file based on traversal path
             try:
                 # Get the file path based on traversal history
-                voice_file_path = process_audio(request.cardName, request.zoneName, request.laneName, request.previousZone)
+                voice_file_path = process_audio(request.cardName, request.zoneName, request.laneName, request.previousZone, session_id)
+                
+                # Everything else in the response follows from the resolved path
+                if response_cache is not None:
+                    cache_key = (request.cardName, request.zoneName, request.laneName, voice_file_path,
+                                 traversal_path(request.cardName, session_id))
+                    result["cached"] = cached_process_response(response_cache, cache_key)
+                    if result["cached"]:
+                        metrics.inc("voice_requests_total", voice=request.cardName)
+                        return result
                 
-                # Copy the file to temp directory for serving
+                # Serve the pregenerated file in place under a versioned URL
                 file_name = os.path.basename(voice_file_path)
-                temp_file_path = os.path.join(TEMP_DIR, file_name)
-                shutil.copy2(voice_file_path, temp_file_path)
                 
                 # Set relative path for client to access
-                result["audioFile"] = f"/processed/{file_name}"
+                result["audioFile"] = processed_audio_url(voice_file_path)
                 
                 # Generate metadata with spectrogram
-                result["metadata"] = generate_metadata(request.cardName, request.zoneName, request.laneName)
+                result["metadata"] = generate_metadata(request.cardName, request.zoneName, request.laneName, session_id)
                 
                 # Debug: log the actual spectrogram URL being sent
-                print(f"DEBUG: Sending spectrogram URL to client: {result['metadata'].spectrogram if result['metadata'] else 'None'}")
+                logger.debug("Sending spectrogram URL to client: %s", result['metadata'].spectrogram, extra={"event": "response"})
                 
                 # Crucial check - make sure we're never returning placeholder URLs
                 if '/placeholder' in result['metadata'].spectrogram:
-                    print("WARNING: Still sending placeholder URL! This is wrong!")
-                    # Force an actual spectrogram URL
+                    logger.warning("Still sending placeholder URL! This is wrong!")
+                    # Force an actual spectrogram URL (on a copy, the cached metadata is shared)
                     voice_number = request.cardName.split(" ")[1]
-                    result['metadata'].spectrogram = f"/spectrograms/voice_{voice_number}_Z1_L0_Z2_L0_Z3_L0_Z4_L0.png"
-                    print(f"FIXED: Changed to {result['metadata'].spectrogram}")
+                    base_name = f"voice_{voice_number}_Z1_L0_Z2_L0_Z3_L0_Z4_L0.png"
+                    base_path = asset_index.find("spectrogram", base_name)
+                    result['metadata'] = result['metadata'].model_copy(
+                        update={"spectrogram": spectrogram_url(base_path) if base_path else f"/spectrograms/{base_name}"}
+                    )
+                    logger.warning("FIXED: Changed to %s", result['metadata'].spectrogram)
                 
                 # Generate message based on zone
                 if request.zoneName == "Zone 1":
@@ -543,122 +942,585 @@ async def process_voice(request: VoiceProcessRequest):
                     result["message"] = f"Final zone reached: {request.cardName} is in {request.laneName} of {request.zoneName}."
                 
                 # Log the traversal path and filename being used
-                print(f"Voice traversal for {request.cardName}: {voice_traversal[request.cardName]}")
-                print(f"Using audio file: {file_name}")
+                logger.debug("Voice %s (session %s) using audio file: %s", request.cardName, session_id, file_name,
+                             extra={"event": "response"})
                 
             except Exception as e:
-                print(f"Error processing audio: {e}")
+                logger.error("Error processing audio: %s", e)
                 raise
     except Exception as e:
-        print(f"ERROR processing request: {e}")
+        logger.error("Error processing request %s: %s", request, e)
         result["status"] = "error"
         result["message"] = f"Error: {str(e)}"
     
-    # Add some additional processing delay for realism
-    time.sleep(1)  
+    # Advertise the assets of the next likely moves
+    if PREFETCH_NEIGHBORS and result["status"] == "success":
+        try:
+            result["prefetch"] = neighbor_prefetch_urls(request.cardName, request.zoneName, session_id)
+        except Exception as e:
+            logger.warning("Failed to compute prefetch hints for %s: %s", request, e)
     
     # Calculate processing time
     result["processingTime"] = time.time() - start_time
     
+    if cache_key is not None and result["status"] == "success" and response_is_stable(result):
+        payload = VoiceProcessResponse.model_validate(result).model_dump(mode="json")
+        result["cached"] = response_cache.put(cache_key, asset_index.generation, payload)
+    
+    return result
+
+@app.post("/api/process", response_model=VoiceProcessResponse)
+async def process_voice(request: VoiceProcessRequest, response: Response, background_tasks: BackgroundTasks,
+                        x_session_id: Optional[str] = Header(None)):
+    # Traversal history is tracked separately for every client session
+    session_id = x_session_id or DEFAULT_SESSION_ID
+    start_time = time.time()
+    
+    result = await run_in_threadpool(resolve_voice_request, request, session_id, process_response_cache)
+    cached = result.get("cached")
+    prefetch = cached.prefetch if cached else result.get("prefetch")
+    if prefetch:
+        response.headers["Link"] = prefetch_link_header(prefetch)
+        background_tasks.add_task(warm_neighbors, request.cardName, request.zoneName, session_id)
+    
+    # Add some additional processing delay for realism, without stalling other requests
+    if PROCESSING_DELAY > 0:
+        await asyncio.sleep(PROCESSING_DELAY)
+    
+    if cached:
+        # Sent as is, with only the timing filled in; skips response model validation
+        return Response(cached.body(time.time() - start_time), media_type="application/json",
+                        headers=dict(response.headers))
+    result["processingTime"] = time.time() - start_time
     return result
 
+def resolve_voice_requests(requests: List[VoiceProcessRequest], session_id: str) -> List[dict]:
+    """Resolve card moves in order, so later moves of a voice see the traversal of earlier ones"""
+    results = []
+    for request in requests:
+        try:
+            results.append(resolve_voice_request(request, session_id))
+        except Exception as e:
+            # resolve_voice_request reports its own errors; this only guards the rest of the batch
+            logger.exception("Unexpected error processing batch item %s: %s", request, e)
+            results.append({"message": f"Error: {str(e)}", "status": "error", "processingTime": 0,
+                            "audioFile": None, "metadata": None})
+    return results
+
+@app.post("/api/process/batch", response_model=VoiceProcessBatchResponse)
+async def process_voice_batch(request: VoiceProcessBatchRequest, background_tasks: BackgroundTasks,
+                              x_session_id: Optional[str] = Header(None)):
+    """Process several card moves in one round trip, e.g. a multi-card move or a layout reset
+    
+    Items are resolved in order in a single worker thread, sharing the asset
+    index and metadata cache; each item gets its own result, and one failing
+    item doesn't affect the others.
+    """
+    session_id = x_session_id or DEFAULT_SESSION_ID
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Too many items in batch: {len(request.items)} (max {MAX_BATCH_SIZE})")
+    start_time = time.time()
+    
+    results = await run_in_threadpool(resolve_voice_requests, request.items, session_id)
+    metrics.inc("batch_items_total", value=len(results))
+    # Each voice's final position is what the next moves start from
+    final_positions = {item.cardName: item.zoneName for item, result in zip(request.items, results)
+                       if result.get("prefetch")}
+    for voice_name, zone_name in final_positions.items():
+        background_tasks.add_task(warm_neighbors, voice_name, zone_name, session_id)
+    
+    # The simulated processing delay is paid once per batch, not per item
+    if PROCESSING_DELAY > 0:
+        await asyncio.sleep(PROCESSING_DELAY)
+    
+    return {"results": results, "processingTime": time.time() - start_time}
+
+def pending_synthesis(audio_url: str):
+    """Return the render of an audio URL that is still being synthesized, or None if it can be played in full"""
+    if not voice_synthesizer or not audio_url:
+        return None
+    file_name = os.path.basename(audio_url.split("?", 1)[0])
+    if asset_index.find("audio", file_name) or voice_synthesizer.find(file_name):
+        return None
+    parsed = parse_asset_name(file_name)
+    if not parsed or not voice_synthesizer.can_synthesize(*parsed):
+        return None
+    return voice_synthesizer.start(*parsed)
+
+async def announce_audio_ready(channel: MoveChannel, move: VoiceMoveCommand, audio_url: str) -> None:
+    """Tell the client when a move's audio can be played in full"""
+    start_time = time.perf_counter()
+    event = {"type": "audio-ready", "id": move.id, "cardName": move.cardName, "status": "success", "audioFile": audio_url}
+    future = await run_in_threadpool(pending_synthesis, audio_url)
+    if future is not None:
+        try:
+            # Shielded: the render is shared with every other request for this lane path
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), voice_synthesizer.timeout)
+        except Exception as e:
+            logger.error("Audio for %s was not ready: %s", audio_url, e)
+            file_name = os.path.basename(audio_url.split("?", 1)[0])
+            parsed = parse_asset_name(file_name)
+            fallback_file = await run_in_threadpool(nearest_fallback, "audio", *parsed) if parsed else None
+            if fallback_file:
+                # Like /processed, play the closest pregenerated variant instead
+                metrics.inc("asset_lookups_total", kind="audio", result="fallback")
+                event["audioFile"] = await run_in_threadpool(processed_audio_url, fallback_file)
+            else:
+                event.update(status="error", message=f"Failed to synthesize {file_name}")
+        metrics.observe("channel_audio_wait_seconds", time.perf_counter() - start_time)
+    channel.emit(event)
+
+async def handle_card_move(channel: MoveChannel, move: VoiceMoveCommand, session_id: str, transport: str) -> None:
+    """Resolve a move sent over a channel and push its result, then its audio-ready event"""
+    start_time = time.time()
+    result = await run_in_threadpool(resolve_voice_request, move, session_id)
+    if PROCESSING_DELAY > 0:
+        await asyncio.sleep(PROCESSING_DELAY)
+    result["processingTime"] = time.time() - start_time
+    metrics.inc("channel_moves_total", transport=transport, status=result["status"])
+    
+    # The result already carries the spectrogram URL; the audio may still be rendering
+    payload = VoiceProcessResponse.model_validate(result).model_dump(mode="json", exclude_none=True)
+    channel.emit({"type": "result", "id": move.id, **payload})
+    if result["status"] == "success" and result["audioFile"]:
+        channel.spawn(announce_audio_ready(channel, move, result["audioFile"]))
+    if result.get("prefetch"):
+        channel.spawn(run_in_threadpool(warm_neighbors, move.cardName, move.zoneName, session_id))
+
+def submit_card_move(channel: MoveChannel, data, transport: str) -> Optional[tuple]:
+    """Validate and queue a move sent over a channel
+    
+    Returns None once queued, otherwise the (HTTP status, reason) it was
+    rejected with; the client is told on the channel either way.
+    """
+    try:
+        move = VoiceMoveCommand.model_validate(data)
+    except ValidationError as e:
+        rejection = (400, f"Invalid move: {e.errors()[0]['msg']}")
+    else:
+        if channel.submit(move.cardName, move):
+            return None
+        rejection = (429, f"Too many pending moves (max {channel.max_pending})")
+    metrics.inc("channel_moves_total", transport=transport, status="rejected")
+    channel.emit({"type": "error", "id": move_id(data), "message": rejection[1]})
+    return rejection
+
+@app.websocket("/api/ws")
+async def move_channel_socket(websocket: WebSocket, session: Optional[str] = None):
+    """Persistent channel for card moves
+    
+    The client sends moves as JSON objects (a VoiceMoveCommand) without
+    waiting for earlier ones, and the server pushes a "result" event for each
+    (with the audio and spectrogram URLs), then an "audio-ready" event once
+    the audio can be played in full. Moves of a voice are handled in the order
+    sent; different voices are handled concurrently. Browsers can't set headers
+    on a WebSocket, so the session id is passed as ?session=.
+    """
+    session_id = session or websocket.headers.get("x-session-id") or DEFAULT_SESSION_ID
+    await websocket.accept()
+    metrics.inc("channel_connections_total", transport="websocket")
+    channel = MoveChannel(lambda channel, move: handle_card_move(channel, move, session_id, "websocket"))
+    
+    async def send_events():
+        while True:
+            event = await channel.events.get()
+            await websocket.send_text(json.dumps(event))
+    
+    sender = asyncio.create_task(send_events())
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                data = json.loads(message)
+            except ValueError:
+                data = None
+            submit_card_move(channel, data, "websocket")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        channel.close()
+        sender.cancel()
+
+# Server-sent event channels of this process, by channel id (the fallback for clients without WebSockets).
+# Moves are posted in separate requests, which must reach the worker holding the stream, so the SSE
+# transport needs a single uvicorn worker (or sticky routing); WebSocket channels work with any number.
+event_channels: Dict[str, MoveChannel] = {}
+
+# Idle event streams get a comment this often (in seconds), so proxies don't time them out
+EVENT_STREAM_KEEPALIVE = 15.0
+
+@app.get("/api/events")
+async def move_channel_events(session: Optional[str] = None):
+    """Server-sent event stream of a card move channel, for clients that can't open /api/ws
+    
+    The first event ("ready") carries the channel id; moves are posted to
+    /api/events/{channel} and their events arrive on this stream, exactly as
+    over the WebSocket. Channels live in the worker process serving the
+    stream, so this fallback needs the API to run as a single worker.
+    """
+    session_id = session or DEFAULT_SESSION_ID
+    channel_id = uuid.uuid4().hex
+    channel = MoveChannel(lambda channel, move: handle_card_move(channel, move, session_id, "sse"))
+    event_channels[channel_id] = channel
+    metrics.inc("channel_connections_total", transport="sse")
+    
+    async def events():
+        try:
+            yield f"data: {json.dumps({'type': 'ready', 'channel': channel_id})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(channel.events.get(), EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            event_channels.pop(channel_id, None)
+            channel.close()
+    
+    # nginx would otherwise buffer the stream
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@app.post("/api/events/{channel_id}", status_code=202)
+async def post_channel_move(channel_id: str, request: Request):
+    """Queue a card move on a server-sent event channel; its events arrive on the stream"""
+    channel = event_channels.get(channel_id)
+    if channel is None:
+        # Closed, or opened on another worker process (see event_channels)
+        raise HTTPException(status_code=404, detail=f"Unknown event channel: {channel_id}")
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    rejection = submit_card_move(channel, data, "sse")
+    if rejection:
+        raise HTTPException(status_code=rejection[0], detail=rejection[1])
+    return {"queued": True}
+
 @app.get("/processed/{file_name}")
-async def get_processed_file(file_name: str):
-    """Return a processed audio file"""
-    print(f"Request for processed file: {file_name}")
+async def get_processed_file(file_name: str, request: Request, v: Optional[str] = None, quality: str = "full"):
+    """Return a processed audio file
     
-    # First try the temp directory
-    file_path = os.path.join(TEMP_DIR, file_name)
+    `quality` is full (the original) or preview (a low-bitrate transcode, in a format chosen from Accept).
+    Synthesized audio has no previews and is always served in full.
+    """
+    logger.debug("Request for processed file: %s", file_name, extra={"event": "request"})
     
-    # If not in temp dir, try the voices directory
-    if not os.path.exists(file_path):
-        print(f"File not found in temp dir: {file_path}")
-        voice_file_path = os.path.join(VOICE_FILES_DIR, file_name)
-        
-        if os.path.exists(voice_file_path):
-            print(f"Found file in voices directory: {voice_file_path}")
-            file_path = voice_file_path
-        else:
-            print(f"ERROR: File not found in any location: {file_name}")
-            print(f"Contents of temp directory: {os.listdir(TEMP_DIR)}")
-            print(f"Contents of voices directory: {os.listdir(VOICE_FILES_DIR)[:5]}...")
-            raise HTTPException(status_code=404, detail=f"File not found: {file_name}")
+    if quality not in AUDIO_QUALITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown audio quality: {quality}")
+    
+    # Pregenerated voice files are served in place, resolved through the asset index;
+    # anything else may have been synthesized
+    file_path = asset_index.find("audio", file_name)
+    if not file_path and voice_synthesizer:
+        file_path = await run_in_threadpool(voice_synthesizer.find, file_name)
+        if not file_path:
+            response = await stream_synthesized_audio(file_name, quality)
+            if response is not None:
+                return response
+            file_path = await run_in_threadpool(voice_synthesizer.find, file_name)
+    
+    if not file_path:
+        logger.warning("Processed file not found: %s", file_name)
+        raise HTTPException(status_code=404, detail=f"File not found: {file_name}")
     
-    print(f"Returning file: {file_path}")
-    # Determine content type based on file extension
-    media_type = "audio/mpeg" if file_path.endswith(".mp3") else "audio/wav"
-    return FileResponse(file_path, media_type=media_type)
+    logger.debug("Returning file: %s", file_path, extra={"event": "file_served"})
+    stat_result = asset_index.stat(file_path) or await run_in_threadpool(os.stat, file_path)
+    return await serve_audio(request, file_path, stat_result, v, quality)
 
-@app.get("/spectrograms/{file_name}")
-async def get_spectrogram(file_name: str):
-    """Return a spectrogram image file"""
-    global spectrogram_stats
+def synthesis_fallback(file_name: str, quality: str, reason: str) -> Optional[Response]:
+    """Redirect a request for audio that couldn't be synthesized to the closest pregenerated variant"""
+    parsed = parse_asset_name(file_name)
+    fallback_file = nearest_fallback("audio", *parsed) if parsed else None
+    if not fallback_file:
+        return None
+    metrics.inc("asset_lookups_total", kind="audio", result="fallback")
+    logger.warning("FALLBACK: %s %s, redirecting to nearest voice file %s", file_name, reason,
+                   os.path.basename(fallback_file), extra={"event": "asset_fallback"})
+    # Not cacheable: the synthesized audio is served at this URL once a render succeeds
+    return RedirectResponse(audio_quality_url(processed_audio_url(fallback_file), quality), status_code=307,
+                            headers={"Cache-Control": "no-store"})
+
+async def stream_synthesized_audio(file_name: str, quality: str = "full") -> Optional[Response]:
+    """Stream a lane path's audio while it is being synthesized
+
+    MP3 frames are sent as the synthesis writes them, so playback starts after
+    the first block instead of the whole clip. Returns None if the path can't
+    be synthesized, or the finished file if the render completes first. If the
+    render fails, or sends nothing within SYNTH_TIMEOUT, the client is
+    redirected to the closest pregenerated variant instead.
+    """
+    parsed = parse_asset_name(file_name)
+    if not parsed or not file_name.endswith(".mp3") or not voice_synthesizer.can_synthesize(*parsed):
+        return None
+    
+    future = voice_synthesizer.start(*parsed)
+    partial_path = voice_synthesizer.partial_path(file_name)
+    
+    # Wait for the first frames (or the whole render) before committing to a response
+    deadline = time.monotonic() + voice_synthesizer.timeout
+    partial_file = None
+    while partial_file is None and not future.done():
+        try:
+            partial_file = await run_in_threadpool(open, partial_path, "rb")
+        except FileNotFoundError:
+            if time.monotonic() > deadline:
+                # The render carries on, for the next request
+                fallback = await run_in_threadpool(synthesis_fallback, file_name, quality, "is taking too long")
+                if fallback is not None:
+                    return fallback
+                raise HTTPException(status_code=503, detail=f"Audio is being synthesized: {file_name}",
+                                    headers={"Retry-After": "1"})
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    if partial_file is None:
+        try:
+            future.result()
+        except Exception as e:
+            logger.error("Failed to synthesize %s: %s", file_name, e)
+            fallback = await run_in_threadpool(synthesis_fallback, file_name, quality, "failed to synthesize")
+            if fallback is not None:
+                return fallback
+            raise HTTPException(status_code=500, detail=f"Failed to synthesize {file_name}")
+        return None  # Finished already; served from the synthesis cache
+    
+    async def frames():
+        # Memory stays bounded by the chunk size, however long the clip is
+        try:
+            while True:
+                chunk = await run_in_threadpool(partial_file.read, STREAM_CHUNK_SIZE)
+                if chunk:
+                    yield chunk
+                elif future.done():
+                    # The partial file was renamed into place; drain what was written last
+                    chunk = await run_in_threadpool(partial_file.read)
+                    if chunk:
+                        yield chunk
+                    if future.exception():
+                        # Abort the response, so the client sees a failed download rather than a clip
+                        # that ends early but looks complete
+                        raise RuntimeError(f"Synthesis of {file_name} failed while streaming: {future.exception()}")
+                    return
+                else:
+                    await asyncio.sleep(STREAM_POLL_INTERVAL)
+        finally:
+            partial_file.close()
     
-    # Update statistics
-    spectrogram_stats["total_requests"] += 1
+    metrics.inc("audio_streams_total")
+    logger.debug("STREAMING: Sending %s while it is synthesized", file_name, extra={"event": "file_served"})
+    # Not cacheable: once complete, the file is served with validators and Range support
+    return StreamingResponse(frames(), media_type="audio/mpeg",
+                             headers={"Cache-Control": "no-store", "Accept-Ranges": "none"})
+
+async def serve_spectrogram(request: Request, file_path: str, size: str, v: Optional[str] = None) -> Response:
+    """Serve the best pregenerated variant of a spectrogram for the requested size and Accept header
     
-    print(f"Request for spectrogram: {file_name}")
+    `v` is the request's ?v=, the version of the full-size image (see spectrogram_url).
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    formats = ["webp", "png"] if accepts(request, "image/webp") else ["png"]
+    current = v is not None and v == content_version(await run_in_threadpool(asset_index.digest, file_path))
+
+    # Fall back to the full-size image when a size hasn't been generated
+    for candidate_size in (size, "full"):
+        for fmt in formats:
+            variant_path = asset_index.spectrogram_variant(name, candidate_size, fmt)
+            if variant_path:
+                metrics.inc("spectrogram_variants_total", size=candidate_size, format=fmt)
+                digest = await run_in_threadpool(asset_index.digest, variant_path)
+                # Variants are generated with the full-size image, so its current ?v= stays valid for them
+                version = content_version(digest) if current else v
+                # The format depends on the Accept header, so caches must key on it
+                return serve_file(request, variant_path, f"image/{fmt}", asset_index.stat(variant_path), digest,
+                                  version, extra_headers={"Vary": "Accept"}, packed=asset_index.packed(variant_path))
+
+    # Not indexed as a variant (e.g. the index is mid-refresh): serve the file as it is
+    return FileResponse(file_path, media_type="image/png", headers={"Vary": "Accept"})
+
+async def serve_rendered_spectrogram(request: Request, name: str, size: str) -> Optional[Response]:
+    """Serve a spectrogram from the on-demand render cache, if it has been rendered
+
+    Returns None when it hasn't been, or its files have gone, in which case
+    it is dropped from the cache so the next request renders it again.
+    """
+    formats = ["webp", "png"] if accepts(request, "image/webp") else ["png"]
+    for fmt in formats:
+        variant_path = spectrogram_cache.variant(name, size, fmt)
+        if variant_path:
+            try:
+                stat_result = await run_in_threadpool(os.stat, variant_path)
+                digest = await run_in_threadpool(spectrogram_cache.digest, name, variant_path)
+            except FileNotFoundError:
+                # Evicted by another worker sharing the cache directory
+                spectrogram_cache.discard(name)
+                return None
+            metrics.inc("spectrogram_variants_total", size=size, format=fmt)
+            return serve_file(request, variant_path, f"image/{fmt}", stat_result, digest,
+                              extra_headers={"Vary": "Accept"})
+    return None
+
+async def render_missing_spectrogram(request: Request, file_name: str, size: str) -> Optional[Response]:
+    """Render a missing spectrogram from its exact (or synthesized) audio file, waiting briefly for the result
+
+    Returns None when there is no audio to render from or rendering failed, and a
+    short-lived placeholder when the render takes longer than SPECTROGRAM_RENDER_WAIT.
+    """
+    parsed = parse_asset_name(file_name)
+    audio_path = asset_index.lookup("audio", *parsed) if parsed else None
+    synthesis = None
+    if not audio_path and parsed and voice_synthesizer and voice_synthesizer.can_synthesize(*parsed):
+        audio_path = await run_in_threadpool(voice_synthesizer.existing_output, *parsed)
+        if not audio_path:
+            # The audio itself is still being synthesized; render once it's done
+            synthesis = asyncio.wrap_future(voice_synthesizer.start(*parsed))
+    if not audio_path and not synthesis:
+        return None
     
-    # Force the correct content type for images
-    headers = {"Cache-Control": "max-age=3600, public"}
+    name = asset_basename(*parsed)
+    # Audio still being synthesized is new, so anything rendered for this path is from other audio
+    source_sha256 = await run_in_threadpool(asset_index.digest, audio_path) if audio_path else None
+    async def render():
+        try:
+            source = audio_path or await synthesis
+            digest = source_sha256 or await run_in_threadpool(asset_index.digest, source)
+        except Exception as e:
+            logger.error("Failed to synthesize audio for spectrogram %s: %s", name, e)
+            return False
+        # Concurrent requests for the same spectrogram join the same render
+        return await spectrogram_cache.render(name, source, digest)
+
+    # A second attempt re-renders a spectrogram whose files were evicted before they could be served
+    for _ in range(2):
+        if not source_sha256 or not spectrogram_cache.contains(name, source_sha256):
+            try:
+                rendered = await asyncio.wait_for(asyncio.shield(render()), SPECTROGRAM_RENDER_WAIT)
+            except asyncio.TimeoutError:
+                metrics.inc("spectrogram_requests_total", result="rendering")
+                logger.info("RENDERING: Spectrogram %s not ready yet, sending placeholder", name)
+                if not os.path.exists(PLACEHOLDER_SPECTROGRAM):
+                    raise HTTPException(status_code=503, detail=f"Spectrogram is being rendered: {file_name}",
+                                        headers={"Retry-After": "1"})
+                # Not cacheable, so the real image is fetched next time
+                return FileResponse(PLACEHOLDER_SPECTROGRAM, media_type="image/png",
+                                    headers={"Cache-Control": "no-store", "Retry-After": "1"})
+            if not rendered:
+                return None
+
+        response = await serve_rendered_spectrogram(request, name, size)
+        if response is not None:
+            metrics.inc("spectrogram_requests_total", result="rendered")
+            logger.debug("RENDERED: Serving on-demand spectrogram: %s", file_name, extra={"event": "file_served"})
+            return response
+    return None
+
+@app.get("/spectrograms/{file_name}")
+async def get_spectrogram(file_name: str, request: Request, size: str = "full", v: Optional[str] = None):
+    """Return a spectrogram image
+
+    `size` is one of thumb, medium or full; WebP is served to clients that accept it.
+    With the current ?v= of a pregenerated spectrogram, the response is cacheable forever.
+    """
+    logger.debug("Request for spectrogram: %s (size %s)", file_name, size, extra={"event": "request"})
+    
+    if size not in SPECTROGRAM_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown spectrogram size: {size}")
     
     # Full path to the spectrogram file in the spectrograms directory
-    file_path = os.path.join(SPECTROGRAMS_DIR, file_name)
+    file_path = asset_index.find("spectrogram", file_name)
     
     # Check if the spectrogram exists
-    if os.path.exists(file_path):
+    if file_path:
         # Update statistics
-        spectrogram_stats["exact_matches"] += 1
-        match_rate = (spectrogram_stats["exact_matches"] / spectrogram_stats["total_requests"]) * 100
+        metrics.inc("spectrogram_requests_total", result="exact")
         
-        print(f"EXACT MATCH: Serving exact spectrogram: {file_name}")
-        print(f"STATS: Exact matches: {spectrogram_stats['exact_matches']}/{spectrogram_stats['total_requests']} ({match_rate:.1f}%)")
-        return FileResponse(file_path, media_type="image/png", headers=headers)
+        logger.debug("EXACT MATCH: Serving exact spectrogram: %s", file_name, extra={"event": "file_served"})
+        return await serve_spectrogram(request, file_path, size, v)
     
-    # If not found, try to find any similar filename as a fallback
-    print(f"NOT FOUND: Exact spectrogram not found: {file_path}")
+    # If not found, render it from the matching audio
+    logger.debug("NOT FOUND: Exact spectrogram not found: %s", file_name, extra={"event": "asset_lookup"})
+    response = await render_missing_spectrogram(request, file_name, size)
+    if response is not None:
+        return response
     
-    # Extract voice number from the filename pattern (voice_X_...)
-    if file_name.startswith("voice_"):
+    # Without audio to render from, fall back to the spectrogram of the closest variant
+    parsed = parse_asset_name(file_name)
+    fallback_file = nearest_fallback("spectrogram", *parsed) if parsed else None
+    if fallback_file:
+        metrics.inc("spectrogram_requests_total", result="fallback")
+        logger.info("FALLBACK: Requested %s but using nearest spectrogram %s",
+                    file_name, os.path.basename(fallback_file), extra={"event": "asset_fallback"})
+        return await serve_spectrogram(request, fallback_file, size, v)
+    
+    # Names outside the lane path pattern fall back to any spectrogram of the voice
+    # (extract the voice number from the filename pattern voice_X_...)
+    if not parsed and file_name.startswith("voice_"):
         parts = file_name.split("_")
         if len(parts) > 1:
             voice_num = parts[1]
             # Look for any spectrogram with this voice number
-            if os.path.exists(SPECTROGRAMS_DIR):
-                possible_matches = []
-                for f in os.listdir(SPECTROGRAMS_DIR):
-                    if f.startswith(f"voice_{voice_num}_") and f.endswith(".png"):
-                        possible_matches.append(f)
+            fallback_name = asset_index.fallback("spectrogram", voice_num)
+            
+            if fallback_name:
+                # Update statistics
+                metrics.inc("spectrogram_requests_total", result="fallback")
                 
-                if possible_matches:
-                    # Update statistics
-                    spectrogram_stats["fallbacks"] += 1
-                    fallback_rate = (spectrogram_stats["fallbacks"] / spectrogram_stats["total_requests"]) * 100
-                    
-                    # Use the first match as fallback
-                    fallback_file = os.path.join(SPECTROGRAMS_DIR, possible_matches[0])
-                    print(f"FALLBACK: Using voice-based fallback spectrogram: {os.path.basename(fallback_file)}")
-                    print(f"FALLBACK REASON: Requested '{file_name}' but using '{os.path.basename(fallback_file)}' instead")
-                    print(f"STATS: Fallbacks: {spectrogram_stats['fallbacks']}/{spectrogram_stats['total_requests']} ({fallback_rate:.1f}%)")
-                    return FileResponse(fallback_file, media_type="image/png", headers=headers)
-                else:
-                    print(f"NO FALLBACK: No alternative spectrograms found for voice {voice_num}")
+                fallback_file = asset_index.find("spectrogram", fallback_name)
+                logger.info("FALLBACK: Requested %s but using voice-based fallback spectrogram %s",
+                            file_name, fallback_name, extra={"event": "asset_fallback"})
+                return await serve_spectrogram(request, fallback_file, size, v)
+            else:
+                logger.warning("No alternative spectrograms found for voice %s", voice_num)
     
     # Last resort: use the default placeholder from the public directory
-    placeholder_path = "../public/placeholder_spectrogram.png"
-    if os.path.exists(placeholder_path):
+    if os.path.exists(PLACEHOLDER_SPECTROGRAM):
         # Update statistics
-        spectrogram_stats["placeholders"] += 1
-        placeholder_rate = (spectrogram_stats["placeholders"] / spectrogram_stats["total_requests"]) * 100
+        metrics.inc("spectrogram_requests_total", result="placeholder")
         
-        print(f"PLACEHOLDER: Using default placeholder spectrogram (no match found)")
-        print(f"STATS: Placeholders: {spectrogram_stats['placeholders']}/{spectrogram_stats['total_requests']} ({placeholder_rate:.1f}%)")
-        return FileResponse(placeholder_path, media_type="image/png", headers=headers)
+        logger.warning("PLACEHOLDER: Using default placeholder spectrogram for %s", file_name)
+        return FileResponse(PLACEHOLDER_SPECTROGRAM, media_type="image/png", headers={"Cache-Control": "max-age=3600, public"})
     
     # If all else fails, return a 404
-    print(f"ERROR: No spectrogram found for {file_name} and no placeholder available")
+    metrics.inc("spectrogram_requests_total", result="not_found")
+    logger.error("No spectrogram found for %s and no placeholder available", file_name)
     raise HTTPException(status_code=404, detail=f"Spectrogram not found: {file_name}")
     
+# Waveform peak formats served by /waveforms (?format=...), and the default resolution
+WAVEFORM_FORMATS = {"binary": "application/octet-stream", "json": "application/json"}
+DEFAULT_WAVEFORM_BINS = 256
+
+@app.get("/waveforms/{file_name}")
+async def get_waveform(file_name: str, request: Request, bins: int = DEFAULT_WAVEFORM_BINS, format: str = "binary",
+                       v: Optional[str] = None):
+    """Return the min/max peaks of a voice variant's waveform
+
+    `file_name` is the variant's audio file name and ?v= its audio's content
+    version. `bins` is one of the stored resolutions (peaks across the whole
+    clip). The binary format is `bins` interleaved int8 (min, max) pairs with
+    full scale at 127; json has the same values as {"bins", "scale", "min", "max"}.
+    """
+    if format not in WAVEFORM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown waveform format: {format}")
+    if waveform_store is None:
+        raise HTTPException(status_code=404, detail="Waveform peaks are not available")
+    if bins not in waveform_store.levels:
+        raise HTTPException(status_code=400, detail=f"Unsupported bins: {bins} (available: {list(waveform_store.levels)})")
+    
+    parsed = parse_asset_name(file_name)
+    peaks = waveform_store.lookup(*parsed, bins) if parsed else None
+    if peaks is None:
+        metrics.inc("waveform_requests_total", bins=str(bins), format=format, result="not_found")
+        raise HTTPException(status_code=404, detail=f"Waveform not found: {file_name}")
+    metrics.inc("waveform_requests_total", bins=str(bins), format=format, result="found")
+    
+    if format == "json":
+        values = peaks.data.cast("b").tolist()
+        data = dumps({"bins": bins, "scale": PEAK_SCALE, "min": values[0::2], "max": values[1::2]})
+    else:
+        data = bytes(peaks.data)
+    # Versioned like the audio the peaks were computed from
+    digest = f"{content_version(peaks.source_sha256)}-{bins}-{format}"
+    return serve_bytes(request, data, WAVEFORM_FORMATS[format], digest, v)
+
 @app.get("/api/operations")
 async def get_operations():
     """Return a list of operations the API supports"""
@@ -0,0 +1,94 @@
+"""
+Compiled bundle of the per-combination stats files
+
+The stats directory holds one small JSON file per (voice, lane path). The
+bundle compiles the emotion scores of all of them, plus the generic sample
+analysis used as a fallback, into a single compact JSON artifact that the API
+loads once at startup.
+"""
+
+import json
+import os
+
+from log_config import get_logger
+
+logger = get_logger("metadata")
+
+BUNDLE_FORMAT_VERSION = 1
+
+# Generic analysis used for combinations without their own stats file
+SAMPLE_STATS_FILE = "sample_voice_analysis.json"
+
+
+def extract_emotions(stats_data: dict) -> dict:
+    """Return the language/prosody emotion lists of a stats file, as name/score pairs"""
+    top_emotions = stats_data.get("top_emotions", {})
+    emotions = {}
+    for category in ("language", "prosody"):
+        if category in top_emotions:
+            emotions[category] = [
+                {"name": item["name"], "score": item["score"]}
+                for item in top_emotions[category]
+            ]
+    return emotions
+
+
+def compile_stats(stats_dir: str) -> dict:
+    """Read every stats JSON in a directory and compile them into a bundle dict"""
+    bundle = {"version": BUNDLE_FORMAT_VERSION, "entries": {}, "sample": None}
+
+    if not os.path.isdir(stats_dir):
+        logger.warning("Stats directory not found: %s", stats_dir)
+        return bundle
+
+    for file_name in sorted(os.listdir(stats_dir)):
+        if not file_name.endswith(".json"):
+            continue
+
+        path = os.path.join(stats_dir, file_name)
+        try:
+            with open(path, "r") as f:
+                emotions = extract_emotions(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error("Failed to load stats file %s: %s", file_name, e)
+            continue
+
+        if file_name == SAMPLE_STATS_FILE:
+            bundle["sample"] = emotions
+        else:
+            bundle["entries"][os.path.splitext(file_name)[0]] = emotions
+
+    return bundle
+
+
+def write_bundle(bundle: dict, bundle_path: str) -> None:
+    """Write a bundle atomically in compact JSON form"""
+    tmp_path = f"{bundle_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(bundle, f, separators=(",", ":"))
+    os.replace(tmp_path, bundle_path)
+
+
+def load_bundle(bundle_path: str, stats_dir: str) -> dict:
+    """Load the compiled bundle, compiling the stats directory instead if it is missing or stale"""
+    try:
+        bundle_mtime = os.stat(bundle_path).st_mtime_ns
+        # Stats files pruned into the asset pack leave an empty directory; the bundle is all there is then
+        has_stats = os.path.isdir(stats_dir) and any(name.endswith(".json") for name in os.listdir(stats_dir))
+        stats_mtime = os.stat(stats_dir).st_mtime_ns if has_stats else 0
+
+        if bundle_mtime >= stats_mtime:
+            with open(bundle_path, "r") as f:
+                bundle = json.load(f)
+            if bundle.get("version") == BUNDLE_FORMAT_VERSION:
+                logger.info("Loaded metadata bundle: %s (%d entries)", bundle_path, len(bundle["entries"]))
+                return bundle
+            logger.warning("Metadata bundle has an unsupported version, recompiling")
+        else:
+            logger.warning("Metadata bundle is older than %s, recompiling", stats_dir)
+    except FileNotFoundError:
+        logger.info("Metadata bundle not found at %s, compiling %s in memory", bundle_path, stats_dir)
+    except (OSError, ValueError) as e:
+        logger.error("Failed to load metadata bundle %s: %s", bundle_path, e)
+
+    return compile_stats(stats_dir)
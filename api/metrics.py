@@ -0,0 +1,345 @@
+"""
+Process-safe request metrics
+
+Every worker process keeps cheap in-memory counters and fixed-bucket latency
+histograms, and periodically writes a snapshot to a file in METRICS_DIR. A
+scrape merges the snapshots of all workers and renders them in Prometheus
+text format. Snapshots of workers that have exited are folded into a single
+totals file, so totals survive reloads without the directory growing.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from log_config import get_logger
+
+logger = get_logger("metrics")
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = "voice_api_"
+
+# Totals of the workers that have exited, and the lock held while folding snapshots into them
+RETIRED_SNAPSHOT = "metrics_retired.json"
+FOLD_LOCK = "metrics_fold.lock"
+
+# A snapshot not rewritten for this long (in seconds) belongs to a worker that is gone,
+# even if its pid has been reused; live workers rewrite theirs every few seconds
+RETIRE_AFTER = 60.0
+
+# Help text for the metric families
+METRIC_HELP = {
+    "http_requests_total": "HTTP requests by endpoint, method and status",
+    "http_request_duration_seconds": "HTTP request latency by endpoint",
+    "spectrogram_requests_total": "Spectrogram requests by how they were resolved",
+    "spectrogram_variants_total": "Spectrogram responses by variant size and format",
+    "voice_requests_total": "Metadata requests by voice",
+    "asset_lookups_total": "Asset resolutions by kind and result",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "audio_streams_total": "Audio responses streamed while being synthesized",
+    "batch_items_total": "Card moves processed through /api/process/batch",
+    "fallback_distance_total": "Fallback assets by kind and lane path distance from the request",
+    "audio_previews_total": "Audio preview requests by the format served",
+    "fallback_distance_sum": "Total lane path distance of fallback assets from the requests, by kind",
+    "channel_connections_total": "Card move channels opened, by transport",
+    "channel_moves_total": "Card moves sent over channels, by transport and status",
+    "channel_audio_wait_seconds": "Time from a channel move's result to its audio being ready, for synthesized audio",
+    "waveform_requests_total": "Waveform peak requests by resolution, format and result",
+}
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _merge(snapshots) -> dict:
+    """Sum the counters and histograms of several snapshots"""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+    return {"counters": counters, "histograms": histograms}
+
+
+def _snapshot_of(counters: dict, histograms: dict) -> dict:
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), list(values)] for (name, labels), values in histograms.items()],
+    }
+
+
+def _write_json(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; rely on RETIRE_AFTER there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metrics:
+    """Counters and histograms for the current process"""
+
+    def __init__(self, metrics_dir: str, retire_after: float = RETIRE_AFTER):
+        self.metrics_dir = metrics_dir
+        self.retire_after = retire_after
+        self._lock = threading.Lock()
+        # (name, labels) -> value
+        self._counters = {}
+        # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._histograms = {}
+        # One file per process lifetime, so a reused pid never overwrites old totals
+        self.snapshot_path = os.path.join(metrics_dir, f"metrics_{os.getpid()}_{int(time.time() * 1000)}.json")
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter"""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value (in seconds) in a latency histogram"""
+        key = (name, _labels_key(labels))
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                index = i
+                break
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def snapshot(self) -> dict:
+        """Return this process's metrics in the serializable snapshot format"""
+        with self._lock:
+            return _snapshot_of(self._counters, self._histograms)
+
+    def flush(self) -> None:
+        """Write this process's snapshot so other workers can aggregate it, and fold in exited workers"""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        _write_json(self.snapshot_path, self.snapshot())
+        self.fold_retired()
+
+    def _snapshot_paths(self) -> list:
+        return [
+            path for path in glob.glob(os.path.join(self.metrics_dir, "metrics_*.json"))
+            if os.path.basename(path) != RETIRED_SNAPSHOT
+        ]
+
+    def _is_retired(self, path: str) -> bool:
+        if path == self.snapshot_path:
+            return False
+        try:
+            pid = int(os.path.basename(path).split("_")[1])
+            age = time.time() - os.path.getmtime(path)
+        except (IndexError, ValueError, OSError):
+            return False
+        # A file with our pid but not our path is from an earlier process that had the same pid
+        return pid == os.getpid() or age > self.retire_after or not _pid_alive(pid)
+
+    def fold_retired(self) -> int:
+        """Merge the snapshots of exited workers into the totals file and delete them
+
+        Returns the number of snapshots folded. Skipped while another worker is folding.
+        """
+        retired = [path for path in self._snapshot_paths() if self._is_retired(path)]
+        if not retired:
+            return 0
+
+        lock_path = os.path.join(self.metrics_dir, FOLD_LOCK)
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                # Left behind by a worker that died while folding
+                if time.time() - os.path.getmtime(lock_path) > self.retire_after:
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return 0
+
+        try:
+            retired_path = os.path.join(self.metrics_dir, RETIRED_SNAPSHOT)
+            snapshots = []
+            folded = []
+            for path in [retired_path] + retired:
+                try:
+                    with open(path, "r") as f:
+                        snapshots.append(json.load(f))
+                    folded.append(path)
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    logger.warning("Skipping unreadable metrics snapshot %s: %s", path, e)
+            totals = _merge(snapshots)
+            _write_json(retired_path, _snapshot_of(totals["counters"], totals["histograms"]))
+            for path in folded:
+                if path != retired_path:
+                    os.remove(path)
+            count = sum(1 for path in folded if path != retired_path)
+            logger.debug("Folded the metrics of %d exited workers into %s", count, retired_path)
+            return count
+        finally:
+            os.close(lock_fd)
+            os.remove(lock_path)
+
+    def aggregate(self) -> dict:
+        """Merge the snapshots of all workers and the exited workers' totals, using live values for this process"""
+        snapshots = [self.snapshot()]
+        for path in glob.glob(os.path.join(self.metrics_dir, "metrics_*.json")):
+            if path == self.snapshot_path:
+                continue
+            try:
+                with open(path, "r") as f:
+                    snapshots.append(json.load(f))
+            except FileNotFoundError:
+                pass  # Folded into the totals since the glob
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable metrics snapshot %s: %s", path, e)
+        return _merge(snapshots)
+
+
+def counter_total(aggregate: dict, name: str, **labels) -> float:
+    """Sum a counter over all label sets that contain the given labels"""
+    wanted = set(labels.items())
+    return sum(
+        value for (counter_name, counter_labels), value in aggregate["counters"].items()
+        if counter_name == name and wanted.issubset(counter_labels)
+    )
+
+
+def histogram_quantile(quantile: float, buckets) -> float:
+    """Estimate a quantile from histogram bucket counts by linear interpolation"""
+    counts = buckets[:-1]
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for i, count in enumerate(counts):
+        upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+        if count and cumulative + count >= rank:
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = upper
+    return LATENCY_BUCKETS[-1]
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + "}"
+
+
+def render_prometheus(aggregate: dict) -> str:
+    """Render aggregated metrics in the Prometheus text exposition format"""
+    lines = []
+
+    families = {}
+    for (name, labels), value in sorted(aggregate["counters"].items()):
+        families.setdefault(name, []).append((labels, value))
+    for name, samples in families.items():
+        metric = METRIC_PREFIX + name
+        lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in samples:
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+    families = {}
+    for (name, labels), values in sorted(aggregate["histograms"].items()):
+        families.setdefault(name, []).append((labels, values))
+    for name, samples in families.items():
+        metric = METRIC_PREFIX + name
+        lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, values in samples:
+            cumulative = 0
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                cumulative += values[i]
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            cumulative += values[len(LATENCY_BUCKETS)]
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {values[-1]:g}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+
+        # Precomputed tail latencies, for dashboards without histogram_quantile()
+        quantile_metric = f"{metric}_quantile"
+        lines.append(f"# HELP {quantile_metric} Estimated {METRIC_HELP.get(name, name).lower()} quantiles")
+        lines.append(f"# TYPE {quantile_metric} gauge")
+        for labels, values in samples:
+            for quantile in (0.5, 0.95, 0.99):
+                value = histogram_quantile(quantile, values)
+                lines.append(f"{quantile_metric}{_format_labels(labels + (('quantile', f'{quantile:g}'),))} {value:g}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the count and latency of every HTTP request"""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Label by route template, not the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            self.metrics.inc("http_requests_total", endpoint=endpoint, method=scope["method"], status=str(status))
+            self.metrics.observe("http_request_duration_seconds", elapsed, endpoint=endpoint)
+
+
+def create_metrics(flush_interval: float = 5.0) -> Metrics:
+    """Create the process metrics, stored under METRICS_DIR and written every flush_interval seconds"""
+    metrics_dir = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "voice_api_metrics"))
+    return Metrics(metrics_dir, retire_after=max(RETIRE_AFTER, 10 * flush_interval))
@@ -0,0 +1,97 @@
+"""
+Persistent channel for card moves and their results
+
+A client connection (a WebSocket, or a server-sent event stream with moves
+posted alongside it) keeps one MoveChannel. Moves are queued per voice and
+handled in the order they were sent, each voice by its own task, so a slow
+move of one voice never holds up the others. Events for the client (results,
+audio-ready notifications, errors) go through a single outbound queue that
+the transport drains, so they are never interleaved mid-message.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from log_config import get_logger
+
+logger = get_logger("channel")
+
+# Most moves a channel holds queued or in progress before rejecting new ones
+MAX_PENDING_MOVES = 64
+
+
+class MoveChannel:
+    """Runs the card moves of one client connection: in order per voice, concurrently across voices"""
+
+    def __init__(self, handle_move: Callable[["MoveChannel", object], Awaitable[None]],
+                 max_pending: int = MAX_PENDING_MOVES):
+        self.handle_move = handle_move
+        self.max_pending = max_pending
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.pending = 0
+        # card name -> moves waiting for that voice's worker
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        # Follow-up work of handled moves, e.g. waiting for synthesized audio
+        self._tasks: Set[asyncio.Task] = set()
+        self.closed = False
+
+    def emit(self, event: dict) -> None:
+        """Queue an event for the client"""
+        if not self.closed:
+            self.events.put_nowait(event)
+
+    def submit(self, voice: str, move) -> bool:
+        """Queue a move behind the earlier moves of the same voice; False if too many are pending"""
+        if self.closed or self.pending >= self.max_pending:
+            return False
+        self.pending += 1
+        queue = self._queues.get(voice)
+        if queue is None:
+            queue = self._queues[voice] = asyncio.Queue()
+            self._workers[voice] = asyncio.create_task(self._run_voice(queue))
+        queue.put_nowait(move)
+        return True
+
+    def spawn(self, coroutine: Awaitable[None]) -> None:
+        """Run follow-up work of a move without holding up the voice's next move"""
+        if self.closed:
+            coroutine.close()
+            return
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._follow_up_done)
+
+    def _follow_up_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Follow-up of a move failed: %s", task.exception(), exc_info=task.exception())
+
+    async def _run_voice(self, queue: asyncio.Queue) -> None:
+        while True:
+            move = await queue.get()
+            try:
+                await self.handle_move(self, move)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # handle_move reports its own errors; this only keeps the voice's worker alive
+                logger.exception("Unexpected error handling move %s: %s", move, e)
+            finally:
+                self.pending -= 1
+
+    def close(self) -> None:
+        """Stop handling moves once the client has gone (synchronous, so it can run in cancelled code)"""
+        self.closed = True
+        for task in list(self._workers.values()) + list(self._tasks):
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._tasks.clear()
+
+
+def move_id(data) -> Optional[str]:
+    """Return the client's id of a (possibly invalid) move, for error events"""
+    if isinstance(data, dict) and isinstance(data.get("id"), (str, int)):
+        return str(data["id"])
+    return None
@@ -0,0 +1,132 @@
+"""
+Nearest available variant for a missing (voice, lane path) combination
+
+Fallbacks pick the indexed variant closest to the requested lane path. The
+distance weighs every zone whose lane differs, earlier zones more since they
+shape everything after them, and a different effect more than a missing one.
+Ties are broken by acoustic similarity (when the feature store is available)
+to the requested path's longest available prefix, which is what the path
+actually starts from, and finally by name, so every fallback is deterministic.
+
+Answers are memoized per asset index generation. A query scans at most one
+voice's variants (256 lane paths), so there is nothing to precompute at startup.
+"""
+
+import math
+import threading
+from typing import Optional, Tuple
+
+from asset_index import asset_basename
+
+# Weight of a lane difference in each of Zones 1-4
+ZONE_WEIGHTS = (1.0, 0.75, 0.5, 0.25)
+
+# Cost of a zone where one side didn't visit it, and where the two took different lanes
+LANE_MISSING_COST = 1.0
+LANE_MISMATCH_COST = 2.0
+
+# Weight of the acoustic distance (in standard deviations, averaged over features)
+# relative to the lane distance; small enough that it only breaks ties
+FEATURE_WEIGHT = 0.01
+
+
+def lane_distance(requested, candidate) -> float:
+    """Return how far apart two lane paths are"""
+    distance = 0.0
+    for weight, requested_lane, candidate_lane in zip(ZONE_WEIGHTS, requested, candidate):
+        if requested_lane == candidate_lane:
+            continue
+        missing = requested_lane == "0" or candidate_lane == "0"
+        distance += weight * (LANE_MISSING_COST if missing else LANE_MISMATCH_COST)
+    return distance
+
+
+class NearestVariantIndex:
+    """Finds the closest indexed variant of a voice for a lane path"""
+
+    def __init__(self, asset_index, feature_store=None):
+        self.asset_index = asset_index
+        self.feature_store = feature_store
+        self._lock = threading.Lock()
+        self._generation = None
+        # (kind, voice_number, lanes) -> (path, lane distance) or None
+        self._answers = {}
+        # feature name -> (mean, std) over all analyzed variants
+        self._feature_scales = None
+
+    def _features(self, voice_number: str, lanes) -> Optional[dict]:
+        return self.feature_store.lookup(voice_number, lanes) if self.feature_store else None
+
+    def _scales(self) -> dict:
+        if self._feature_scales is None:
+            values = {}
+            for voice_number, lanes in self.asset_index.combinations():
+                for name, value in (self._features(voice_number, lanes) or {}).items():
+                    if not math.isnan(value):
+                        values.setdefault(name, []).append(value)
+            scales = {}
+            for name, column in values.items():
+                mean = sum(column) / len(column)
+                std = math.sqrt(sum((value - mean) ** 2 for value in column) / len(column))
+                scales[name] = (mean, std or 1.0)
+            self._feature_scales = scales
+        return self._feature_scales
+
+    def _acoustic_distance(self, reference: Optional[dict], candidate: Optional[dict]) -> float:
+        if not reference or not candidate:
+            return 0.0
+        scales = self._scales()
+        total, count = 0.0, 0
+        for name, (mean, std) in scales.items():
+            a, b = reference.get(name), candidate.get(name)
+            if a is None or b is None or math.isnan(a) or math.isnan(b):
+                continue
+            total += abs(a - b) / std
+            count += 1
+        return total / count if count else 0.0
+
+    def _reference_features(self, voice_number: str, lanes) -> Optional[dict]:
+        # Features of the longest prefix of the path that has them
+        for zone in range(4, -1, -1):
+            features = self._features(voice_number, tuple(lanes[:zone]) + ("0",) * (4 - zone))
+            if features:
+                return features
+        return None
+
+    def _search(self, kind: str, voice_number: str, lanes) -> Optional[Tuple[str, float]]:
+        reference = None
+        best = None
+        for candidate_voice, candidate_lanes in self.asset_index.combinations():
+            if candidate_voice != voice_number or candidate_lanes == lanes:
+                continue
+            path = self.asset_index.lookup(kind, candidate_voice, candidate_lanes)
+            if not path:
+                continue
+            distance = lane_distance(lanes, candidate_lanes)
+            if best is not None and distance > best[0] + FEATURE_WEIGHT * 10:
+                continue
+            if reference is None:
+                reference = self._reference_features(voice_number, lanes) or {}
+            score = distance + FEATURE_WEIGHT * self._acoustic_distance(
+                reference, self._features(candidate_voice, candidate_lanes))
+            key = (score, asset_basename(candidate_voice, candidate_lanes))
+            if best is None or key < best[1]:
+                best = (distance, key, path)
+        return (best[2], best[0]) if best else None
+
+    def nearest(self, kind: str, voice_number: str, lanes) -> Optional[Tuple[str, float]]:
+        """Return (path, lane distance) of the closest other variant of a voice that has a `kind` asset"""
+        lanes = tuple(lanes)
+        with self._lock:
+            if self._generation != self.asset_index.generation:
+                self._answers = {}
+                self._feature_scales = None
+                self._generation = self.asset_index.generation
+            key = (kind, voice_number, lanes)
+            if key in self._answers:
+                return self._answers[key]
+
+        answer = self._search(kind, voice_number, lanes)
+        with self._lock:
+            self._answers[key] = answer
+        return answer
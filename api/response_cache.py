@@ -0,0 +1,84 @@
+"""
+Cache of pre-serialized JSON responses
+
+Responses that are fully determined by their key are serialized once and
+kept as bytes, so a hit skips building, validating and encoding the response
+model. The one field that differs on every response (processingTime) is left
+out of the cached body and appended when the response is sent.
+
+Entries are dropped in least recently used order past the size limit, and
+all of them when the asset index generation they were built against changes.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, NamedTuple, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is slower but equivalent
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    """Serialize to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class CachedResponse(NamedTuple):
+    """A serialized response body missing its timing field"""
+
+    # Everything up to the timing value, i.e. b'{..."processingTime":'
+    head: bytes
+    # Prefetch URLs of the response, which callers also send in a Link header
+    prefetch: Optional[List[str]]
+
+    def body(self, processing_time: float) -> bytes:
+        return self.head + repr(float(processing_time)).encode() + b"}"
+
+
+class ResponseCache:
+    """Thread-safe LRU of serialized responses, invalidated by asset index generation"""
+
+    def __init__(self, max_entries: int, timing_field: str = "processingTime"):
+        self.max_entries = max_entries
+        self.timing_field = timing_field
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_generation(self, generation: int) -> None:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[CachedResponse]:
+        """Return the cached response for a key, if it was built against this generation"""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, generation: int, payload: dict) -> CachedResponse:
+        """Serialize a response (a JSON-ready dict) and cache it, unless caching is disabled"""
+        payload = {name: value for name, value in payload.items() if name != self.timing_field}
+        body = dumps(payload)
+        head = (body[:-1] + b"," if payload else b"{") + dumps(self.timing_field) + b":"
+        entry = CachedResponse(head, payload.get("prefetch"))
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
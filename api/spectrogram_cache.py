@@ -0,0 +1,250 @@
+"""
+On-demand rendering of missing spectrograms
+
+Spectrograms that weren't pregenerated are rendered from the matching audio in
+a worker process pool, on first request. The results are kept in a
+size-capped LRU cache on disk, one directory per spectrogram holding every
+variant (e.g. <cache_dir>/<version>/<name>/thumb.webp). Concurrent requests
+for the same spectrogram share a single render.
+
+The version directory is named after the renderer (its sizes, palette and
+analysis parameters), and every entry records the sha256 of the audio it was
+rendered from, so neither a renderer change nor new audio for a lane path
+serves an outdated image.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from log_config import get_logger
+
+logger = get_logger("spectrogram_cache")
+
+# File in each entry directory holding the sha256 of the audio it was rendered from
+SOURCE_FILE = "source.sha256"
+
+
+def render_version() -> str:
+    """Return a hash of the renderer, used to version the cache directory
+
+    Every rendering parameter (variant sizes, palette, analysis settings) lives
+    in spectrogram_renderer.py, so its source is hashed rather than importing
+    it, which would load numpy into the server process.
+    """
+    renderer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spectrogram_renderer.py")
+    with open(renderer_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _is_render_version(name: str) -> bool:
+    return len(name) == 16 and all(c in "0123456789abcdef" for c in name)
+
+
+def render_spectrogram_files(audio_path: str, entry_dir: str, formats, source_sha256: str) -> dict:
+    """Render every variant of one audio file into entry_dir (runs in a worker process)
+
+    Returns {"<size>.<format>": size in bytes} for the files written.
+    """
+    import spectrogram_renderer
+
+    variants = spectrogram_renderer.render_variants([spectrogram_renderer.load_audio(audio_path)], formats)[0]
+
+    # Write into a scratch directory and rename it into place, so readers never see a partial entry
+    tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    files = {}
+    for (size, fmt), data in variants.items():
+        file_name = f"{size}.{fmt}"
+        with open(os.path.join(tmp_dir, file_name), "wb") as f:
+            f.write(data)
+        files[file_name] = len(data)
+    with open(os.path.join(tmp_dir, SOURCE_FILE), "w") as f:
+        f.write(source_sha256)
+
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+    return files
+
+
+class SpectrogramRenderCache:
+    """Size-capped LRU disk cache of spectrograms rendered on demand"""
+
+    def __init__(self, cache_root: str, max_bytes: int, workers: int):
+        # Renders of other renderer versions are never served again
+        self.cache_root = cache_root
+        self.cache_dir = os.path.join(cache_root, render_version()[:16])
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._executor = None
+        self._formats = None
+        self._lock = threading.Lock()
+        # name -> {"files": {"<size>.<format>": bytes}, "bytes": total, "digests": {path: sha256},
+        #          "source": sha256 of the audio it was rendered from}
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # (name, source sha256) -> asyncio.Task of the render in progress
+        self._inflight = {}
+        self._load()
+
+    def _remove_stale_versions(self) -> None:
+        # Other renderer versions, and entries from before the cache was versioned.
+        # Only names the cache writes, in case SPECTROGRAM_CACHE_DIR is shared
+        with os.scandir(self.cache_root) as it:
+            for entry in it:
+                if entry.path != self.cache_dir and entry.is_dir() and (
+                        _is_render_version(entry.name) or entry.name.startswith("voice_")):
+                    logger.info("Removing outdated rendered spectrograms %s", entry.path)
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _load(self) -> None:
+        # Adopt entries left by earlier runs (or other workers), least recently written first
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._remove_stale_versions()
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.is_dir() or ".tmp" in entry.name:
+                    continue
+                files = {}
+                source = None
+                with os.scandir(entry.path) as files_it:
+                    for file_entry in files_it:
+                        if file_entry.name == SOURCE_FILE:
+                            with open(file_entry.path, "r") as f:
+                                source = f.read().strip()
+                        else:
+                            files[file_entry.name] = file_entry.stat().st_size
+                if files and source:
+                    found.append((entry.stat().st_mtime, entry.name, files, source))
+                else:
+                    # Interrupted, or rendered without recording its source
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+        for _, name, files, source in sorted(found):
+            self._add(name, files, source)
+        if found:
+            logger.info("Spectrogram render cache: %d entries (%.1f MB) in %s",
+                        len(self._entries), self._total_bytes / 1e6, self.cache_dir)
+        self._evict()
+
+    def _add(self, name: str, files: dict, source: str) -> None:
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old:
+                self._total_bytes -= old["bytes"]
+            entry = {"files": files, "bytes": sum(files.values()), "digests": {}, "source": source}
+            self._entries[name] = entry
+            self._total_bytes += entry["bytes"]
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if self._total_bytes <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                name, entry = self._entries.popitem(last=False)
+                self._total_bytes -= entry["bytes"]
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            logger.debug("Evicted rendered spectrogram %s", name)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use, so the pool costs nothing unless something is missing.
+        # Spawned rather than forked, since the server process runs threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _render_formats(self):
+        if self._formats is None:
+            import spectrogram_renderer
+            self._formats = ("png", "webp") if spectrogram_renderer.webp_available() else ("png",)
+        return self._formats
+
+    def variant(self, name: str, size: str, fmt: str) -> Optional[str]:
+        """Return the path of a cached variant and mark the spectrogram as recently used"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or f"{size}.{fmt}" not in entry["files"]:
+                return None
+            self._entries.move_to_end(name)
+        return os.path.join(self.cache_dir, name, f"{size}.{fmt}")
+
+    def contains(self, name: str, source_sha256: str) -> bool:
+        """Return True if a spectrogram has been rendered from audio with this sha256"""
+        entry = self._entries.get(name)
+        return entry is not None and entry["source"] == source_sha256
+
+    def discard(self, name: str) -> None:
+        """Forget a spectrogram whose files are gone (e.g. evicted by another worker sharing the cache directory)"""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry:
+                self._total_bytes -= entry["bytes"]
+
+    def digest(self, name: str, path: str) -> str:
+        """Return the sha256 of a cached file, computed once per render"""
+        entry = self._entries.get(name)
+        digest = entry["digests"].get(path) if entry else None
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            if entry:
+                entry["digests"][path] = digest
+        return digest
+
+    def render(self, name: str, audio_path: str, source_sha256: str) -> "asyncio.Task":
+        """Start rendering a spectrogram from audio with a given sha256, or join the render already in progress
+
+        Must be called from the event loop. The task resolves to True once the
+        spectrogram is in the cache, or False if rendering failed.
+        """
+        # A render of other audio for the same path isn't joined: it would cache the old image
+        key = (name, source_sha256)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(name, audio_path, source_sha256))
+            self._inflight[key] = task
+        return task
+
+    async def _render(self, name: str, audio_path: str, source_sha256: str) -> bool:
+        loop = asyncio.get_running_loop()
+        entry_dir = os.path.join(self.cache_dir, name)
+        try:
+            files = await loop.run_in_executor(
+                self._get_executor(), render_spectrogram_files, audio_path, entry_dir, self._render_formats(),
+                source_sha256
+            )
+            self._add(name, files, source_sha256)
+            await run_in_threadpool(self._evict)
+            logger.info("Rendered missing spectrogram %s from %s", name, os.path.basename(audio_path))
+            return True
+        except Exception as e:
+            logger.error("Failed to render spectrogram %s from %s: %s", name, audio_path, e)
+            return False
+        finally:
+            self._inflight.pop((name, source_sha256), None)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_spectrogram_cache() -> SpectrogramRenderCache:
+    """Create the render cache configured by SPECTROGRAM_CACHE_DIR, SPECTROGRAM_CACHE_MAX_MB and SPECTROGRAM_RENDER_WORKERS"""
+    cache_dir = os.environ.get("SPECTROGRAM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "voice_api_spectrograms"))
+    max_bytes = int(float(os.environ.get("SPECTROGRAM_CACHE_MAX_MB", "200")) * 1024 * 1024)
+    workers = int(os.environ.get("SPECTROGRAM_RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+    return SpectrogramRenderCache(cache_dir, max_bytes, workers)
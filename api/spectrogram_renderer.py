@@ -0,0 +1,280 @@
+"""
+Spectrogram rendering without matplotlib
+
+Computes the same mel spectrogram as librosa.feature.melspectrogram (power,
+Slaney mel filters, dB relative to the peak with an 80 dB floor) with plain
+NumPy, maps the dB values to magma colormap indices laid out like
+librosa.display.specshow(y_axis='mel'), and encodes them as a paletted PNG
+with zlib. Several files can be rendered as one batch, sharing a single
+FFT and filterbank multiplication.
+
+Only NumPy and soundfile are needed, so it is cheap enough to use from the API
+at request time.
+"""
+
+import struct
+import zlib
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Analysis parameters (librosa defaults)
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+
+# Output image size; matches the matplotlib-rendered assets
+WIDTH = 1455
+HEIGHT = 855
+
+# Pregenerated variant sizes, rendered natively rather than downscaled
+VARIANT_SIZES = {
+    "thumb": (364, 214),
+    "medium": (728, 428),
+    "full": (WIDTH, HEIGHT),
+}
+
+# Sizes that also get a WebP; at full size the paletted PNG is already smaller
+WEBP_SIZES = ("thumb", "medium")
+
+PNG_COMPRESSION_LEVEL = 6
+WEBP_QUALITY = 80
+
+# matplotlib's "magma" colormap, 256 RGB entries
+_MAGMA_HEX = (
+    "00000401000501010601010802010902020b02020d03030f03031204041405041606051806051a07061c08071e090720"
+    "0a08220b09240c09260d0a290e0b2b100b2d110c2f120d31130d34140e36150e38160f3b180f3d19103f1a10421c1044"
+    "1d11471e114920114b21114e22115024125325125527125829115a2a115c2c115f2d11612f1163311165331067341069"
+    "36106b38106c390f6e3b0f703d0f713f0f72400f74420f75440f764510774710784910784a10794c117a4e117b4f127b"
+    "51127c52137c54137d56147d57157e59157e5a167e5c167f5d177f5f187f601880621980641a80651a80671b80681c81"
+    "6a1c816b1d816d1d816e1e81701f81721f817320817521817621817822817922827b23827c23827e2482802582812581"
+    "8326818426818627818827818928818b29818c29818e2a81902a81912b81932b80942c80962c80982d80992d809b2e7f"
+    "9c2e7f9e2f7fa02f7fa1307ea3307ea5317ea6317da8327daa337dab337cad347cae347bb0357bb2357bb3367ab5367a"
+    "b73779b83779ba3878bc3978bd3977bf3a77c03a76c23b75c43c75c53c74c73d73c83e73ca3e72cc3f71cd4071cf4070"
+    "d0416fd2426fd3436ed5446dd6456cd8456cd9466bdb476adc4869de4968df4a68e04c67e24d66e34e65e44f64e55064"
+    "e75263e85362e95462ea5661eb5760ec5860ed5a5fee5b5eef5d5ef05f5ef1605df2625df2645cf3655cf4675cf4695c"
+    "f56b5cf66c5cf66e5cf7705cf7725cf8745cf8765cf9785df9795df97b5dfa7d5efa7f5efa815ffb835ffb8560fb8761"
+    "fc8961fc8a62fc8c63fc8e64fc9065fd9266fd9467fd9668fd9869fd9a6afd9b6bfe9d6cfe9f6dfea16efea36ffea571"
+    "fea772fea973feaa74feac76feae77feb078feb27afeb47bfeb67cfeb77efeb97ffebb81febd82febf84fec185fec287"
+    "fec488fec68afec88cfeca8dfecc8ffecd90fecf92fed194fed395fed597fed799fed89afdda9cfddc9efddea0fde0a1"
+    "fde2a3fde3a5fde5a7fde7a9fde9aafdebacfcecaefceeb0fcf0b2fcf2b4fcf4b6fcf6b8fcf7b9fcf9bbfcfbbdfcfdbf"
+)
+MAGMA_LUT = np.frombuffer(bytes.fromhex(_MAGMA_HEX), dtype=np.uint8).reshape(256, 3)
+
+
+def load_audio(path: str) -> Tuple[np.ndarray, int]:
+    """Load an audio file as mono float32 samples at its native sample rate"""
+    import soundfile as sf
+    from asset_pack import open_asset
+
+    samples, sr = sf.read(open_asset(path), dtype="float32", always_2d=True)
+    return samples.mean(axis=1), sr
+
+
+def _hz_to_mel(frequencies):
+    # Slaney mel scale: linear below 1 kHz, logarithmic above
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = frequencies / f_sp
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_mels = min_log_mel + np.log(np.maximum(frequencies, min_log_hz) / min_log_hz) / logstep
+    return np.where(frequencies >= min_log_hz, log_mels, mels)
+
+
+def _mel_to_hz(mels):
+    mels = np.asarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    freqs = f_sp * mels
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_freqs = min_log_hz * np.exp(logstep * (np.maximum(mels, min_log_mel) - min_log_mel))
+    return np.where(mels >= min_log_mel, log_freqs, freqs)
+
+
+def mel_frequencies(n: int, fmax: float) -> np.ndarray:
+    """Return n frequencies evenly spaced on the mel scale from 0 to fmax"""
+    return _mel_to_hz(np.linspace(_hz_to_mel(0.0), _hz_to_mel(fmax), n))
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr: int, n_fft: int = N_FFT, n_mels: int = N_MELS) -> np.ndarray:
+    """Slaney-normalized triangular mel filters, shape (n_mels, 1 + n_fft // 2)"""
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    mel_f = mel_frequencies(n_mels + 2, sr / 2.0)
+    fdiff = np.diff(mel_f)
+    ramps = mel_f[:, None] - fft_freqs[None, :]
+
+    lower = -ramps[:-2] / fdiff[:-1, None]
+    upper = ramps[2:] / fdiff[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_f[2:n_mels + 2] - mel_f[:n_mels]))[:, None]
+    return weights.astype(np.float32)
+
+
+@lru_cache(maxsize=1)
+def _window(n_fft: int) -> np.ndarray:
+    # Periodic Hann window, as used by librosa.stft
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+def _frames(samples: np.ndarray, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    # Centered frames with zero padding (librosa.stft center=True, pad_mode="constant")
+    padded = np.pad(samples, n_fft // 2)
+    if len(padded) < n_fft:
+        padded = np.pad(padded, (0, n_fft - len(padded)))
+    n_frames = 1 + (len(padded) - n_fft) // hop_length
+    return np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop_length][:n_frames]
+
+
+def mel_spectrograms_db(batch: Sequence[Tuple[np.ndarray, int]]) -> List[np.ndarray]:
+    """
+    Compute dB-scaled mel spectrograms for a batch of (samples, sample_rate) pairs.
+
+    Files with the same sample rate share one FFT call and one filterbank product.
+    """
+    results = [None] * len(batch)
+
+    by_rate = {}
+    for i, (_, sr) in enumerate(batch):
+        by_rate.setdefault(sr, []).append(i)
+
+    window = _window(N_FFT)
+    for sr, indices in by_rate.items():
+        frames = [_frames(batch[i][0]) for i in indices]
+        stacked = np.concatenate(frames) * window
+        power = np.abs(np.fft.rfft(stacked, axis=1)) ** 2
+        mel = power.astype(np.float32) @ mel_filterbank(sr).T
+
+        offset = 0
+        for i, file_frames in zip(indices, frames):
+            S = mel[offset:offset + len(file_frames)].T
+            offset += len(file_frames)
+
+            S_db = 10.0 * np.log10(np.maximum(AMIN, S))
+            S_db -= 10.0 * np.log10(max(AMIN, float(S.max()) if S.size else AMIN))
+            results[i] = np.maximum(S_db, S_db.max() - TOP_DB) if S.size else S_db
+
+    return results
+
+
+def _symlog(frequencies):
+    # matplotlib's symlog transform with base 2, linthresh 1000 Hz, linscale 1,
+    # which is how specshow scales a mel y axis
+    frequencies = np.asanyarray(frequencies, dtype=np.float64)
+    return np.where(frequencies <= 1000.0, 2.0 * frequencies,
+                    1000.0 * (2.0 + np.log2(np.maximum(frequencies, 1000.0) / 1000.0)))
+
+
+@lru_cache(maxsize=8)
+def _row_to_mel_bin(sr: int, n_mels: int, height: int) -> np.ndarray:
+    # Which mel bin each output row shows, top row first. Bin edges are mel-spaced
+    # frequencies placed on a symlog axis, so low bands are taller than high ones
+    edges = _symlog(mel_frequencies(n_mels + 1, sr / 2.0))
+    centers = edges[0] + (edges[-1] - edges[0]) * (np.arange(height)[::-1] + 0.5) / height
+    return np.clip(np.searchsorted(edges, centers, side="right") - 1, 0, n_mels - 1)
+
+
+def color_indices(S_db: np.ndarray, sr: int, width: int = WIDTH, height: int = HEIGHT) -> np.ndarray:
+    """Map a dB mel spectrogram to a (height, width) uint8 image of colormap indices"""
+    n_mels, n_frames = S_db.shape
+    if n_frames == 0:
+        return np.zeros((height, width), dtype=np.uint8)
+
+    # Normalize to the data range like pcolormesh, then quantize into the LUT
+    vmin, vmax = float(S_db.min()), float(S_db.max())
+    scale = 256.0 / (vmax - vmin) if vmax > vmin else 0.0
+    indices = np.clip(((S_db - vmin) * scale).astype(np.int32), 0, 255).astype(np.uint8)
+
+    rows = _row_to_mel_bin(sr, n_mels, height)
+    cols = np.minimum((np.arange(width) + 0.5) * n_frames / width, n_frames - 1).astype(np.int64)
+    return indices[rows][:, cols]
+
+
+def colorize(indices: np.ndarray) -> np.ndarray:
+    """Expand an index image to (height, width, 3) RGB"""
+    return MAGMA_LUT[indices]
+
+
+def encode_png(indices: np.ndarray, compression_level: int = PNG_COMPRESSION_LEVEL) -> bytes:
+    """Encode an index image as an 8-bit paletted PNG using the magma palette"""
+    height, width = indices.shape
+
+    # "Up" filter on every row: repeated rows (common after vertical scaling) become zeros
+    filtered = np.empty((height, width + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = indices[0]
+    filtered[1:, 1:] = indices[1:] - indices[:-1]
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"PLTE", MAGMA_LUT.tobytes())
+        + chunk(b"IDAT", zlib.compress(filtered.tobytes(), compression_level))
+        + chunk(b"IEND", b"")
+    )
+
+
+def webp_available() -> bool:
+    """Return True if Pillow with WebP support is installed"""
+    try:
+        from PIL import features
+    except ImportError:
+        return False
+    return bool(features.check("webp"))
+
+
+def encode_webp(indices: np.ndarray, quality: int = WEBP_QUALITY) -> bytes:
+    """Encode an index image as a lossy WebP (requires Pillow)"""
+    import io
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(colorize(indices)).save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_variants(batch: Sequence[Tuple[np.ndarray, int]], formats: Sequence[str] = ("png",)) -> List[dict]:
+    """Render every size in VARIANT_SIZES for a batch of (samples, sample_rate) pairs
+
+    Returns one {(size, format): bytes} dict per clip. PNG is always rendered;
+    WebP ("webp" in formats) only for WEBP_SIZES, and only kept when it is
+    smaller than the PNG of the same size.
+    """
+    results = []
+    for S_db, (_, sr) in zip(mel_spectrograms_db(batch), batch):
+        variants = {}
+        for size, (width, height) in VARIANT_SIZES.items():
+            indices = color_indices(S_db, sr, width, height)
+            png = variants[(size, "png")] = encode_png(indices)
+            if "webp" in formats and size in WEBP_SIZES:
+                webp = encode_webp(indices)
+                if len(webp) < len(png):
+                    variants[(size, "webp")] = webp
+        results.append(variants)
+    return results
+
+
+def render_pngs(batch: Sequence[Tuple[np.ndarray, int]], width: int = WIDTH, height: int = HEIGHT) -> List[bytes]:
+    """Render a batch of (samples, sample_rate) pairs to PNG bytes"""
+    spectrograms = mel_spectrograms_db(batch)
+    return [encode_png(color_indices(S_db, sr, width, height)) for S_db, (_, sr) in zip(spectrograms, batch)]
+
+
+def render_png(samples: np.ndarray, sr: int, width: int = WIDTH, height: int = HEIGHT) -> bytes:
+    """Render one clip to PNG bytes"""
+    return render_pngs([(samples, sr)], width, height)[0]
+
+
+def render_files(audio_files: Iterable[str], width: int = WIDTH, height: int = HEIGHT) -> List[bytes]:
+    """Load and render several audio files as one batch"""
+    return render_pngs([load_audio(path) for path in audio_files], width, height)
@@ -0,0 +1,159 @@
+"""
+Storage for per-session voice traversal history
+
+Each client session keeps its own record of which lane every voice took in
+Zones 1-4. Two backends are available:
+
+- "memory": an in-process LRU with TTL eviction (single worker)
+- "sqlite": a local SQLite database shared by all uvicorn worker processes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from log_config import get_logger
+
+logger = get_logger("traversal")
+
+ZONE_NAMES = ["Zone 1", "Zone 2", "Zone 3", "Zone 4"]
+
+# Session used when a client doesn't send an id, e.g. older frontends
+DEFAULT_SESSION_ID = "default"
+
+
+def empty_traversal() -> Dict[str, Optional[str]]:
+    """Return a traversal record for a voice that hasn't entered any zone yet"""
+    return {zone: None for zone in ZONE_NAMES}
+
+
+class MemoryTraversalStore:
+    """In-process traversal store with LRU eviction and a per-session TTL"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # session_id -> (last_access, {voice_name: traversal})
+        self._sessions = OrderedDict()
+
+    def _session(self, session_id: str, create: bool):
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+
+        if session is not None and now - session[0] > self.ttl:
+            del self._sessions[session_id]
+            session = None
+
+        if session is None:
+            if not create:
+                return None
+            session = (now, {})
+        else:
+            session = (now, session[1])
+
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+        return session[1]
+
+    def get(self, session_id: str, voice_name: str) -> Dict[str, Optional[str]]:
+        """Return a copy of the traversal record for a voice in a session"""
+        with self._lock:
+            voices = self._session(session_id, create=False)
+            traversal = voices.get(voice_name) if voices else None
+            return dict(traversal) if traversal else empty_traversal()
+
+    def put(self, session_id: str, voice_name: str, traversal: Dict[str, Optional[str]]) -> None:
+        """Store the traversal record for a voice in a session"""
+        with self._lock:
+            self._session(session_id, create=True)[voice_name] = dict(traversal)
+
+
+class SQLiteTraversalStore:
+    """Traversal store backed by a SQLite file so several worker processes share state"""
+
+    def __init__(self, db_path: str, ttl: float = 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_cleanup = 0.0
+
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS traversal (
+                session_id TEXT NOT NULL,
+                voice_name TEXT NOT NULL,
+                zones TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (session_id, voice_name)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS traversal_updated_at ON traversal (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _cleanup(self, conn: sqlite3.Connection, now: float) -> None:
+        # Expire old sessions at most once a minute per worker thread
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        conn.execute("DELETE FROM traversal WHERE updated_at < ?", (now - self.ttl,))
+
+    def get(self, session_id: str, voice_name: str) -> Dict[str, Optional[str]]:
+        """Return the traversal record for a voice in a session"""
+        row = self._connection().execute(
+            "SELECT zones, updated_at FROM traversal WHERE session_id = ? AND voice_name = ?",
+            (session_id, voice_name),
+        ).fetchone()
+
+        if row is None or time.time() - row[1] > self.ttl:
+            return empty_traversal()
+
+        traversal = empty_traversal()
+        traversal.update(json.loads(row[0]))
+        return traversal
+
+    def put(self, session_id: str, voice_name: str, traversal: Dict[str, Optional[str]]) -> None:
+        """Store the traversal record for a voice in a session"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO traversal (session_id, voice_name, zones, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, voice_name, json.dumps(traversal), now),
+        )
+        self._cleanup(conn, now)
+
+
+def create_traversal_store():
+    """Create the traversal store selected by the TRAVERSAL_STORE environment variable"""
+    backend = os.environ.get("TRAVERSAL_STORE", "memory").lower()
+    ttl = float(os.environ.get("TRAVERSAL_TTL", "3600"))
+
+    if backend == "sqlite":
+        db_path = os.environ.get("TRAVERSAL_DB_PATH", "./traversal.db")
+        logger.info("Using SQLite traversal store: %s", db_path)
+        return SQLiteTraversalStore(db_path, ttl=ttl)
+
+    if backend != "memory":
+        logger.warning("Unknown TRAVERSAL_STORE '%s', using in-memory store", backend)
+
+    max_sessions = int(os.environ.get("TRAVERSAL_MAX_SESSIONS", "10000"))
+    return MemoryTraversalStore(max_sessions=max_sessions, ttl=ttl)
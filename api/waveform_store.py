@@ -0,0 +1,121 @@
+"""
+Waveform peaks of every pregenerated voice variant
+
+build_waveform_store.py reduces every recording to min/max sample peaks at
+a few resolutions (PEAK_LEVELS bins across the whole clip), quantized to
+int8 (full scale = 127), and writes them to one file:
+
+    header   b"VAPEAK01", voice slots, block count, level count (u32 each),
+             then the bins of each level (u32 each)
+    index    u32 per variant slot, in feature store order (voice, Z1..Z4):
+             1 + the variant's block number, 0 if it has no peaks
+    digests  sha256 (32 bytes) of the recording each block was computed from
+    blocks   per level, `bins` interleaved int8 (min, max) pairs
+
+Variants sharing a recording share a block. The API memory-maps the file
+and serves a level's pairs as a slice of it, so numpy isn't needed at runtime.
+"""
+
+import mmap
+import os
+import struct
+from typing import NamedTuple, Optional
+
+from feature_store import LANES_PER_ZONE, variant_offset
+from log_config import get_logger
+
+logger = get_logger("waveforms")
+
+# Bins per clip of each resolution, coarsest first
+PEAK_LEVELS = (64, 256, 1024)
+
+# Peak value of a full-scale sample
+PEAK_SCALE = 127
+
+PEAKS_MAGIC = b"VAPEAK01"
+PEAKS_HEADER = struct.Struct("<8sIII")
+DIGEST_SIZE = 32
+
+
+def block_size(levels) -> int:
+    """Return the bytes of one variant's peaks at every level"""
+    return sum(levels) * 2
+
+
+class WaveformPeaks(NamedTuple):
+    """One level of a variant's peaks"""
+
+    # Interleaved int8 (min, max) pairs, one per bin
+    data: memoryview
+    # sha256 hex digest of the recording they were computed from
+    source_sha256: str
+
+
+class WaveformStore:
+    """Read-only view of a memory-mapped waveform peak store"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.voice_slots, self.block_count, level_count = PEAKS_HEADER.unpack_from(self._mmap, 0)
+        if magic != PEAKS_MAGIC:
+            raise ValueError(f"Not a waveform store: {path}")
+        self.levels = struct.unpack_from(f"<{level_count}I", self._mmap, PEAKS_HEADER.size)
+
+        view = memoryview(self._mmap)
+        index_offset = PEAKS_HEADER.size + 4 * level_count
+        slots = self.voice_slots * LANES_PER_ZONE ** 4
+        digests_offset = index_offset + 4 * slots
+        self._blocks_offset = digests_offset + DIGEST_SIZE * self.block_count
+        self._block_size = block_size(self.levels)
+        if self._blocks_offset + self._block_size * self.block_count != len(self._mmap):
+            raise ValueError(f"Truncated or corrupt waveform store: {path}")
+        self._index = view[index_offset:digests_offset].cast("I")
+        self._digests = view[digests_offset:self._blocks_offset]
+        self._blocks = view[self._blocks_offset:]
+        # Start of each level within a block
+        self._level_offsets = {}
+        offset = 0
+        for bins in self.levels:
+            self._level_offsets[bins] = offset
+            offset += bins * 2
+
+    def lookup(self, voice_number: str, lanes, bins: int) -> Optional[WaveformPeaks]:
+        """Return a variant's peaks at a resolution, or None if it has none"""
+        if bins not in self._level_offsets:
+            return None
+        try:
+            voice_slot = int(voice_number)
+            lanes = [int(lane) for lane in lanes]
+        except ValueError:
+            return None
+        if not 0 <= voice_slot < self.voice_slots or any(not 0 <= lane < LANES_PER_ZONE for lane in lanes):
+            return None
+
+        block = self._index[variant_offset(voice_slot, lanes)] - 1
+        if block < 0:
+            return None
+        start = block * self._block_size + self._level_offsets[bins]
+        digest = self._digests[block * DIGEST_SIZE:(block + 1) * DIGEST_SIZE].hex()
+        return WaveformPeaks(self._blocks[start:start + bins * 2], digest)
+
+    def count(self) -> int:
+        """Return the number of variants with peaks"""
+        return sum(1 for block in self._index if block)
+
+
+def load_waveform_store(path: str) -> Optional[WaveformStore]:
+    """Open the waveform store, or return None (with a warning) if it is missing or unreadable"""
+    if not os.path.exists(path):
+        logger.warning("Waveform store %s not found, run build_waveform_store.py to serve waveform peaks", path)
+        return None
+    try:
+        store = WaveformStore(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.error("Failed to load waveform store %s: %s", path, e)
+        return None
+    logger.info("Waveform store loaded: %d variants (%d distinct) at %s bins from %s",
+                store.count(), store.block_count, "/".join(map(str, store.levels)), path)
+    return store
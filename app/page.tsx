@@ -5,7 +5,7 @@ import { DragDropContext, Droppable, Draggable } from "@hello-pangea/dnd"
 import { Card } from "@/components/ui/card"
 import { Loader2, CheckCircle, XCircle, Volume2 } from "lucide-react"
 import { cn, isLaneSticky, isLaneBlocking, getLaneNumber, getZoneNumber, showStickyIndicators, showBlockingIndicators } from "@/lib/utils"
-import { checkApiStatus, processVoice, playAudio, MetadataItem, ProcessResponse } from "@/lib/api-client"
+import { audioUrl, checkApiStatus, processVoice, openMoveChannel, playAudio, MetadataItem, MoveChannel, ProcessRequestParams, ProcessResponse } from "@/lib/api-client"
 import { MasterDetailsSection } from "@/components/ui/master-details"
 import { ZoneSeparator } from "@/components/ui/zone-separator"
 import { DebugPanel } from "@/components/ui/debug-panel"
@@ -50,6 +50,14 @@ type ZoneMetadataType = {
   }
 }
 
+// Callbacks of a move sent over the move channel
+type MoveHandlersType = {
+  onResult: (response: ProcessResponse) => void
+  // The move's audio can be played in full
+  onAudioReady: (audioFile: string) => void
+  onError: (message: string) => void
+}
+
 export default function Home() {
   // Count of total voices in the system
   const totalVoices = 3;
@@ -193,6 +201,57 @@ export default function Home() {
     };
   }, []);
   
+  // Persistent channel for card moves, and the callbacks of the moves waiting for events
+  const moveChannel = useRef<MoveChannel | null>(null)
+  const moveHandlers = useRef(new Map<string, MoveHandlersType>())
+  
+  useEffect(() => {
+    const channel = openMoveChannel((event) => {
+      const id = event.id;
+      const handlers = id !== undefined ? moveHandlers.current.get(id) : undefined;
+      if (!handlers || id === undefined) return;
+      
+      if (event.type === 'result') {
+        handlers.onResult(event);
+        // Only successful moves with audio get an audio-ready event
+        if (event.status !== 'success' || !event.audioFile) {
+          moveHandlers.current.delete(id);
+        }
+      } else if (event.type === 'audio-ready') {
+        moveHandlers.current.delete(id);
+        if (event.status === 'success') {
+          handlers.onAudioReady(event.audioFile);
+        } else {
+          handlers.onError(event.message || 'Audio could not be generated');
+        }
+      } else {
+        moveHandlers.current.delete(id);
+        handlers.onError(event.message);
+      }
+    });
+    moveChannel.current = channel;
+    
+    return () => {
+      channel.close();
+      moveChannel.current = null;
+      moveHandlers.current.clear();
+    };
+  }, []);
+  
+  // Send a card move over the channel, or as a single request if the channel isn't open
+  const sendMove = (params: ProcessRequestParams, handlers: MoveHandlersType) => {
+    if (!moveChannel.current) {
+      processVoice(params).then((response) => {
+        handlers.onResult(response);
+        if (response.status === 'success' && response.audioFile) {
+          handlers.onAudioReady(response.audioFile);
+        }
+      }).catch((error) => handlers.onError(error.message));
+      return;
+    }
+    moveHandlers.current.set(moveChannel.current.send(params), handlers);
+  };
+  
   // Check API status on initial load and periodically
   useEffect(() => {
     const checkStatus = async () => {
@@ -630,16 +689,17 @@ export default function Home() {
         throw new Error(response.message || "API returned an error");
       }
       
-      // Play the audio if available
-      if (response.audioFile) {
+      // Play the audio if available, as a low-bitrate preview that starts quickly
+      const previewFile = audioUrl(response.audioFile, 'preview');
+      if (previewFile) {
         setApiMessage(`Playing ${card.content}...`);
         
         // Cache check for better performance - check if URL has changed
-        const isSameAudio = audioElement.current.src === response.audioFile;
+        const isSameAudio = audioElement.current.src === previewFile;
         
         if (!isSameAudio) {
           // Use our improved audio play function
-          safePlayAudio(response.audioFile, card.id);
+          safePlayAudio(previewFile, card.id);
         } else {
           // If it's the same audio file we already loaded, just restart playback
           // for better performance
@@ -1000,84 +1060,88 @@ export default function Home() {
           }, 1000) // Show after processing animation completes
         }
 
-        // Call API and process response
-        processVoice({
+        // Send the move; its result arrives first, then its audio once it can be played
+        sendMove({
           cardName: card.content,
           zoneName: destZoneId,
           laneName: destLaneName,
           previousZone: sourceZoneId
-        }).then((response: ProcessResponse) => {
-          setApiMessage(response.message)
-          
-          // Store metadata if available
-          if (response.metadata) {
-            setZoneMetadata(prev => ({
-              ...prev,
-              [destZoneId]: {
-                ...(prev[destZoneId] || {}),
-                [card.content]: response.metadata as MetadataItem
-              }
-            }))
-          }
-          
-          // Play audio if available and enabled
-          if (response.audioFile && audioEnabled) {
-            // Use a slight delay to ensure the card has fully settled at its new position
-            // This helps prevent the audio from playing and then immediately stopping
-            // if the mouse isn't over the card after drop
+        }, {
+          onResult: (response: ProcessResponse) => {
+            setApiMessage(response.message)
+            
+            // Store metadata if available
+            if (response.metadata) {
+              setZoneMetadata(prev => ({
+                ...prev,
+                [destZoneId]: {
+                  ...(prev[destZoneId] || {}),
+                  [card.content]: response.metadata as MetadataItem
+                }
+              }))
+            }
+            
+            // Clear processing state once the result is in
+            setProcessingCard({ id: null, zone: null, lane: null })
+          },
+          onAudioReady: (audioFile: string) => {
+            // Play audio if enabled
+            if (audioEnabled) {
+              // Use a slight delay to ensure the card has fully settled at its new position
+              // This helps prevent the audio from playing and then immediately stopping
+              // if the mouse isn't over the card after drop
+              setTimeout(() => {
+                // Check if mouse is still over the card after drop and positioning is complete
+                const cardElement = document.querySelector(`[data-rbd-draggable-id="${card.id}"]`);
+                if (cardElement) {
+                  const rect = cardElement.getBoundingClientRect();
+                  const isMouseOverCard = 
+                    mousePosition.x >= rect.left && 
+                    mousePosition.x <= rect.right && 
+                    mousePosition.y >= rect.top && 
+                    mousePosition.y <= rect.bottom;
+                  
+                  if (isMouseOverCard) {
+                    // Audition the drop with the preview using our safe function
+                    safePlayAudio(audioUrl(audioFile, 'preview') || audioFile, card.id);
+                  }
+                }
+              }, 100);
+            }
+            
+            // After playback starts, check if the mouse is really still over the card
+            // We need to manually check because the drag event may not trigger mouse events correctly
             setTimeout(() => {
-              // Check if mouse is still over the card after drop and positioning is complete
+              // Get the card element
               const cardElement = document.querySelector(`[data-rbd-draggable-id="${card.id}"]`);
-              if (cardElement) {
-                const rect = cardElement.getBoundingClientRect();
-                const isMouseOverCard = 
-                  mousePosition.x >= rect.left && 
-                  mousePosition.x <= rect.right && 
-                  mousePosition.y >= rect.top && 
-                  mousePosition.y <= rect.bottom;
-                
-                if (isMouseOverCard) {
-                  // Play audio on drag completion using our safe function
-                  safePlayAudio(response.audioFile, card.id);
-                }
+              if (!cardElement) return;
+              
+              // Get card position
+              const rect = cardElement.getBoundingClientRect();
+              
+              // Check if the mouse is really over the card
+              const isMouseOverCard = 
+                mousePosition.x >= rect.left && 
+                mousePosition.x <= rect.right && 
+                mousePosition.y >= rect.top && 
+                mousePosition.y <= rect.bottom;
+              
+              console.log('Mouse position check:', mousePosition.x, mousePosition.y, 'Card rect:', rect, 'Is over:', isMouseOverCard);
+              
+              // If mouse is not over the card, stop the audio
+              if (!isMouseOverCard && playingAudio === card.id && audioElement.current) {
+                console.log('Mouse not over card after drop, stopping audio');
+                audioElement.current.pause();
+                setPlayingAudio(null);
+                setHoveredCard(null);
               }
-            }, 100);
+            }, 100); // Small delay to ensure DOM is updated
+          },
+          onError: (message: string) => {
+            // Handle API errors
+            setApiMessage(`Error: ${message}`)
+            setProcessingCard({ id: null, zone: null, lane: null })
           }
-          
-          // Clear processing state after API call completes
-          setProcessingCard({ id: null, zone: null, lane: null })
-          
-          // After processing, check if the mouse is really still over the card
-          // We need to manually check because the drag event may not trigger mouse events correctly
-          setTimeout(() => {
-            // Get the card element
-            const cardElement = document.querySelector(`[data-rbd-draggable-id="${card.id}"]`);
-            if (!cardElement) return;
-            
-            // Get card position
-            const rect = cardElement.getBoundingClientRect();
-            
-            // Check if the mouse is really over the card
-            const isMouseOverCard = 
-              mousePosition.x >= rect.left && 
-              mousePosition.x <= rect.right && 
-              mousePosition.y >= rect.top && 
-              mousePosition.y <= rect.bottom;
-            
-            console.log('Mouse position check:', mousePosition.x, mousePosition.y, 'Card rect:', rect, 'Is over:', isMouseOverCard);
-            
-            // If mouse is not over the card, stop the audio
-            if (!isMouseOverCard && playingAudio === card.id && audioElement.current) {
-              console.log('Mouse not over card after drop, stopping audio');
-              audioElement.current.pause();
-              setPlayingAudio(null);
-              setHoveredCard(null);
-            }
-          }, 100); // Small delay to ensure DOM is updated
-        }).catch((error) => {
-          // Handle API errors
-          setApiMessage(`Error: ${error.message}`)
-          setProcessingCard({ id: null, zone: null, lane: null })
         })
 
         // Set asFarAsCanGo to true if card is placed in a sticky lane
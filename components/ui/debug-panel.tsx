@@ -175,17 +175,6 @@ export function DebugPanel({ cards = [], areAllCardsAsFarAsTheyCanGo = false }:
                 </div>
               </div>
               
-              <div>
-                <h4 className="font-medium">Temporary Directory:</h4>
-                <div className="pl-2">
-                  <p>Path: {debugInfo.temp_directory}</p>
-                  <p>Contents: {debugInfo.temp_directory_contents.length > 0 
-                    ? debugInfo.temp_directory_contents.join(', ') 
-                    : '(empty)'}
-                  </p>
-                </div>
-              </div>
-              
               <div>
                 <h4 className="font-medium">Working Directory:</h4>
                 <p className="pl-2">{debugInfo.working_directory}</p>
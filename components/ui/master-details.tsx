@@ -4,7 +4,7 @@ import React from "react"
 import { Card } from "@/components/ui/card"
 import { Progress } from "@/components/ui/progress"
 import { CircularProgress } from "@/components/ui/circular-progress"
-import { MetadataItem } from "@/lib/api-client"
+import { MetadataItem, spectrogramUrl } from "@/lib/api-client"
 import Image from "next/image"
 import { Loader2 } from "lucide-react"
 
@@ -127,7 +127,7 @@ export function MasterDetailsSection({
                       <p className="text-xs font-medium mb-1">Spectrogram</p>
                       <div className="bg-indigo-950 rounded-md p-1 flex justify-center">
                         <img 
-                          src={voiceData.metadata.spectrogram}
+                          src={spectrogramUrl(voiceData.metadata.spectrogram, 'thumb')}
                           alt={`${voice} spectrogram`}
                           className="h-24 w-full object-contain"
                           loading="lazy"
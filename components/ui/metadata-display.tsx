@@ -3,7 +3,7 @@
 import React from "react"
 import { Card } from "@/components/ui/card"
 import { Progress } from "@/components/ui/progress"
-import { MetadataItem } from "@/lib/api-client"
+import { MetadataItem, spectrogramUrl } from "@/lib/api-client"
 import Image from "next/image"
 
 interface MetadataDisplayProps {
@@ -95,7 +95,7 @@ export function MetadataDisplay({ metadata, title }: MetadataDisplayProps) {
               Debug URL: {metadata.spectrogram}
             </div>
             <img 
-              src={metadata.spectrogram} 
+              src={spectrogramUrl(metadata.spectrogram, 'medium')} 
               alt="Voice spectrogram" 
               className="h-40 w-full object-contain" 
               loading="lazy"
@@ -8,6 +8,89 @@ const API_BASE_URL = typeof window !== 'undefined' && window.location.hostname =
   ? 'http://localhost:8000'
   : '';
 
+// Each browser tab gets its own session id so the backend can keep the
+// traversal history of this tab's voices separate from other users
+const SESSION_STORAGE_KEY = 'voice-session-id';
+
+export function getSessionId(): string {
+  if (typeof window === 'undefined') {
+    return 'default';
+  }
+
+  let sessionId = window.sessionStorage.getItem(SESSION_STORAGE_KEY);
+  if (!sessionId) {
+    sessionId = typeof crypto !== 'undefined' && 'randomUUID' in crypto
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    window.sessionStorage.setItem(SESSION_STORAGE_KEY, sessionId);
+  }
+  return sessionId;
+}
+
+// Pregenerated spectrogram sizes served by /spectrograms/{file}?size=...
+export type SpectrogramSize = 'thumb' | 'medium' | 'full';
+
+export function spectrogramUrl(url: string | undefined, size: SpectrogramSize): string | undefined {
+  if (!url || size === 'full') {
+    return url;
+  }
+  return `${url}${url.includes('?') ? '&' : '?'}size=${size}`;
+}
+
+// Audio qualities served by /processed/{file} and /audio/{voice}?quality=...:
+// 'preview' is a low-bitrate transcode (the original when none was generated)
+export type AudioQuality = 'full' | 'preview';
+
+export function audioUrl(url: string | undefined, quality: AudioQuality): string | undefined {
+  if (!url || quality === 'full') {
+    return url;
+  }
+  return `${url}${url.includes('?') ? '&' : '?'}quality=${quality}`;
+}
+
+// Waveform peak resolutions served by /waveforms/{file}?bins=... (peaks across the whole clip)
+export type WaveformBins = 64 | 256 | 1024;
+
+export interface WaveformPeaks {
+  // Per bin, the lowest and highest sample, with full scale at 127
+  min: Int8Array;
+  max: Int8Array;
+}
+
+/**
+ * Return the waveform peaks URL of a processed audio URL; it carries the
+ * audio's version, so it is cached as long as the audio is
+ */
+export function waveformUrl(audioFile: string | undefined, bins: WaveformBins = 256): string | undefined {
+  if (!audioFile || !audioFile.includes('/processed/')) {
+    return undefined;
+  }
+  const url = audioFile.replace('/processed/', '/waveforms/');
+  return `${url}${url.includes('?') ? '&' : '?'}bins=${bins}`;
+}
+
+/**
+ * Fetch the waveform peaks of a processed audio file (a few hundred bytes), or null if it has none
+ */
+export async function getWaveformPeaks(audioFile: string | undefined, bins: WaveformBins = 256): Promise<WaveformPeaks | null> {
+  const url = waveformUrl(audioFile, bins);
+  if (!url) {
+    return null;
+  }
+  const response = await fetch(url);
+  if (!response.ok) {
+    return null;
+  }
+  // Interleaved (min, max) pairs
+  const pairs = new Int8Array(await response.arrayBuffer());
+  const peaks = { min: new Int8Array(pairs.length / 2), max: new Int8Array(pairs.length / 2) };
+  for (let i = 0; i < peaks.min.length; i++) {
+    peaks.min[i] = pairs[2 * i];
+    peaks.max[i] = pairs[2 * i + 1];
+  }
+  return peaks;
+}
+
 export interface ProcessRequestParams {
   cardName: string;
   zoneName: string;
@@ -24,6 +107,9 @@ export interface MetadataItem {
   language?: EmotionData[];
   prosody?: EmotionData[];
   spectrogram?: string;
+  // Measured acoustic features of this exact variant (duration_s, rms_mean,
+  // pitch_mean_hz, spectral_centroid_hz, tempo_bpm, ...), when analyzed
+  acoustics?: Record<string, number>;
   // These fields might be added in the future
   charisma?: number;
   confidence?: number;
@@ -37,6 +123,81 @@ export interface ProcessResponse {
   processingTime: number;
   audioFile?: string;
   metadata?: MetadataItem;
+  // Audio and spectrogram URLs of the moves one step away
+  prefetch?: string[];
+}
+
+export interface ProcessBatchResponse {
+  results: ProcessResponse[];
+  processingTime: number;
+}
+
+/**
+ * Handle URLs in a process response appropriately based on environment
+ */
+function withAbsoluteUrls(data: ProcessResponse): ProcessResponse {
+  if (data.audioFile) {
+    // If we're running local dev (not Docker), use absolute URLs
+    if (API_BASE_URL && !data.audioFile.startsWith('http')) {
+      data.audioFile = `${API_BASE_URL}${data.audioFile}`;
+    }
+    console.log('Using audio file:', data.audioFile);
+  }
+  
+  if (data.metadata?.spectrogram && !data.metadata.spectrogram.startsWith('http')) {
+    // If we're running local dev (not Docker), use absolute URLs
+    if (API_BASE_URL) {
+      data.metadata.spectrogram = `${API_BASE_URL}${data.metadata.spectrogram}`;
+    }
+    console.log('Using spectrogram:', data.metadata.spectrogram);
+  }
+  
+  if (API_BASE_URL && data.prefetch) {
+    data.prefetch = data.prefetch.map(url => url.startsWith('http') ? url : `${API_BASE_URL}${url}`);
+  }
+  
+  return data;
+}
+
+// URLs already handed to the browser for prefetching during this page's lifetime
+const prefetchedUrls = new Set<string>();
+
+/**
+ * Ask the browser to prefetch the assets of the next likely moves at idle priority,
+ * so the next drop plays from the HTTP cache
+ */
+export function prefetchAssets(urls: string[] | undefined): void {
+  if (typeof document === 'undefined' || !urls) {
+    return;
+  }
+  for (const url of urls) {
+    if (prefetchedUrls.has(url)) {
+      continue;
+    }
+    prefetchedUrls.add(url);
+    const link = document.createElement('link');
+    link.rel = 'prefetch';
+    link.href = url;
+    link.as = url.includes('/processed/') ? 'audio' : 'image';
+    document.head.appendChild(link);
+  }
+}
+
+/**
+ * Read the error message from a failed API response
+ */
+async function errorMessageFor(response: Response): Promise<string> {
+  let errorMessage = `API request failed with status ${response.status}`;
+  try {
+    const errorData = await response.json();
+    if (errorData.detail) {
+      errorMessage = errorData.detail;
+    }
+  } catch (e) {
+    // If JSON parsing fails, use the default error message
+    console.error("Failed to parse error response:", e);
+  }
+  return errorMessage;
 }
 
 /**
@@ -53,6 +214,7 @@ export async function processVoice(params: ProcessRequestParams): Promise<Proces
       headers: {
         'Content-Type': 'application/json',
         'Cache-Control': 'no-cache',
+        'X-Session-ID': getSessionId(),
       },
       body: JSON.stringify(params),
       signal: controller.signal,
@@ -62,38 +224,11 @@ export async function processVoice(params: ProcessRequestParams): Promise<Proces
 
     if (!response.ok) {
       // Handle errors gracefully
-      let errorMessage = `API request failed with status ${response.status}`;
-      try {
-        const errorData = await response.json();
-        if (errorData.detail) {
-          errorMessage = errorData.detail;
-        }
-      } catch (e) {
-        // If JSON parsing fails, use the default error message
-        console.error("Failed to parse error response:", e);
-      }
-      throw new Error(errorMessage);
+      throw new Error(await errorMessageFor(response));
     }
 
-    const data: ProcessResponse = await response.json();
-    
-    // Handle URLs appropriately based on environment
-    if (data.audioFile) {
-      // If we're running local dev (not Docker), use absolute URLs
-      if (API_BASE_URL && !data.audioFile.startsWith('http')) {
-        data.audioFile = `${API_BASE_URL}${data.audioFile}`;
-      }
-      console.log('Using audio file:', data.audioFile);
-    }
-    
-    if (data.metadata?.spectrogram && !data.metadata.spectrogram.startsWith('http')) {
-      // If we're running local dev (not Docker), use absolute URLs
-      if (API_BASE_URL) {
-        data.metadata.spectrogram = `${API_BASE_URL}${data.metadata.spectrogram}`;
-      }
-      console.log('Using spectrogram:', data.metadata.spectrogram);
-    }
-    
+    const data = withAbsoluteUrls(await response.json());
+    prefetchAssets(data.prefetch);
     return data;
   } catch (error) {
     console.error('Process Voice API Error:', error);
@@ -110,6 +245,169 @@ export async function processVoice(params: ProcessRequestParams): Promise<Proces
   }
 }
 
+/**
+ * Process several card moves (e.g. a multi-card move or a layout reset) in one request.
+ * Results come back in the same order; check each result's status, since one
+ * failing move doesn't fail the others.
+ */
+export async function processVoiceBatch(items: ProcessRequestParams[]): Promise<ProcessResponse[]> {
+  try {
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), 10000); // 10 second timeout
+    
+    const response = await fetch(`${API_BASE_URL}/api/process/batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Cache-Control': 'no-cache',
+        'X-Session-ID': getSessionId(),
+      },
+      body: JSON.stringify({ items }),
+      signal: controller.signal,
+    });
+    
+    clearTimeout(timeoutId);
+
+    if (!response.ok) {
+      throw new Error(await errorMessageFor(response));
+    }
+
+    const data: ProcessBatchResponse = await response.json();
+    const results = data.results.map(withAbsoluteUrls);
+    results.forEach(result => prefetchAssets(result.prefetch));
+    return results;
+  } catch (error) {
+    console.error('Process Voice Batch API Error:', error);
+    
+    if (error instanceof Error) {
+      if (error.name === 'AbortError') {
+        throw new Error('API request timed out. The server might be overloaded or unreachable.');
+      }
+      throw error;
+    }
+    
+    throw new Error('An unknown error occurred while processing the voices');
+  }
+}
+
+// Events pushed by a move channel (see openMoveChannel); `id` echoes the id of the move
+export type MoveChannelEvent =
+  | ({ type: 'result'; id?: string } & ProcessResponse)
+  | { type: 'audio-ready'; id?: string; cardName: string; status: string; audioFile: string; message?: string }
+  | { type: 'error'; id?: string; message: string };
+
+export interface MoveChannel {
+  // Queue a move without waiting for earlier ones; returns the id its events will carry
+  send(params: ProcessRequestParams): string;
+  close(): void;
+}
+
+function withAbsoluteEvent(event: MoveChannelEvent): MoveChannelEvent {
+  if (event.type === 'result') {
+    return { ...withAbsoluteUrls(event), type: 'result', id: event.id };
+  }
+  if (event.type === 'audio-ready' && API_BASE_URL && !event.audioFile.startsWith('http')) {
+    return { ...event, audioFile: `${API_BASE_URL}${event.audioFile}` };
+  }
+  return event;
+}
+
+/**
+ * Open a persistent channel for card moves. Moves are sent without waiting for
+ * earlier ones; the server pushes a 'result' event for each (with the audio and
+ * spectrogram URLs) and an 'audio-ready' event once its audio can be played in
+ * full. Moves of one voice are handled in order. Uses a WebSocket, falling back
+ * to server-sent events (moves posted alongside the stream) when it can't connect.
+ */
+export function openMoveChannel(onEvent: (event: MoveChannelEvent) => void): MoveChannel {
+  const session = encodeURIComponent(getSessionId());
+  const emit = (event: MoveChannelEvent) => {
+    const absolute = withAbsoluteEvent(event);
+    if (absolute.type === 'result') {
+      prefetchAssets(absolute.prefetch);
+    }
+    onEvent(absolute);
+  };
+  let nextId = 0;
+  let closed = false;
+  // Moves sent before the transport is ready
+  const queued: string[] = [];
+  let sendNow: ((message: string) => void) | null = null;
+  let closeTransport = () => {};
+
+  const flush = () => {
+    while (sendNow && queued.length) {
+      sendNow(queued.shift()!);
+    }
+  };
+
+  const openEventStream = () => {
+    const source = new EventSource(`${API_BASE_URL}/api/events?session=${session}`);
+    closeTransport = () => source.close();
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (event.type === 'ready') {
+        const url = `${API_BASE_URL}/api/events/${event.channel}`;
+        sendNow = (body) => {
+          fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body })
+            .then(async (response) => {
+              // Rejected moves are also reported on the stream, unless the channel is gone
+              // (or lives in another API worker: the event stream fallback needs a single worker)
+              if (response.status === 404) {
+                emit({ type: 'error', id: JSON.parse(body).id, message: await errorMessageFor(response) });
+              }
+            })
+            .catch((error) => emit({ type: 'error', id: JSON.parse(body).id, message: String(error) }));
+        };
+        flush();
+      } else {
+        emit(event);
+      }
+    };
+    source.onerror = () => {
+      // EventSource reconnects by itself, to a new channel
+      sendNow = null;
+    };
+  };
+
+  if (typeof WebSocket === 'undefined') {
+    openEventStream();
+  } else {
+    const base = API_BASE_URL || `${window.location.protocol}//${window.location.host}`;
+    const socket = new WebSocket(`${base.replace(/^http/, 'ws')}/api/ws?session=${session}`);
+    let opened = false;
+    closeTransport = () => socket.close();
+    socket.onopen = () => {
+      opened = true;
+      sendNow = (message) => socket.send(message);
+      flush();
+    };
+    socket.onmessage = (message) => emit(JSON.parse(message.data));
+    socket.onclose = () => {
+      sendNow = null;
+      if (!closed) {
+        console.warn(opened ? 'WebSocket closed, continuing over server-sent events'
+                            : 'WebSocket unavailable, falling back to server-sent events');
+        openEventStream();
+      }
+    };
+  }
+
+  return {
+    send(params) {
+      const id = String(nextId++);
+      queued.push(JSON.stringify({ ...params, id }));
+      flush();
+      return id;
+    },
+    close() {
+      closed = true;
+      sendNow = null;
+      closeTransport();
+    },
+  };
+}
+
 /**
  * Play an audio file
  */